@@ -0,0 +1,75 @@
+"""
+Gallery matcher scaling benchmark.
+
+Compares one batched GalleryMatcher.match() against a per-sample loop (the way
+LBPHFaceRecognizer.predict compares a probe to every stored histogram) for
+synthetic galleries of increasing headcount.
+
+    python benchmarks/bench_gallery.py --users 100 1000 10000 --per-user 1
+"""
+import os
+import sys
+import time
+import argparse
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from src.gallery import GalleryMatcher, FEATURE_DIM, GRID_X, GRID_Y, NUM_BINS
+
+
+def synthetic_features(n, rng):
+    """Random normalized cell histograms in the same (sqrt) feature space as extract_features."""
+    hist = rng.random((n, GRID_X * GRID_Y, NUM_BINS), dtype=np.float32)
+    hist /= hist.sum(axis=2, keepdims=True)
+    return np.sqrt(hist).reshape(n, FEATURE_DIM)
+
+
+def time_call(fn, repeats):
+    times = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        fn()
+        times.append((time.perf_counter() - start) * 1000)
+    return np.percentile(times, 50), np.percentile(times, 95)
+
+
+def loop_match(features, labels, probe):
+    """Reference: one chi-square comparison per stored sample, like LBPH predict."""
+    best_label, best_dist = -1, float("inf")
+    for row, label in zip(features, labels):
+        a, b = row * row, probe * probe
+        dist = float(np.sum((a - b) ** 2 / (a + b + 1e-12)))
+        if dist < best_dist:
+            best_label, best_dist = label, dist
+    return best_label, best_dist
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, nargs="+", default=[100, 1000, 10000])
+    parser.add_argument("--per-user", type=int, default=1, help="Feature vectors stored per user")
+    parser.add_argument("--repeats", type=int, default=50)
+    parser.add_argument("--loop-limit", type=int, default=1000, help="Skip the per-sample loop above this many users")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    print(f"{'users':>8} {'rows':>8} {'MB':>8} {'batched p50 ms':>15} {'p95 ms':>8} {'loop p50 ms':>12}")
+    for n_users in args.users:
+        rows = n_users * args.per_user
+        features = synthetic_features(rows, rng)
+        labels = np.repeat(np.arange(1, n_users + 1, dtype=np.int32), args.per_user)
+        gallery = GalleryMatcher(features, labels)
+        probe = synthetic_features(1, rng)[0]
+
+        p50, p95 = time_call(lambda: gallery.match(probe, k=5), args.repeats)
+        loop = "-"
+        if n_users <= args.loop_limit:
+            loop_p50, _ = time_call(lambda: loop_match(features, labels, probe), max(1, args.repeats // 10))
+            loop = f"{loop_p50:.2f}"
+        print(f"{n_users:>8} {rows:>8} {features.nbytes / 1e6:>8.1f} {p50:>15.3f} {p95:>8.3f} {loop:>12}")
+
+
+if __name__ == "__main__":
+    main()
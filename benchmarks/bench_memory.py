@@ -0,0 +1,112 @@
+"""
+Per-frame memory benchmark for the capture -> analysis path.
+
+Replays frames through the same steps as the live pipeline (camera read,
+FrameAnalysis, recognition, face mesh) once with fresh arrays for every
+intermediate image and once with the reused buffers (FramePool for capture,
+ScratchBuffers for the RGB / downscaled images), and reports the transient
+allocation per frame (traced peak above the pre-frame level) and any
+steady growth.
+
+    python benchmarks/bench_memory.py --size 1920x1080 --frames 120
+"""
+import os
+import sys
+import time
+import argparse
+import tracemalloc
+
+import numpy as np
+import cv2
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from src.buffers import FramePool, ScratchBuffers
+from src.face_core import FaceSystem
+from src.frame_analysis import FrameAnalysis
+from src.liveness import LivenessDetector
+
+DEFAULT_IMAGE = os.path.join(os.path.dirname(__file__), "..", "assets", "liveness_challenge.png")
+
+
+class ReplayCapture:
+    """Stands in for cv2.VideoCapture: read(image) fills the given buffer like a camera driver would."""
+    def __init__(self, frames):
+        self.frames = frames
+        self.index = 0
+
+    def read(self, image=None):
+        src = self.frames[self.index % len(self.frames)]
+        self.index += 1
+        if image is not None and image.shape == src.shape:
+            np.copyto(image, src)
+            return True, image
+        return True, src.copy()
+
+
+def run(frames, count, reuse, liveness):
+    face_system = FaceSystem()
+    detector = LivenessDetector() if liveness else None
+    cap = ReplayCapture(frames)
+    pool = FramePool() if reuse else None
+    scratch = ScratchBuffers() if reuse else None
+
+    def step():
+        ret, frame = pool.read(cap) if pool else cap.read()
+        analysis = FrameAnalysis(frame, scratch)
+        if detector is not None:
+            detector.process_frame(frame, analysis)
+        face_system.recognize_face(frame, analysis)
+
+    for _ in range(5): # Warm-up: graphs, pools and scratch arrays settle
+        step()
+
+    transient = []
+    tracemalloc.start()
+    start_level, _ = tracemalloc.get_traced_memory()
+    start = time.perf_counter()
+    for _ in range(count):
+        before, _ = tracemalloc.get_traced_memory()
+        tracemalloc.reset_peak()
+        step()
+        _, peak = tracemalloc.get_traced_memory()
+        transient.append(peak - before)
+    elapsed = time.perf_counter() - start
+    end_level, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    transient = np.array(transient) / 1024.0
+    return {
+        "kb_per_frame_p50": float(np.percentile(transient, 50)),
+        "kb_per_frame_p95": float(np.percentile(transient, 95)),
+        "growth_kb": (end_level - start_level) / 1024.0,
+        "frame_allocations": pool.allocations if pool else count + 5,
+        "ms_per_frame": elapsed * 1000 / count,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Per-frame allocation: fresh arrays vs reused buffers")
+    parser.add_argument("--size", default="1920x1080", help="Frame size WxH (default: 1920x1080)")
+    parser.add_argument("--frames", type=int, default=120, help="Measured frames per run (default: 120)")
+    parser.add_argument("--image", default=DEFAULT_IMAGE, help="Source image (default: assets/liveness_challenge.png)")
+    parser.add_argument("--no-liveness", action="store_true", help="Skip the face mesh")
+    args = parser.parse_args()
+
+    width, height = (int(v) for v in args.size.lower().split("x"))
+    base = cv2.imread(args.image)
+    if base is None:
+        raise SystemExit(f"Cannot read {args.image}")
+    base = cv2.resize(base, (width, height), interpolation=cv2.INTER_AREA)
+    frames = [cv2.convertScaleAbs(base, alpha=1.0, beta=float(b)) for b in (-10, 0, 10)]
+
+    print(f"{width}x{height}, {args.frames} frames, one frame = {base.nbytes / 1024:.0f} KB")
+    print(f"{'mode':>8} {'KB/frame p50':>13} {'p95':>9} {'growth KB':>10} {'frame allocs':>13} {'ms/frame':>9}")
+    for reuse in (False, True):
+        r = run(frames, args.frames, reuse, not args.no_liveness)
+        print(f"{'reuse' if reuse else 'fresh':>8} {r['kb_per_frame_p50']:>13.0f} {r['kb_per_frame_p95']:>9.0f} "
+              f"{r['growth_kb']:>10.0f} {r['frame_allocations']:>13} {r['ms_per_frame']:>9.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,239 @@
+"""
+Benchmark suite for the recognition and liveness hot paths.
+
+Times get_face_crop, recognize_face, predict, LivenessDetector.process_frame,
+train_model and enroll_user (with and without the model file write) against a synthetic gallery of configurable size,
+and reports latency percentiles, throughput and peak Python memory per stage.
+
+Frames come from a recorded video / image folder (--frames) or, by default,
+from jittered copies of the face in assets/liveness_challenge.png, so runs are
+reproducible (fixed seed).
+
+    python benchmarks/suite.py --users 100 --save-baseline baseline.json
+    python benchmarks/suite.py --users 100 --compare baseline.json
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import platform
+import tempfile
+import argparse
+import tracemalloc
+
+import numpy as np
+import cv2
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from src.face_core import FaceSystem
+from src.frame_analysis import FrameAnalysis
+from src.liveness import LivenessDetector
+from src.batch import collect_jobs, iter_frames
+
+DEFAULT_IMAGE = os.path.join(os.path.dirname(__file__), "..", "assets", "liveness_challenge.png")
+
+
+def synthetic_frames(count, rng, image_path=DEFAULT_IMAGE, size=(640, 480)):
+    """Copies of a face image with random shifts and brightness, at camera resolution."""
+    base = cv2.imread(image_path)
+    if base is None:
+        raise SystemExit(f"Cannot read {image_path}")
+    base = cv2.resize(base, size, interpolation=cv2.INTER_AREA)
+    frames = []
+    for _ in range(count):
+        dx, dy = rng.integers(-20, 21, size=2)
+        M = np.float32([[1, 0, dx], [0, 1, dy]])
+        frame = cv2.warpAffine(base, M, size, borderMode=cv2.BORDER_REPLICATE)
+        frames.append(cv2.convertScaleAbs(frame, alpha=1.0, beta=float(rng.integers(-25, 26))))
+    return frames
+
+
+def recorded_frames(path, count):
+    frames = []
+    for kind, source in collect_jobs([path]):
+        for _, _, _, frame in iter_frames(kind, source, 1):
+            frames.append(frame)
+            if len(frames) >= count:
+                return frames
+    return frames
+
+
+def synthetic_samples(n_users, per_user, rng, size=(100, 100)):
+    """Per-user base texture plus noise, so users are separable like real faces."""
+    samples = {}
+    for uid in range(1, n_users + 1):
+        base = rng.integers(0, 256, size=size[::-1], dtype=np.uint8)
+        base = cv2.GaussianBlur(base, (5, 5), 0)
+        samples[uid] = [cv2.add(base, rng.integers(0, 20, size=size[::-1], dtype=np.uint8)) for _ in range(per_user)]
+    return samples
+
+
+def measure(fn, inputs, repeats, warmup=3):
+    """
+    Run fn over inputs (cycled) repeats times.
+    Returns latency percentiles in ms, throughput and peak traced memory.
+    """
+    for i in range(min(warmup, repeats)):
+        fn(inputs[i % len(inputs)])
+
+    times = []
+    for i in range(repeats):
+        start = time.perf_counter()
+        fn(inputs[i % len(inputs)])
+        times.append((time.perf_counter() - start) * 1000)
+
+    # One separate traced pass, so tracing overhead stays out of the timings
+    tracemalloc.start()
+    fn(inputs[0])
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    times = np.array(times)
+    return {
+        "p50_ms": round(float(np.percentile(times, 50)), 3),
+        "p95_ms": round(float(np.percentile(times, 95)), 3),
+        "p99_ms": round(float(np.percentile(times, 99)), 3),
+        "mean_ms": round(float(times.mean()), 3),
+        "throughput_per_s": round(1000.0 / times.mean(), 1) if times.mean() > 0 else 0.0,
+        "peak_kb": round(peak / 1024, 1),
+        "runs": int(repeats),
+    }
+
+
+def run_suite(args):
+    rng = np.random.default_rng(args.seed)
+    frames = recorded_frames(args.frames, args.num_frames) if args.frames else synthetic_frames(args.num_frames, rng)
+    if not frames:
+        raise SystemExit("No frames to benchmark.")
+
+    work_dir = tempfile.mkdtemp(prefix="face_bench_")
+    results = {}
+    try:
+        face_system = FaceSystem(
+            dataset_path=os.path.join(work_dir, "dataset"),
+            trainer_path=os.path.join(work_dir, "trainer.yml"),
+            model_path=os.path.join(work_dir, "model.bin"),
+            samples_path=os.path.join(work_dir, "samples"),
+            backend=args.backend,
+        )
+        liveness = LivenessDetector()
+
+        samples = synthetic_samples(args.users, args.per_user, rng)
+        for uid, user_samples in samples.items():
+            face_system.save_samples(uid, user_samples)
+
+        stages = args.stages
+        if "train_model" in stages:
+            results["train_model"] = measure(lambda _: face_system.train_model(), [None], args.train_repeats, warmup=0)
+        else:
+            face_system.train_model()
+
+        crops = [c for c in (face_system.get_face_crop(f)[0] for f in frames) if c is not None]
+        print(f"{len(frames)} frames, {len(crops)} with a face, {args.users} users x {args.per_user} samples ({args.backend})")
+
+        if "get_face_crop" in stages:
+            results["get_face_crop"] = measure(lambda f: face_system.get_face_crop(f, FrameAnalysis(f)), frames, args.repeats)
+        if "recognize_face" in stages:
+            results["recognize_face"] = measure(lambda f: face_system.recognize_face(f, FrameAnalysis(f)), frames, args.repeats)
+        if "predict" in stages and crops:
+            results["predict"] = measure(face_system.predict, crops, args.repeats)
+        if "liveness" in stages:
+            results["liveness"] = measure(lambda f: liveness.process_frame(f, FrameAnalysis(f)), frames, args.repeats)
+        if "enroll_user" in stages or "enroll_saved" in stages:
+            new_user = [samples[1]]
+            uid = iter(range(args.users + 1, args.users + 3 + 2 * args.train_repeats)) # Each stage also runs its traced pass
+            # The UI reads the standby copy while a registration is captured
+            face_system.prepare_standby()
+            face_system.flush_model()
+        if "enroll_user" in stages:
+            # Until the new user is recognized; the model file is written in the background
+            results["enroll_user"] = measure(lambda s: face_system.enroll_user(next(uid), s), new_user, args.train_repeats, warmup=0)
+            face_system.flush_model()
+        if "enroll_saved" in stages:
+            # Including the background write of the new model version (O(model size) for LBPH)
+            results["enroll_saved"] = measure(lambda s: (face_system.enroll_user(next(uid), s), face_system.flush_model()),
+                                              new_user, args.train_repeats, warmup=0)
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    return {
+        "meta": {
+            "backend": args.backend,
+            "users": args.users,
+            "per_user": args.per_user,
+            "frames": len(frames),
+            "source": args.frames or "synthetic",
+            "seed": args.seed,
+            "python": platform.python_version(),
+            "opencv": cv2.__version__,
+            "machine": platform.machine(),
+            "cpus": os.cpu_count(),
+        },
+        "stages": results,
+    }
+
+
+def print_results(report):
+    print(f"{'stage':<16} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'per s':>8} {'peak KB':>9}")
+    for name, r in report["stages"].items():
+        print(f"{name:<16} {r['p50_ms']:>9.2f} {r['p95_ms']:>9.2f} {r['p99_ms']:>9.2f} {r['throughput_per_s']:>8.1f} {r['peak_kb']:>9.1f}")
+
+
+def compare(report, baseline, tolerance):
+    """Returns a list of regression messages (current vs baseline, beyond tolerance)."""
+    regressions = []
+    for name, current in report["stages"].items():
+        base = baseline.get("stages", {}).get(name)
+        if base is None:
+            continue
+        for key in ("p50_ms", "p95_ms", "peak_kb"):
+            if base[key] > 0 and current[key] > base[key] * (1 + tolerance):
+                change = (current[key] / base[key] - 1) * 100
+                regressions.append(f"{name} {key}: {base[key]} -> {current[key]} (+{change:.0f}%)")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    all_stages = ["get_face_crop", "recognize_face", "predict", "liveness", "train_model", "enroll_user", "enroll_saved"]
+    parser.add_argument("--backend", choices=["lbph", "gallery"], default="lbph")
+    parser.add_argument("--users", type=int, default=100, help="Synthetic gallery size")
+    parser.add_argument("--per-user", type=int, default=20, help="Samples per synthetic user")
+    parser.add_argument("--frames", metavar="PATH", help="Video file or image folder (default: synthetic frames)")
+    parser.add_argument("--num-frames", type=int, default=30)
+    parser.add_argument("--repeats", type=int, default=100, help="Timed runs per frame stage")
+    parser.add_argument("--train-repeats", type=int, default=3, help="Timed runs of train_model / enroll_user")
+    parser.add_argument("--stages", nargs="+", choices=all_stages, default=all_stages)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--save-baseline", metavar="JSON", help="Write the results as a baseline")
+    parser.add_argument("--compare", metavar="JSON", help="Compare against a saved baseline; exit 1 on regressions")
+    parser.add_argument("--tolerance", type=float, default=0.15, help="Allowed slowdown before flagging (default: 0.15 = 15%%)")
+    args = parser.parse_args()
+
+    report = run_suite(args)
+    print_results(report)
+
+    if args.save_baseline:
+        with open(args.save_baseline, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"Baseline saved to {args.save_baseline}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        if baseline.get("meta", {}).get("backend") != report["meta"]["backend"] or \
+                baseline.get("meta", {}).get("users") != report["meta"]["users"]:
+            print("Warning: baseline was recorded with a different backend / gallery size.")
+        regressions = compare(report, baseline, args.tolerance)
+        if regressions:
+            print("REGRESSIONS:")
+            for message in regressions:
+                print(f"  {message}")
+            sys.exit(1)
+        print("No regressions.")
+
+
+if __name__ == "__main__":
+    main()
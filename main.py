@@ -1,15 +1,218 @@
 import os
 import sys
+import argparse
 
 # Add src to path
 sys.path.append(os.path.join(os.path.dirname(__file__), 'src'))
 
-from src.ui import AppUI
-import tkinter as tk
+def parse_args():
+    parser = argparse.ArgumentParser(description="Face Authentication Attendance System")
+    parser.add_argument("--backend", choices=["lbph", "gallery"], default="lbph", help="Recognizer backend (default: lbph)")
+    # Maintenance operations (no UI)
+    parser.add_argument("--rebuild-model", action="store_true", help="Retrain the model from the full dataset and exit")
+    parser.add_argument("--remove-user", type=int, metavar="ID", help="Remove a user from the database and model and exit")
+    parser.add_argument("--export-report", metavar="CSV", help="Export per-user daily summaries (worked hours, late, unmatched) and exit")
+    parser.add_argument("--export-punches", metavar="CSV", help="Export raw punches in local time and exit")
+    parser.add_argument("--from", dest="date_from", default=None, help="Report start date YYYY-MM-DD (default: today)")
+    parser.add_argument("--to", dest="date_to", default=None, help="Report end date YYYY-MM-DD (default: start date)")
+    parser.add_argument("--migrate-dataset", action="store_true", help="Pack dataset/<id>/*.jpg into the per-user sample store (samples/) and exit")
+    parser.add_argument("--convert-model", metavar="TRAINER_YML", help="Convert an LBPH trainer.yml into the binary gallery model (model.bin) and exit")
+    parser.add_argument("--model-versions", action="store_true", help="List the saved model versions and exit")
+    parser.add_argument("--model-history-mb", type=int, default=None, metavar="MB", help="Also drop old model versions beyond this total size (default: keep the last 5)")
+    parser.add_argument("--rollback", type=int, nargs="?", const=0, metavar="VERSION", help="Make an earlier model version live (default: the previous one) and exit; running instances reload it")
+    parser.add_argument("--compact", type=int, nargs="?", const=3, metavar="K", help="Gallery backend: reduce each user to K prototype vectors (default: 3) and exit")
+    parser.add_argument("--dtype", choices=["float32", "float16", "uint8"], default="float32", help="With --compact: feature storage precision (default: float32)")
+    parser.add_argument("--compact-report", action="store_true", help="Gallery backend: print the accuracy / size / latency trade-off of compaction settings and exit")
+    parser.add_argument("--import", dest="import_source", metavar="DIR_OR_CSV", help="Bulk-enroll employees from a folder (one sub-folder or file per person) or a name,path CSV and exit")
+    parser.add_argument("--rejections", default="rejections.csv", help="With --import: per-file rejection log (default: rejections.csv)")
+    parser.add_argument("--min-samples", type=int, default=1, help="With --import: skip employees with fewer usable samples (default: 1)")
+    # Headless batch processing (no camera, no Tk)
+    parser.add_argument("--batch", nargs="+", metavar="PATH", help="Analyze video files and/or image folders and exit")
+    parser.add_argument("--output", default="results.jsonl", help="Batch output JSONL (default: results.jsonl)")
+    parser.add_argument("--workers", type=int, default=None, help="Batch / --import worker processes (default: CPU count) / --streams inference threads (default: 1)")
+    parser.add_argument("--predict-workers", type=int, default=0, metavar="N", help="Threads for LBPH predicts when several faces are in view (default: off)")
+    parser.add_argument("--every", type=int, default=1, metavar="N", help="Analyze every Nth video frame (default: 1; --import clips: 5)")
+    parser.add_argument("--no-liveness", action="store_true", help="Skip the face mesh / liveness features (batch mode, load generator)")
+    # Multi-camera runner (no Tk)
+    parser.add_argument("--streams", nargs="+", metavar="SRC", help="Run headless on several sources (device index, video file, rtsp:// URL); events are printed as JSON lines")
+    parser.add_argument("--punch", choices=["IN", "OUT"], default=None, help="With --streams: punch verified users automatically")
+    parser.add_argument("--no-realtime", action="store_true", help="With --streams: read video files as fast as inference allows instead of at their native FPS")
+    # Recognition service for thin clients
+    parser.add_argument("--serve", type=int, nargs="?", const=8080, metavar="PORT", help="Run the HTTP recognition service (default port 8080)")
+    parser.add_argument("--host", default="127.0.0.1", help="Service bind address (default: 127.0.0.1)")
+    parser.add_argument("--max-batch", type=int, default=16, help="Service micro-batch size limit (default: 16)")
+    parser.add_argument("--max-wait-ms", type=float, default=5.0, help="Service micro-batch latency budget (default: 5 ms)")
+    parser.add_argument("--loadgen", metavar="URL", help="Load-test a running service, e.g. http://127.0.0.1:8080/recognize")
+    parser.add_argument("--concurrency", type=int, default=8, help="Load generator client threads (default: 8)")
+    parser.add_argument("--requests", type=int, default=500, help="Load generator request count (default: 500)")
+    parser.add_argument("--image", default=None, help="Load generator image (default: assets/liveness_challenge.png)")
+    parser.add_argument("--crops", action="store_true", help="Load generator sends face crops (kind=crop) instead of frames")
+    # Instrumentation
+    parser.add_argument("--metrics", action="store_true", help="Start with per-stage metrics enabled (F12 toggles them in the UI)")
+    parser.add_argument("--metrics-file", metavar="JSON", default=None, help="Write a metrics snapshot to this file every few seconds")
+    parser.add_argument("--metrics-port", type=int, metavar="PORT", default=None, help="Serve metrics as JSON on http://127.0.0.1:PORT/metrics")
+    return parser.parse_args()
+
+def run_maintenance(args):
+    from src.face_core import FaceSystem
+    from src.storage import DatabaseManager
+
+    if args.convert_model:
+        from src.model_io import convert_trainer_yml
+        from src.model_versions import ModelVersions
+        converted = []
+        # Published as a new model.bin version, so --rollback can undo it
+        versions = ModelVersions("model.bin", max_bytes=args.model_history_mb * 1024 * 1024 if args.model_history_mb else None)
+        version = versions.publish(lambda path: converted.append(convert_trainer_yml(args.convert_model, path)))
+        print(f"Converted {converted[0]} samples to model.bin (version {version})")
+        return
+
+    db = DatabaseManager()
+    face_system = FaceSystem(backend=args.backend, db=db, model_history_mb=args.model_history_mb)
+    if args.migrate_dataset:
+        face_system.samples.migrate(face_system.dataset_path)
+    if args.remove_user is not None:
+        db.delete_user(args.remove_user)
+        face_system.remove_user(args.remove_user)
+    if args.rebuild_model:
+        face_system.train_model()
+    if args.rollback is not None:
+        try:
+            face_system.rollback_model(args.rollback or None)
+        except ValueError as e:
+            print(f"Rollback failed: {e}")
+    if args.model_versions:
+        current = face_system.versions.current()
+        for version in face_system.versions.versions():
+            path = face_system.versions.version_path(version)
+            marker = "*" if version == current else " "
+            print(f"{marker} v{version:<5} {os.path.getsize(path):>10} bytes  {path}")
+    if args.compact_report:
+        from src.compaction import compaction_report, format_report
+        from src.gallery import dequantize
+        if args.backend != "gallery":
+            print("The compaction report needs the gallery backend (--backend gallery).")
+        else:
+            recognizer = face_system.recognizer
+            features = dequantize(recognizer.features, recognizer.scale)
+            print(format_report(compaction_report(features, recognizer.labels, threshold=recognizer.threshold)))
+    if args.compact:
+        face_system.compact_gallery(args.compact, args.dtype)
+    db.close()
+
+def run_reports(args):
+    import datetime
+    from src.storage import DatabaseManager
+    from src.reporting import AttendanceReporter
+
+    start = args.date_from or datetime.date.today().isoformat()
+    end = args.date_to or start
+    db = DatabaseManager()
+    reporter = AttendanceReporter(db)
+    if args.export_report:
+        count = reporter.export_daily_csv(args.export_report, start, end)
+        print(f"Wrote {count} daily rows to {args.export_report}")
+    if args.export_punches:
+        count = reporter.export_punches_csv(args.export_punches, start, end)
+        print(f"Wrote {count} punches to {args.export_punches}")
+    reporter.close()
+    db.close()
+
+def run_import(args):
+    from src.face_core import FaceSystem
+    from src.storage import DatabaseManager
+    from src.bulk_import import bulk_import
+
+    db = DatabaseManager()
+    face_system = FaceSystem(backend=args.backend, db=db, model_history_mb=args.model_history_mb)
+    bulk_import(args.import_source, face_system, db, workers=args.workers, min_samples=args.min_samples,
+                every=args.every if args.every > 1 else 5, rejections_path=args.rejections)
+    db.close()
+
+def run_batch(args):
+    from src.batch import run_batch as run
+    run(args.batch, args.output, backend=args.backend, workers=args.workers,
+        every=args.every, liveness=not args.no_liveness)
+
+def run_streams(args):
+    from src.face_core import FaceSystem
+    from src.storage import DatabaseManager
+    from src.multistream import MultiStreamRunner
+
+    db = DatabaseManager()
+    face_system = FaceSystem(backend=args.backend, db=db, predict_workers=args.predict_workers)
+    runner = MultiStreamRunner(args.streams, face_system, db=db, punch=args.punch,
+                               workers=args.workers or 1, realtime=not args.no_realtime)
+    for name, stats in runner.run().items():
+        print(f"{name} ({stats['source']}): {stats['processed']}/{stats['captured']} frames analyzed, {stats['dropped']} dropped")
+    db.close()
+
+def run_service(args):
+    from src.face_core import FaceSystem
+    from src.storage import DatabaseManager
+    from src.service import RecognitionService
+
+    db = DatabaseManager()
+    face_system = FaceSystem(backend=args.backend, db=db, predict_workers=args.predict_workers)
+    RecognitionService(face_system, args.max_batch, args.max_wait_ms).serve(args.serve, args.host)
+    db.close()
+
+def run_loadgen(args):
+    from src.loadgen import encode_image, run_load
+
+    image = args.image or os.path.join(os.path.dirname(__file__), "assets", "liveness_challenge.png")
+    body = encode_image(image, size=(100, 100) if args.crops else (640, 480))
+    report = run_load(args.loadgen, body, args.concurrency, args.requests,
+                      kind="crop" if args.crops else "frame", liveness=not args.no_liveness)
+    for key, value in report.items():
+        print(f"{key:>15}: {value}")
 
 def main():
+    args = parse_args()
+    from src.metrics import metrics
+
+    # Before the mode dispatch, so the headless modes are instrumented too
+    if args.metrics or args.metrics_file or args.metrics_port:
+        metrics.enable()
+    if args.metrics_port:
+        metrics.serve(args.metrics_port)
+    if args.metrics_file:
+        metrics.write_every(args.metrics_file)
+    try:
+        run_mode(args)
+    finally:
+        metrics.stop_writer()
+        metrics.stop_server()
+
+def run_mode(args):
+    if args.serve:
+        run_service(args)
+        return
+    if args.loadgen:
+        run_loadgen(args)
+        return
+    if args.streams:
+        run_streams(args)
+        return
+    if args.batch:
+        run_batch(args)
+        return
+    if args.import_source:
+        run_import(args)
+        return
+    if args.export_report or args.export_punches:
+        run_reports(args)
+        return
+    if (args.rebuild_model or args.remove_user is not None or args.convert_model or args.migrate_dataset
+            or args.compact or args.compact_report or args.model_versions or args.rollback is not None):
+        run_maintenance(args)
+        return
+
+    from src.ui import AppUI
+    import tkinter as tk
+
     root = tk.Tk()
-    app = AppUI(root)
+    app = AppUI(root, backend=args.backend, predict_workers=args.predict_workers, model_history_mb=args.model_history_mb)
     root.protocol("WM_DELETE_WINDOW", app.on_closing)
     root.mainloop()
 
@@ -0,0 +1,49 @@
+import math
+
+import cv2
+
+
+class FaceAligner:
+    """
+    Normalizes a face to a fixed canonical size from its eye positions.
+
+    One warpAffine rotates the eyes level, scales them to a fixed distance and
+    crops the result straight out of the BGR frame, so only the small output
+    is converted to gray. Every crop has the same size, which keeps LBPH
+    predict cost constant and training samples consistent.
+    """
+    def __init__(self, size=(100, 100), eye_y=0.38, eye_distance=0.42):
+        self.size = size                  # (width, height) of the output crop
+        self.eye_y = eye_y                # Eye line height as a fraction of the height
+        self.eye_distance = eye_distance  # Eye distance as a fraction of the width
+
+    def align(self, frame, left_eye, right_eye):
+        """
+        frame: BGR image. left_eye / right_eye: (x, y) pixel centers of the eye
+        on the left / right side of the image.
+        Returns a gray crop of self.size.
+        """
+        width, height = self.size
+        (lx, ly), (rx, ry) = left_eye, right_eye
+        dx, dy = rx - lx, ry - ly
+        dist = math.hypot(dx, dy)
+        if dist < 1:
+            return None
+
+        center = ((lx + rx) / 2.0, (ly + ry) / 2.0)
+        angle = math.degrees(math.atan2(dy, dx))
+        scale = self.eye_distance * width / dist
+
+        M = cv2.getRotationMatrix2D(center, angle, scale)
+        # Move the eye center to its canonical position
+        M[0, 2] += width / 2.0 - center[0]
+        M[1, 2] += self.eye_y * height - center[1]
+
+        aligned = cv2.warpAffine(frame, M, (width, height), flags=cv2.INTER_LINEAR, borderMode=cv2.BORDER_REPLICATE)
+        return cv2.cvtColor(aligned, cv2.COLOR_BGR2GRAY)
+
+    def resize(self, frame, rect):
+        """Fallback without eye landmarks: crop the box and resize it to self.size."""
+        x, y, w, h = rect
+        face = cv2.resize(frame[y:y+h, x:x+w], self.size, interpolation=cv2.INTER_AREA)
+        return cv2.cvtColor(face, cv2.COLOR_BGR2GRAY)
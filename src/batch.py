@@ -0,0 +1,204 @@
+import os
+import json
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import cv2
+
+from .buffers import FramePool, ScratchBuffers
+from .frame_analysis import FrameAnalysis
+
+VIDEO_EXTENSIONS = (".mp4", ".avi", ".mov", ".mkv", ".webm", ".m4v")
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".bmp")
+IMAGES_PER_JOB = 200 # Large image folders are split so they spread across workers
+
+# Per-process state, created once by init_worker
+_face_system = None
+_liveness = None
+_scratch = ScratchBuffers()
+
+
+def collect_jobs(paths, images_per_job=IMAGES_PER_JOB):
+    """
+    Expand input paths into jobs. A video file is one job; the images of a
+    directory (recursively) are grouped into jobs of images_per_job files.
+    Returns a list of ("video", path) / ("images", [paths]) tuples.
+    """
+    jobs = []
+    for path in paths:
+        if os.path.isfile(path):
+            if path.lower().endswith(IMAGE_EXTENSIONS):
+                jobs.append(("images", [path]))
+            else:
+                jobs.append(("video", path))
+            continue
+
+        videos, images = [], []
+        for root, _, files in os.walk(path):
+            for file_name in sorted(files):
+                full = os.path.join(root, file_name)
+                if file_name.lower().endswith(VIDEO_EXTENSIONS):
+                    videos.append(full)
+                elif file_name.lower().endswith(IMAGE_EXTENSIONS):
+                    images.append(full)
+        jobs.extend(("video", v) for v in sorted(videos))
+        images.sort()
+        for i in range(0, len(images), images_per_job):
+            jobs.append(("images", images[i:i + images_per_job]))
+    return jobs
+
+
+def init_worker(backend, liveness):
+    """Build the recognizer (and face mesh) once per worker process."""
+    global _face_system, _liveness
+    from .face_core import FaceSystem
+    from .liveness import LivenessDetector
+
+    cv2.setNumThreads(1) # The pool already uses every core
+    _face_system = FaceSystem(backend=backend)
+    _liveness = LivenessDetector() if liveness else None
+
+
+def iter_frames(kind, source, every, on_unreadable=None):
+    """
+    Yield (source, frame_index, timestamp_ms, frame) for one job.
+    on_unreadable(path) is called for an image or video that gives no frame.
+    """
+    if kind == "images":
+        for index, path in enumerate(source):
+            frame = cv2.imread(path)
+            if frame is not None:
+                yield path, index, None, frame
+            elif on_unreadable is not None:
+                on_unreadable(path)
+        return
+
+    cap = cv2.VideoCapture(source)
+    pool = FramePool()
+    index = 0
+    try:
+        while True:
+            if index % every:
+                # Skip without decoding
+                if not cap.grab():
+                    break
+                index += 1
+                continue
+            ok, frame = pool.read(cap)
+            if not ok:
+                break
+            yield source, index, round(cap.get(cv2.CAP_PROP_POS_MSEC), 1), frame
+            index += 1
+        if index == 0 and on_unreadable is not None:
+            on_unreadable(source)
+    finally:
+        cap.release()
+
+
+def analyze(frame):
+    """
+    Same analysis as the live UI: the face mesh runs first so recognition
+    reuses its face box, then the recognizer.
+    Returns (result_fields, timings_ms).
+    """
+    analysis = FrameAnalysis(frame, _scratch)
+    timings = {}
+
+    live_info = None
+    if _liveness is not None:
+        start = time.perf_counter()
+        live_info = _liveness.process_frame(frame, analysis)
+        timings["liveness"] = round((time.perf_counter() - start) * 1000, 2)
+
+    start = time.perf_counter()
+    user_id, conf, rect = _face_system.recognize_face(frame, analysis)
+    timings["recognition"] = round((time.perf_counter() - start) * 1000, 2)
+
+    fields = {
+        "face": rect is not None,
+        "rect": [int(v) for v in rect] if rect is not None else None,
+        "user_id": int(user_id) if user_id is not None else None,
+        "confidence": round(float(conf), 2) if rect is not None else None,
+        "matched": user_id is not None and conf < _face_system.match_threshold,
+    }
+    if live_info is not None:
+        fields["liveness"] = {
+            "ear": round(float(live_info["ear"]), 4),
+            "mar": round(float(live_info["mar"]), 4),
+            "is_blinking": bool(live_info["is_blinking"]),
+            "is_smiling": bool(live_info["is_smiling"]),
+            "orientation": live_info["orientation"],
+        }
+    return fields, timings
+
+
+def process_job(job_index, kind, source, part_path, every):
+    """Worker: analyze every frame of one job into its own JSONL part file."""
+    frames = faces = 0
+    start = time.perf_counter()
+    with open(part_path, "w") as out:
+        for path, index, timestamp_ms, frame in iter_frames(kind, source, every):
+            if kind == "images" and _liveness is not None:
+                _liveness.reset() # Unrelated stills: no temporal history between them
+            frame_start = time.perf_counter()
+            fields, timings = analyze(frame)
+            timings["total"] = round((time.perf_counter() - frame_start) * 1000, 2)
+
+            record = {"source": path, "frame": index}
+            if timestamp_ms is not None:
+                record["timestamp_ms"] = timestamp_ms
+            record.update(fields)
+            record["timings_ms"] = timings
+            out.write(json.dumps(record) + "\n")
+
+            frames += 1
+            faces += fields["face"]
+    return job_index, frames, faces, time.perf_counter() - start
+
+
+def run_batch(paths, output, backend="lbph", workers=None, every=1, liveness=True):
+    """
+    Run recognition (and liveness analysis) over video files and image
+    folders without a camera or display, fanning jobs out across a process
+    pool. Per-frame results are written to output as JSONL, in input order.
+    Returns a summary dict.
+    """
+    jobs = collect_jobs(paths)
+    if not jobs:
+        print("No videos or images found.")
+        return {"jobs": 0, "frames": 0, "faces": 0, "seconds": 0.0}
+
+    workers = max(1, min(workers or os.cpu_count() or 1, len(jobs)))
+    every = max(1, every)
+    part_paths = [f"{output}.part{i}" for i in range(len(jobs))]
+    print(f"Processing {len(jobs)} jobs with {workers} workers...")
+
+    start = time.perf_counter()
+    frames = faces = 0
+    try:
+        with ProcessPoolExecutor(max_workers=workers, initializer=init_worker, initargs=(backend, liveness)) as pool:
+            futures = [pool.submit(process_job, i, kind, source, part_paths[i], every)
+                       for i, (kind, source) in enumerate(jobs)]
+            for future in futures:
+                job_index, job_frames, job_faces, seconds = future.result()
+                frames += job_frames
+                faces += job_faces
+                kind, source = jobs[job_index]
+                name = source if kind == "video" else f"{len(source)} images"
+                print(f"[{job_index + 1}/{len(jobs)}] {name}: {job_frames} frames in {seconds:.1f}s")
+
+        # Stitch the per-job parts together in input order
+        with open(output, "w") as out:
+            for part_path in part_paths:
+                with open(part_path) as part:
+                    for line in part:
+                        out.write(line)
+    finally:
+        for part_path in part_paths:
+            if os.path.exists(part_path):
+                os.remove(part_path)
+
+    elapsed = time.perf_counter() - start
+    fps = frames / elapsed if elapsed > 0 else 0.0
+    print(f"Wrote {frames} frames ({faces} with a face) to {output} in {elapsed:.1f}s ({fps:.1f} fps)")
+    return {"jobs": len(jobs), "frames": frames, "faces": faces, "seconds": elapsed}
@@ -0,0 +1,67 @@
+import sys
+import threading
+
+import numpy as np
+
+
+class FramePool:
+    """
+    Reusable capture buffers for cap.read(image).
+
+    A buffer is handed out again only when nothing outside the pool still
+    references it (the display, an inference worker, a queued result or a
+    view such as a face crop slice keep it alive), so a frame is never
+    overwritten while in use. When every buffer is busy a new one is
+    allocated, up to max_buffers; steady state needs no allocation at all.
+    """
+    def __init__(self, max_buffers=8):
+        self.max_buffers = max_buffers
+        self.buffers = []
+        self.allocations = 0 # Frames that could not be read into a pooled buffer
+
+    def acquire(self):
+        """A free buffer for the next read, or None (cap.read allocates)."""
+        for buf in self.buffers:
+            # References: the list, the loop variable and getrefcount's argument
+            if sys.getrefcount(buf) <= 3:
+                return buf
+        return None
+
+    def keep(self, frame):
+        """Call with every frame read; newly allocated frames join the pool while there is room."""
+        if any(frame is buf for buf in self.buffers):
+            return
+        self.allocations += 1
+        if self.buffers and self.buffers[0].shape != frame.shape:
+            self.buffers = [] # Resolution changed; old buffers are released once their users drop them
+        if len(self.buffers) < self.max_buffers:
+            self.buffers.append(frame)
+
+    def read(self, cap):
+        """cap.read() into a free pooled buffer. Returns (ret, frame) like cap.read()."""
+        buf = self.acquire()
+        ret, frame = cap.read(buf) if buf is not None else cap.read()
+        if ret and frame is not None:
+            self.keep(frame)
+        return ret, frame
+
+
+class ScratchBuffers:
+    """
+    Per-thread scratch arrays for intermediate images (color conversions,
+    resized frames) that are only needed while one frame is processed.
+    get() returns the same array for the same name on the same thread, so
+    OpenCV calls can write into it through dst= instead of allocating.
+    Never keep a scratch array past the frame it was made for.
+    """
+    def __init__(self):
+        self._local = threading.local()
+
+    def get(self, name, shape, dtype=np.uint8):
+        buffers = getattr(self._local, "buffers", None)
+        if buffers is None:
+            buffers = self._local.buffers = {}
+        buf = buffers.get(name)
+        if buf is None or buf.shape != tuple(shape) or buf.dtype != dtype:
+            buf = buffers[name] = np.empty(shape, dtype=dtype)
+        return buf
@@ -0,0 +1,195 @@
+import os
+import csv
+import time
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import cv2
+
+from .frame_analysis import FrameAnalysis
+from .enrollment import EnrollmentSampler
+from .batch import VIDEO_EXTENSIONS, IMAGE_EXTENSIONS, iter_frames
+
+MIN_FACE_SIZE = 60 # Pixels; smaller faces are too coarse for a usable crop
+
+_face_system = None # Detector / aligner of this worker process (see init_worker)
+
+
+def collect_people(source):
+    """
+    Photos / clips per employee, in a stable order. Returns {name: [paths]}.
+      - CSV manifest with `name` and `path` columns (one row per file; a path
+        may also be a folder, relative paths are relative to the CSV), or
+      - a folder with one sub-folder per employee, and/or files named after
+        the employee ("Jane Doe.jpg").
+    """
+    media = IMAGE_EXTENSIONS + VIDEO_EXTENSIONS
+    people = {}
+
+    def add(name, path):
+        if os.path.isdir(path):
+            for root, _, files in os.walk(path):
+                for file_name in sorted(files):
+                    if file_name.lower().endswith(media):
+                        people.setdefault(name, []).append(os.path.join(root, file_name))
+        else:
+            people.setdefault(name, []).append(path)
+
+    if os.path.isfile(source):
+        base = os.path.dirname(source)
+        with open(source, newline="") as f:
+            for row in csv.DictReader(f):
+                name, path = (row.get("name") or "").strip(), (row.get("path") or "").strip()
+                if name and path:
+                    add(name, path if os.path.isabs(path) else os.path.join(base, path))
+        return people
+
+    for entry in sorted(os.listdir(source)):
+        full = os.path.join(source, entry)
+        if os.path.isdir(full):
+            add(entry, full)
+        elif entry.lower().endswith(media):
+            add(os.path.splitext(entry)[0], full)
+    return people
+
+
+def init_worker(backend):
+    """Build the detector / aligner once per worker process (no model; the parent updates it)."""
+    global _face_system
+    from .face_core import FaceSystem
+
+    cv2.setNumThreads(1) # One worker per core; OpenCV threads would only contend
+    _face_system = FaceSystem(backend=backend, load=False)
+
+
+def face_in(frame):
+    """
+    The subject's face crop in one photo / frame. Returns (gray_crop, yaw, None)
+    or (None, None, reason).
+    """
+    analysis = FrameAnalysis(frame)
+    faces = _face_system.detect_faces(analysis)
+    if not faces:
+        return None, None, "no face"
+    if len(faces) > 1:
+        (_, _, w0, h0), (_, _, w1, h1) = faces[0][0], faces[1][0]
+        if w0 * h0 < 2 * w1 * h1:
+            return None, None, "multiple faces" # No clearly dominant subject
+    rect, eyes, yaw = faces[0]
+    if min(rect[2], rect[3]) < MIN_FACE_SIZE:
+        return None, None, "face too small"
+    gray = _face_system.crop_face(frame, rect, eyes)
+    if gray is None:
+        return None, None, "crop failed"
+    return gray, yaw, None
+
+
+def extract_person(name, paths, budget, every):
+    """
+    Worker: detect, crop and select up to `budget` samples for one employee.
+    Photos are offered to an EnrollmentSampler (sharpness, pose and
+    near-duplicate checks, the same as kiosk registration); clips every
+    `every`-th frame. Returns (name, samples, rejections, frames_seen)
+    with rejections as [(path, reason)].
+    """
+    sampler = EnrollmentSampler(budget=budget, max_frames=10 ** 9)
+    rejections = []
+
+    def offer(frame):
+        gray, yaw, reason = face_in(frame)
+        if gray is None:
+            return reason
+        blur = sampler.rejected_blur
+        if sampler.offer(gray, yaw):
+            return None
+        return "blurry" if sampler.rejected_blur > blur else "duplicate"
+
+    def unreadable(path):
+        rejections.append((path, "unreadable"))
+
+    for path in paths:
+        video = path.lower().endswith(VIDEO_EXTENSIONS)
+        reasons = set()
+        for _, _, _, frame in iter_frames("video" if video else "images", path if video else [path], every, unreadable):
+            reasons.add(offer(frame))
+        if not reasons or None in reasons:
+            continue # Unreadable (already recorded) or at least one sample kept
+        if video:
+            rejections.append((path, "no usable frames (" + ", ".join(sorted(reasons)) + ")"))
+        else:
+            rejections.append((path, reasons.pop()))
+
+    return name, sampler.samples, rejections, sampler.frames_seen
+
+
+def write_rejections(path, rejections):
+    with open(path, "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(["name", "path", "reason"])
+        writer.writerows(rejections)
+
+
+def bulk_import(source, face_system, db, workers=None, budget=20, min_samples=1, every=5,
+                rejections_path="rejections.csv"):
+    """
+    Enroll every employee found in `source` (see collect_people).
+    Faces are detected and cropped across a process pool, new users are
+    inserted in one database transaction and the model is updated once at
+    the end. Employees whose name is already registered are skipped.
+    Returns a summary dict.
+    """
+    people = collect_people(source)
+    existing = set(db.get_users_dict().values())
+    rejections = []
+    for name in [n for n in people if n in existing]:
+        rejections.append((name, "", "already registered"))
+        del people[name]
+    if not people:
+        print("No new employees found.")
+        write_rejections(rejections_path, rejections)
+        return {"people": 0, "enrolled": 0, "samples": 0, "rejected": len(rejections), "seconds": 0.0}
+
+    workers = max(1, min(workers or os.cpu_count() or 1, len(people)))
+    total_files = sum(len(paths) for paths in people.values())
+    print(f"Importing {len(people)} employees ({total_files} files) with {workers} workers...")
+
+    start = time.perf_counter()
+    face_system.prepare_standby() # Loads the model copy while the workers extract faces
+    results = {}
+    # Spawned, not forked: the parent already runs MediaPipe graphs, which do not survive a fork
+    context = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=workers, mp_context=context, initializer=init_worker,
+                             initargs=(face_system.backend,)) as pool:
+        futures = [pool.submit(extract_person, name, paths, budget, max(1, every)) for name, paths in people.items()]
+        for done, future in enumerate(as_completed(futures), 1):
+            name, samples, person_rejections, frames = future.result()
+            results[name] = samples
+            rejections.extend((name, path, reason) for path, reason in person_rejections)
+            print(f"[{done}/{len(people)}] {name}: {len(samples)} samples from {frames} faces, "
+                  f"{len(person_rejections)} rejected")
+
+    # Input order, and only employees with enough usable samples
+    accepted = [(name, results[name]) for name in people if len(results[name]) >= min_samples]
+    for name in people:
+        if len(results[name]) < min_samples:
+            rejections.append((name, "", f"only {len(results[name])} usable samples (need {min_samples})"))
+
+    enrolled = samples = 0
+    if accepted:
+        user_ids = db.add_users([name for name, _ in accepted])
+        by_user = dict(zip(user_ids, (person_samples for _, person_samples in accepted)))
+        if face_system.enroll_users(by_user):
+            face_system.flush_model()
+            enrolled = len(accepted)
+            samples = sum(len(s) for s in by_user.values())
+        else:
+            # Keep the database consistent with the model
+            for uid in user_ids:
+                db.delete_user(uid)
+
+    write_rejections(rejections_path, rejections)
+    elapsed = time.perf_counter() - start
+    print(f"Enrolled {enrolled}/{len(people)} employees ({samples} samples) in {elapsed:.1f}s; "
+          f"{len(rejections)} rejections written to {rejections_path}")
+    return {"people": len(people), "enrolled": enrolled, "samples": samples,
+            "rejected": len(rejections), "seconds": elapsed}
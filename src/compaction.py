@@ -0,0 +1,119 @@
+import time
+
+import numpy as np
+import cv2
+
+from .gallery import GalleryMatcher, quantize
+
+DTYPE_NAMES = {"float32": np.float32, "float16": np.float16, "uint8": np.uint8}
+
+
+def user_prototypes(features, k, attempts=3, seed=0):
+    """
+    Cluster one user's feature rows (n, D) into at most k prototypes with
+    k-means. Users with k or fewer samples are kept as they are. The centroids
+    are means of square-rooted histograms, so matching against them averages
+    out per-sample noise (blur, lighting) instead of keeping every sample.
+    """
+    features = np.asarray(features, dtype=np.float32)
+    if len(features) <= k:
+        return features
+    if k == 1:
+        return features.mean(axis=0, keepdims=True)
+
+    cv2.setRNGSeed(seed)
+    criteria = (cv2.TERM_CRITERIA_EPS + cv2.TERM_CRITERIA_MAX_ITER, 20, 1e-4)
+    _, assignment, centers = cv2.kmeans(features, k, None, criteria, attempts, cv2.KMEANS_PP_CENTERS)
+    # An empty cluster leaves a meaningless center; keep only the used ones
+    used = np.unique(assignment.ravel())
+    return centers[used]
+
+
+def compact(features, labels, prototypes=3):
+    """Replace each user's rows by at most `prototypes` k-means centroids. Returns (features, labels)."""
+    features = np.asarray(features, dtype=np.float32)
+    labels = np.asarray(labels, dtype=np.int32)
+    out_features = []
+    out_labels = []
+    for uid in np.unique(labels):
+        rows = user_prototypes(features[labels == uid], prototypes)
+        out_features.append(rows)
+        out_labels.append(np.full(len(rows), uid, dtype=np.int32))
+    if not out_features:
+        return features, labels
+    return np.concatenate(out_features), np.concatenate(out_labels)
+
+
+def build_matcher(features, labels, prototypes=None, dtype="float32", threshold=40):
+    """GalleryMatcher over the compacted (prototypes=None keeps every row) and quantized gallery."""
+    if prototypes:
+        features, labels = compact(features, labels, prototypes)
+    features, scale = quantize(features, DTYPE_NAMES[dtype])
+    return GalleryMatcher(features, labels, threshold=threshold, scale=scale)
+
+
+def split_holdout(features, labels, fraction=0.2, seed=0):
+    """
+    Per-user split: about `fraction` of each user's rows (at least one, if
+    the user has two or more) become probes, the rest stay in the gallery.
+    """
+    rng = np.random.default_rng(seed)
+    features = np.asarray(features, dtype=np.float32)
+    labels = np.asarray(labels, dtype=np.int32)
+    probe = np.zeros(len(labels), dtype=bool)
+    for uid in np.unique(labels):
+        rows = np.flatnonzero(labels == uid)
+        if len(rows) < 2:
+            continue
+        count = max(1, int(len(rows) * fraction))
+        probe[rng.choice(rows, count, replace=False)] = True
+    return features[~probe], labels[~probe], features[probe], labels[probe]
+
+
+def evaluate(matcher, probes, probe_labels, repeats=3):
+    """Rank-1 accuracy, accepted rate (match below threshold), bytes and per-probe latency."""
+    best = None
+    for _ in range(repeats):
+        start = time.perf_counter()
+        matches = matcher.match_many(probes, k=1)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+
+    predicted = np.array([m[0][0] if m else -1 for m in matches])
+    distance = np.array([m[0][1] if m else np.inf for m in matches])
+    correct = predicted == probe_labels
+    return {
+        "rows": len(matcher.labels),
+        "bytes": matcher.nbytes,
+        "accuracy": float(correct.mean()) if len(correct) else 0.0,
+        "accepted": float((correct & (distance < matcher.threshold)).mean()) if len(correct) else 0.0,
+        "ms_per_probe": best * 1000 / max(1, len(probes)),
+    }
+
+
+def compaction_report(features, labels, prototypes=(None, 1, 3, 5), dtypes=("float32", "float16", "uint8"),
+                      threshold=40, fraction=0.2):
+    """
+    Accuracy / size / latency for each (prototypes, dtype) setting, measured
+    on held-out rows of the gallery itself. Returns a list of result dicts.
+    """
+    gallery, gallery_labels, probes, probe_labels = split_holdout(features, labels, fraction)
+    if not len(probes):
+        raise ValueError("Need at least two samples per user to evaluate compaction")
+
+    results = []
+    for k in prototypes:
+        for dtype in dtypes:
+            matcher = build_matcher(gallery, gallery_labels, k, dtype, threshold)
+            result = evaluate(matcher, probes, probe_labels)
+            result.update({"prototypes": k or "all", "dtype": dtype})
+            results.append(result)
+    return results
+
+
+def format_report(results):
+    lines = [f"{'prototypes':>10} {'dtype':>8} {'rows':>8} {'size':>10} {'accuracy':>9} {'accepted':>9} {'ms/probe':>9}"]
+    for r in results:
+        lines.append(f"{r['prototypes']:>10} {r['dtype']:>8} {r['rows']:>8} {r['bytes'] / 1024:>8.0f}KB "
+                     f"{r['accuracy']:>9.1%} {r['accepted']:>9.1%} {r['ms_per_probe']:>9.3f}")
+    return "\n".join(lines)
@@ -0,0 +1,122 @@
+import numpy as np
+import cv2
+
+POSES = ("LEFT", "CENTER", "RIGHT")
+
+
+def pose_bin(yaw):
+    """
+    yaw: nose position between the eyes (0 = over the left eye, 1 = over the
+    right eye, 0.5 = frontal) or None if unknown.
+    """
+    if yaw is None or 0.4 <= yaw <= 0.6:
+        return "CENTER"
+    return "LEFT" if yaw < 0.4 else "RIGHT"
+
+
+class EnrollmentSampler:
+    """
+    Keeps a small, diverse subset of registration crops instead of every frame.
+
+    Each offered crop is scored for
+      - sharpness: variance of the Laplacian, blurry crops are rejected,
+      - pose: LEFT / CENTER / RIGHT bin, each with its own share of the budget,
+      - dissimilarity: distance of a small normalized thumbnail to the crops
+        already kept; near-duplicates are rejected.
+    When a pose bin is full, a new crop replaces the most redundant one in
+    that bin if it adds more diversity.
+    """
+    def __init__(self, budget=20, min_sharpness=30.0, min_distance=0.1, max_frames=150):
+        self.budget = budget
+        self.min_sharpness = min_sharpness
+        self.min_distance = min_distance
+        self.max_frames = max_frames
+
+        # Half the budget for frontal crops, the rest split between the sides
+        side = budget // 4
+        self.pose_budget = {"LEFT": side, "CENTER": budget - 2 * side, "RIGHT": side}
+
+        self.kept = {pose: [] for pose in POSES} # pose -> [(crop, thumbnail)]
+        self.frames_seen = 0
+        self.rejected_blur = 0
+        self.rejected_similar = 0
+
+    @staticmethod
+    def sharpness(gray_crop):
+        return float(cv2.Laplacian(gray_crop, cv2.CV_64F).var())
+
+    @staticmethod
+    def thumbnail(gray_crop):
+        thumb = cv2.resize(gray_crop, (24, 24), interpolation=cv2.INTER_AREA).astype(np.float32).ravel()
+        thumb -= thumb.mean()
+        norm = np.linalg.norm(thumb)
+        return thumb / norm if norm > 0 else thumb
+
+    def _all_thumbs(self):
+        thumbs = [t for pose in POSES for _, t in self.kept[pose]]
+        return np.array(thumbs) if thumbs else np.zeros((0, 576), dtype=np.float32)
+
+    def offer(self, gray_crop, yaw=None):
+        """Score one crop; returns True if it was kept."""
+        self.frames_seen += 1
+        if self.sharpness(gray_crop) < self.min_sharpness:
+            self.rejected_blur += 1
+            return False
+
+        thumb = self.thumbnail(gray_crop)
+        thumbs = self._all_thumbs()
+        nearest = float(np.min(np.linalg.norm(thumbs - thumb, axis=1))) if len(thumbs) else np.inf
+        if nearest < self.min_distance:
+            self.rejected_similar += 1
+            return False
+
+        pose = pose_bin(yaw)
+        bucket = self.kept[pose]
+        if len(bucket) < self.pose_budget[pose]:
+            bucket.append((gray_crop, thumb))
+            return True
+        if not bucket:
+            return False # No share of the budget for this pose (budget < 4)
+
+        # Bin full: swap out its most redundant crop if the new one is more distinct
+        bucket_thumbs = np.array([t for _, t in bucket])
+        pairwise = np.linalg.norm(bucket_thumbs[:, None, :] - bucket_thumbs[None, :, :], axis=2)
+        np.fill_diagonal(pairwise, np.inf)
+        redundancy = pairwise.min(axis=1)
+        worst = int(np.argmin(redundancy))
+        if nearest > redundancy[worst]:
+            bucket[worst] = (gray_crop, thumb)
+            return True
+        self.rejected_similar += 1
+        return False
+
+    @property
+    def samples(self):
+        return [crop for pose in POSES for crop, _ in self.kept[pose]]
+
+    def is_complete(self):
+        """Budget filled in every pose bin, or the frame limit was reached."""
+        full = all(len(self.kept[pose]) >= self.pose_budget[pose] for pose in POSES)
+        return full or self.frames_seen >= self.max_frames
+
+    def missing_pose(self):
+        """First pose bin that still needs samples (for operator prompts), or None."""
+        for pose in ("CENTER", "LEFT", "RIGHT"):
+            if len(self.kept[pose]) < self.pose_budget[pose]:
+                return pose
+        return None
+
+    def coverage(self):
+        report = {pose: len(self.kept[pose]) for pose in POSES}
+        report.update({
+            "kept": len(self.samples),
+            "budget": self.budget,
+            "frames_seen": self.frames_seen,
+            "rejected_blur": self.rejected_blur,
+            "rejected_similar": self.rejected_similar,
+        })
+        return report
+
+    def coverage_text(self):
+        c = self.coverage()
+        return f"Kept {c['kept']}/{c['budget']}  L:{c['LEFT']} C:{c['CENTER']} R:{c['RIGHT']}"
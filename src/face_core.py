@@ -3,134 +3,661 @@ import numpy as np
 import os
 import mediapipe as mp
 import shutil
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from .frame_analysis import FrameAnalysis
+from .gallery import GalleryMatcher, extract_features, dequantize
+from .compaction import build_matcher
+from . import model_io
+from .sample_store import SampleStore
+from .alignment import FaceAligner
+from .metrics import metrics
+from .model_versions import ModelVersions, ModelWatcher
+
+# Recognizer backends
+BACKEND_LBPH = "lbph"        # OpenCV LBPHFaceRecognizer, model in trainer.yml
+BACKEND_GALLERY = "gallery"  # Vectorized GalleryMatcher, features in users.embedding
 
 class FaceSystem:
-    def __init__(self, dataset_path="dataset", trainer_path="trainer.yml"):
-        self.dataset_path = dataset_path
+    def __init__(self, dataset_path="dataset", trainer_path="trainer.yml", backend=BACKEND_LBPH, db=None, model_path="model.bin", samples_path="samples", face_size=(100, 100), detect_width=320, predict_workers=0, model_history=5, model_history_mb=None, load=True):
+        self.dataset_path = dataset_path # Legacy <id>/<i>.jpg layout, migrated into the sample store
+        self.samples = SampleStore(samples_path)
         self.trainer_path = trainer_path
-        self.recognizer = cv2.face.LBPHFaceRecognizer_create()
+        self.model_path = model_path # Binary gallery model (memory-mapped)
+        self.backend = backend
+        self.db = db # DatabaseManager, required by the gallery backend
+        # Canonical crop size for enrollment and recognition; None keeps raw detector boxes
+        self.aligner = FaceAligner(face_size) if face_size else None
+        # Detection runs on a frame at most this wide; boxes are relative, so
+        # they map back to full resolution for cropping (None = full frame)
+        self.detect_width = detect_width
+        # Optional thread pool for LBPH predicts of several faces in one frame
+        self.predict_pool = ThreadPoolExecutor(max_workers=predict_workers) if predict_workers > 1 else None
+        self.recognizer = self.create_recognizer()
         self.mp_face_detection = mp.solutions.face_detection
         self.detector = self.mp_face_detection.FaceDetection(min_detection_confidence=0.5)
-        
-        self.load_model()
+        # MediaPipe graphs are not thread-safe: each concurrent caller (streams,
+        # service request threads) borrows its own, created on first need
+        self.idle_detectors = queue.LifoQueue()
+        self.idle_detectors.put(self.detector)
+
+        # Models are built into a new recognizer and swapped in when complete;
+        # the lock only serializes writers, predict never waits on it
+        self.model_lock = threading.RLock()
+        self.versions = ModelVersions(self.model_path if backend == BACKEND_GALLERY else self.trainer_path, keep=model_history,
+                                      max_bytes=model_history_mb * 1024 * 1024 if model_history_mb else None)
+        self.model_signature = None # Live file identity the current recognizer was loaded from
+
+        # LBPH double buffer: enrollment updates a standby copy of the live
+        # model and swaps it in; the replaced instance catches up on the
+        # model writer thread and becomes the next standby. A snapshot of
+        # its histograms is written to disk on the saver thread, so neither
+        # enrollment nor the next standby waits for the file
+        self.standby = None # Future of the next standby recognizer (None: read it from the live file)
+        self.model_writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="model-writer")
+        self.model_saver = ThreadPoolExecutor(max_workers=1, thread_name_prefix="model-saver")
+        self.save_lock = threading.Lock()
+        self.save_snapshot = None # Newest (histograms, labels) not yet written
+        self.save_job = None # Future of the running save
+        self.saving = False
+        # Guards self.recognizer swaps and the in-flight predict counts; the
+        # counts are keyed by the recognizer itself (cv2 objects take no
+        # attributes), which also keeps a counted instance alive
+        self.readers = threading.Condition()
+        self.active_predicts = {} # recognizer -> predicts in flight on it
+
+        if load: # load=False: detection / alignment only, the recognizer stays empty
+            self.load_model()
+
+    def create_recognizer(self):
+        if self.backend == BACKEND_GALLERY:
+            return GalleryMatcher()
+        return cv2.face.LBPHFaceRecognizer_create()
+
+    @property
+    def match_threshold(self):
+        """Distance below which a prediction counts as a match."""
+        if self.backend == BACKEND_GALLERY:
+            return self.recognizer.threshold
+        return 85 # RELAXED THRESHOLD from 70 to 85
 
     def load_model(self):
+        self.model_signature = self.versions.signature()
+        if self.backend == BACKEND_GALLERY:
+            if os.path.exists(self.model_path):
+                try:
+                    self.recognizer = self.read_model()
+                    print(f"Gallery loaded from {self.model_path} ({len(self.recognizer)} users).")
+                    return
+                except Exception as e:
+                    print(f"Error loading model: {e}")
+
+            # No binary model yet: build it from the per-user embeddings
+            recognizer = GalleryMatcher(threshold=self.recognizer.threshold)
+            embeddings = self.db.get_user_embeddings() if self.db else {}
+            for uid, features in embeddings.items():
+                recognizer.add(uid, features)
+            self.recognizer = recognizer
+            if embeddings:
+                self.save_gallery()
+            print(f"Gallery loaded ({len(self.recognizer)} users).")
+            return
+
         if os.path.exists(self.trainer_path):
             try:
-                self.recognizer.read(self.trainer_path)
+                self.recognizer = self.read_model()
                 print("Model loaded.")
             except Exception as e:
                 print(f"Error loading model: {e}")
-                
-    def get_face_crop(self, frame):
+
+    def read_model(self):
+        """A new recognizer loaded from the live model file (empty if there is none)."""
+        if self.backend == BACKEND_GALLERY:
+            if not os.path.exists(self.model_path):
+                return GalleryMatcher(threshold=self.recognizer.threshold)
+            # Memory-mapped read-only: shared between processes, no parse step
+            features, labels, header = model_io.load_model(self.model_path)
+            return GalleryMatcher(features, labels, threshold=self.recognizer.threshold, scale=header["scale"])
+
+        # read() appends histograms, so always load into a fresh instance
+        recognizer = self.create_recognizer()
+        if os.path.exists(self.trainer_path):
+            recognizer.read(self.trainer_path)
+        return recognizer
+
+    def reload_model(self):
+        """Swap in the live model file if it changed since it was loaded. Returns True on a swap."""
+        with self.model_lock:
+            if (self.standby is not None and not self.standby.done()) or self.save_pending:
+                return False # Our own enrollment is still being saved
+            signature = self.versions.signature()
+            if signature == self.model_signature:
+                return False
+            self.settle_standby()
+            self.swap_recognizer(self.read_model())
+            self.model_signature = signature
+        version = self.versions.current()
+        print(f"Model reloaded{f' (version {version})' if version else ''}.")
+        return True
+
+    def watch_model(self, interval=2.0, on_reload=None):
+        """Pick up models published by other processes; returns the started ModelWatcher."""
+        return ModelWatcher(self, interval, on_reload).start()
+
+    def rollback_model(self, version=None):
+        """Make an earlier model version live again (other processes follow through their watchers)."""
+        with self.model_lock:
+            self.settle_standby()
+            version = self.versions.rollback(version)
+            self.reload_model()
+        print(f"Rolled back to model version {version}.")
+        return version
+
+    def publish_model(self, recognizer, write):
+        """
+        Write a finished recognizer as a new model version, then swap it in.
+        write(path) saves it; the live file is replaced atomically.
+        """
+        with self.model_lock:
+            self.settle_standby()
+            version = self.versions.publish(write)
+            self.swap_recognizer(recognizer)
+            self.model_signature = self.versions.signature() # Our own change, not a reload for the watcher
+        return version
+
+    def settle_standby(self):
+        """
+        Wait for pending enrollment work (standby update and save) and drop
+        the standby copy; call under model_lock before the live model is
+        replaced any other way.
+        """
+        job, self.standby = self.standby, None
+        if job is not None:
+            job.result() # The writer never takes model_lock, so this can not deadlock
+        self.wait_saves()
+
+    def prepare_standby(self):
+        """
+        Start reading the standby copy in the background (e.g. while a
+        registration is being captured), so the first enrollment does not
+        parse the model file itself.
+        """
+        with self.model_lock:
+            if self.backend != BACKEND_GALLERY and self.standby is None:
+                self.standby = self.model_writer.submit(self.read_model)
+
+    @property
+    def save_pending(self):
+        with self.save_lock:
+            return self.saving
+
+    def queue_save(self, histograms, labels):
+        """Write this model state as a new version on the saver thread; newer states replace queued ones."""
+        with self.save_lock:
+            self.save_snapshot = (histograms, labels)
+            if not self.saving:
+                self.saving = True
+                self.save_job = self.model_saver.submit(self.save_latest)
+
+    def save_latest(self):
+        """Saver thread: write the newest queued snapshot until none is left."""
+        while True:
+            with self.save_lock:
+                snapshot, self.save_snapshot = self.save_snapshot, None
+                if snapshot is None:
+                    self.saving = False
+                    return
+            try:
+                histograms, labels = snapshot
+                self.versions.publish(lambda path: self._write_histograms(histograms, labels, path))
+                self.model_signature = self.versions.signature() # Our own change, not a reload for the watcher
+            except Exception as e:
+                print(f"Error saving model: {e}")
+
+    def wait_saves(self):
+        with self.save_lock:
+            job = self.save_job
+        if job is not None:
+            job.result()
+
+    def flush_model(self):
+        """Block until every enrollment so far is written to disk (the standby is kept)."""
+        job = self.standby
+        if job is not None:
+            job.result()
+        self.wait_saves()
+
+    def take_standby(self):
+        """The standby recognizer (equal to the live model); call under model_lock."""
+        job, self.standby = self.standby, None
+        if job is None:
+            # First enrollment since load / reload: one full parse of the model file
+            return self.read_model()
+        standby = job.result()
+        if standby is None:
+            # The last save failed, so the file is stale; retrain from the
+            # sample store, which already holds every enrolled sample
+            print("Rebuilding the standby model from the stored samples.")
+            faces, ids = self.load_dataset()
+            standby = self.create_recognizer()
+            standby.train(faces, np.array(ids, dtype=np.int32))
+        return standby
+
+    def swap_recognizer(self, recognizer):
+        """Make `recognizer` live; returns the one it replaced."""
+        with self.readers:
+            previous, self.recognizer = self.recognizer, recognizer
+        return previous
+
+    def sync_standby(self, recognizer, live, faces, ids):
+        """
+        Model writer thread: replay an enrollment on the instance it
+        replaced, once no predict is using it any more, and queue a snapshot
+        of it for the saver. Returns it as the next standby.
+        If the replay fails the live model is saved instead and read back
+        as the standby; None means neither worked (take_standby retrains).
+        """
+        with self.readers:
+            self.readers.wait_for(lambda: recognizer not in self.active_predicts)
+        try:
+            recognizer.update(faces, ids)
+            # A copy of the histograms: the standby may be updated again while the file is written
+            self.queue_save(recognizer.getHistograms(), recognizer.getLabels())
+            return recognizer
+        except Exception as e:
+            print(f"Standby update failed ({e}), saving the live model instead.")
+        try:
+            self.wait_saves() # An older queued state must not land after this one
+            # write() only reads the model, so the live instance can be saved while it serves
+            self.versions.publish(live.write)
+            self.model_signature = self.versions.signature()
+            return self.read_model()
+        except Exception as e:
+            print(f"Error saving model: {e}")
+            return None
+
+    def save_gallery(self, recognizer=None):
+        """Publish a gallery (default: the current one) as a new model version and serve it."""
+        recognizer = recognizer or self.recognizer
+        try:
+            self.publish_model(recognizer, lambda path: model_io.save_model(
+                path, recognizer.features, recognizer.labels, scale=recognizer.scale))
+        except Exception as e:
+            print(f"Error saving model: {e}")
+
+    def compact_gallery(self, prototypes=3, dtype="float32"):
+        """
+        Shrink the gallery model: each user's samples become at most
+        `prototypes` k-means centroids, stored as float32, float16 or uint8.
+        The per-user embeddings in the database keep every sample, so a
+        rebuild restores the full gallery. Returns (rows_before, rows_after).
+        """
+        if self.backend != BACKEND_GALLERY:
+            print("Compaction needs the gallery backend (--backend gallery).")
+            return None
+
+        before = self.recognizer
+        features = dequantize(before.features, before.scale)
+        self.save_gallery(build_matcher(features, before.labels, prototypes, dtype, before.threshold))
+        print(f"Gallery compacted: {len(before.labels)} -> {len(self.recognizer.labels)} rows, "
+              f"{before.nbytes // 1024} KB -> {self.recognizer.nbytes // 1024} KB ({dtype}).")
+        return len(before.labels), len(self.recognizer.labels)
+
+    def get_face_crop(self, frame, analysis=None):
         """
         Returns (gray_face_crop, rect_coords) or (None, None)
         rect_coords: (x, y, w, h)
+        analysis: optional FrameAnalysis shared with LivenessDetector. If the
+        face mesh already ran on this frame its landmarks give the box and
+        the FaceDetection pass is skipped.
         """
-        rgb_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-        results = self.detector.process(rgb_frame)
-        
-        if results.detections:
-            # Get largest face
+        if analysis is None:
+            analysis = FrameAnalysis(frame)
+
+        rect = analysis.mesh_face_box()
+        if rect is not None:
+            eyes = analysis.mesh_eye_points()
+        else:
+            rect, eyes = self.detect_face(analysis)
+
+        if rect is not None:
+            gray_crop = self.crop_face(frame, rect, eyes)
+            if gray_crop is not None:
+                return gray_crop, rect
+
+        return None, None
+
+    def crop_face(self, frame, rect, eyes=None):
+        """
+        Gray face crop for recognition. With an aligner the crop is rotated
+        and scaled from the eye points (or just resized without them) to the
+        canonical size; otherwise the raw box is returned.
+        """
+        if self.aligner is None:
+            x, y, w, h = rect
+            return cv2.cvtColor(frame[y:y+h, x:x+w], cv2.COLOR_BGR2GRAY)
+        if eyes is not None:
+            aligned = self.aligner.align(frame, *eyes)
+            if aligned is not None:
+                return aligned
+        return self.aligner.resize(frame, rect)
+
+    def detect_face(self, analysis):
+        """
+        Run FaceDetection on the shared, downscaled RGB frame.
+        Returns ((x, y, w, h), (left_eye, right_eye)) of the largest face or (None, None).
+        """
+        faces = self.detect_faces(analysis)
+        if not faces:
+            return None, None
+        rect, eyes, yaw = faces[0]
+        analysis.yaw = yaw
+        return rect, eyes
+
+    def detect_faces(self, analysis, max_faces=None):
+        """
+        All detected faces, largest (closest) first.
+        Returns [((x, y, w, h), (left_eye, right_eye) or None, yaw or None), ...]
+        """
+        if analysis.detections is None:
+            rgb = analysis.scaled_rgb(self.detect_width)
+            try:
+                detector = self.idle_detectors.get_nowait()
+            except queue.Empty:
+                detector = self.mp_face_detection.FaceDetection(min_detection_confidence=0.5)
+            try:
+                with metrics.stage("detect"):
+                    analysis.detections = detector.process(rgb)
+            finally:
+                self.idle_detectors.put(detector)
+        results = analysis.detections
+        if not results.detections:
+            return []
+
+        ih, iw = analysis.frame.shape[:2]
+        faces = []
+        for detection in results.detections:
             # detection relative bounding box
-            detection = results.detections[0] # Assume 1 face
             bboxC = detection.location_data.relative_bounding_box
-            ih, iw, _ = frame.shape
             x, y, w, h = int(bboxC.xmin * iw), int(bboxC.ymin * ih), int(bboxC.width * iw), int(bboxC.height * ih)
-            
-            # Padding/Margin to ensure full face
+
             # Ensure within bounds
             x = max(0, x)
             y = max(0, y)
             w = min(iw - x, w)
             h = min(ih - y, h)
-            
-            if w > 0 and h > 0:
-                face_crop = frame[y:y+h, x:x+w]
-                gray_crop = cv2.cvtColor(face_crop, cv2.COLOR_BGR2GRAY)
-                return gray_crop, (x, y, w, h)
-                
-        return None, None
+            if w <= 0 or h <= 0:
+                continue
+
+            # Keypoints 0/1 are the subject's right/left eye (image left/right)
+            keypoints = detection.location_data.relative_keypoints
+            eyes = None
+            yaw = None
+            if len(keypoints) >= 2:
+                eyes = ((keypoints[0].x * iw, keypoints[0].y * ih), (keypoints[1].x * iw, keypoints[1].y * ih))
+            if len(keypoints) >= 3 and keypoints[1].x != keypoints[0].x:
+                # Keypoint 2 is the nose tip; 0.5 means a frontal face
+                yaw = (keypoints[2].x - keypoints[0].x) / (keypoints[1].x - keypoints[0].x)
+            faces.append(((x, y, w, h), eyes, yaw))
+
+        faces.sort(key=lambda face: face[0][2] * face[0][3], reverse=True)
+        return faces[:max_faces] if max_faces else faces
+
+    def get_face_crops(self, frame, analysis=None, max_faces=None):
+        """
+        Crops of every detected face, largest first: [(gray_face_crop, rect), ...]
+        """
+        if analysis is None:
+            analysis = FrameAnalysis(frame)
+        crops = []
+        for rect, eyes, _ in self.detect_faces(analysis, max_faces):
+            gray_crop = self.crop_face(frame, rect, eyes)
+            if gray_crop is not None:
+                crops.append((gray_crop, rect))
+        return crops
 
     def save_samples(self, user_id, samples):
         """
         Save list of face images for a user.
         samples: list of gray_scale face images
         """
-        user_dir = os.path.join(self.dataset_path, str(user_id))
-        if not os.path.exists(user_dir):
-            os.makedirs(user_dir)
-            
-        for i, face in enumerate(samples):
-            path = os.path.join(user_dir, f"{i}.jpg")
-            cv2.imwrite(path, face)
+        self.samples.save(user_id, samples)
 
-    def train_model(self):
+    def enroll_user(self, user_id, samples):
+        """
+        Incrementally add one user's samples to the existing model.
+        Only the new samples are processed; histograms of already enrolled
+        users are kept as-is, so cost does not grow with headcount.
         """
-        Traverse dataset, load all images, train recognizer, save trainer.yml.
+        return self.enroll_users({user_id: samples})
+
+    def enroll_users(self, samples_by_user):
+        """
+        Add several users ({user_id: samples}) to the model in one update
+        and one published model version (bulk import).
         """
         faces = []
         ids = []
-        
-        if not os.path.exists(self.dataset_path):
+        for user_id, samples in samples_by_user.items():
+            self.save_samples(user_id, samples)
+            user_faces = [face for face in samples if face is not None and face.size > 0]
+            faces.extend(user_faces)
+            ids.extend([int(user_id)] * len(user_faces))
+        if not faces:
+            print("No samples to enroll.")
+            return False
+        ids_np = np.array(ids, dtype=np.int32)
+        summary = (f"user {ids[0]}" if len(samples_by_user) == 1 else f"{len(np.unique(ids_np))} users") + f" ({len(faces)} samples)"
+
+        if self.backend == BACKEND_GALLERY:
+            features = np.stack([extract_features(face) for face in faces])
+            with self.model_lock:
+                recognizer = GalleryMatcher(self.recognizer.features, self.recognizer.labels,
+                                            threshold=self.recognizer.threshold, scale=self.recognizer.scale)
+                recognizer.extend(features, ids_np)
+                self.save_gallery(recognizer)
+            if self.db:
+                self.db.set_user_embeddings({int(uid): features[ids_np == uid] for uid in np.unique(ids_np)})
+            print(f"Enrolled {summary}.")
+            return True
+
+        try:
+            with self.model_lock:
+                # Update the standby copy; predict keeps using the live one until the swap
+                recognizer = self.take_standby()
+                # update() appends to the trained histograms (works on an empty model too)
+                recognizer.update(faces, ids_np)
+                previous = self.swap_recognizer(recognizer)
+                # The replaced instance catches up and is saved off the critical path
+                self.standby = self.model_writer.submit(self.sync_standby, previous, recognizer, faces, ids_np)
+            print(f"Enrolled {summary}.")
+            return True
+        except Exception as e:
+            print(f"Enrollment Error: {e}")
+            return False
+
+    def remove_user(self, user_id):
+        """
+        Remove a user's samples and drop their histograms from the model.
+        LBPH has no delete API, so the remaining histograms are written back
+        in OpenCV's model format and reloaded instead of retraining.
+        """
+        uid = int(user_id)
+        self.samples.remove(uid)
+        user_dir = os.path.join(self.dataset_path, str(uid))
+        if os.path.isdir(user_dir):
+            shutil.rmtree(user_dir)
+
+        if self.backend == BACKEND_GALLERY:
+            with self.model_lock:
+                self.recognizer.remove(uid) # Swaps the gallery arrays in one assignment
+                self.save_gallery()
+            if self.db:
+                self.db.set_user_embedding(uid, None)
+            print(f"Removed user {uid} from gallery.")
+            return
+
+        try:
+            histograms = self.recognizer.getHistograms()
+            labels = self.recognizer.getLabels().flatten()
+        except Exception:
+            histograms, labels = [], []
+
+        if len(labels) == 0:
+            return
+
+        keep = [i for i, label in enumerate(labels) if label != uid]
+        if len(keep) == len(labels):
+            return
+        if not keep:
+            # Last user removed -> start from an empty model
+            with self.model_lock:
+                self.settle_standby()
+                self.versions.remove_live()
+                self.swap_recognizer(self.create_recognizer())
+                self.model_signature = None
+            print(f"Removed user {uid}. Model is now empty.")
+            return
+
+        try:
+            with self.model_lock:
+                self.settle_standby()
+                self.versions.publish(lambda path: self._write_histograms(
+                    [histograms[i] for i in keep], labels[keep], path))
+                self.reload_model()
+            print(f"Removed user {uid} from model.")
+        except Exception as e:
+            print(f"Model edit failed ({e}), rebuilding from dataset.")
+            self.train_model()
+
+    def _write_histograms(self, histograms, labels, path):
+        """Write LBPH histograms/labels in the layout LBPHFaceRecognizer.read expects."""
+        fs = cv2.FileStorage(path, cv2.FILE_STORAGE_WRITE)
+        try:
+            fs.startWriteStruct("opencv_lbphfaces", cv2.FileNode_MAP)
+            fs.write("threshold", float(self.recognizer.getThreshold()))
+            fs.write("radius", int(self.recognizer.getRadius()))
+            fs.write("neighbors", int(self.recognizer.getNeighbors()))
+            fs.write("grid_x", int(self.recognizer.getGridX()))
+            fs.write("grid_y", int(self.recognizer.getGridY()))
+            fs.startWriteStruct("histograms", cv2.FileNode_SEQ)
+            for hist in histograms:
+                fs.write("", hist)
+            fs.endWriteStruct()
+            fs.write("labels", np.asarray(labels, dtype=np.int32).reshape(-1, 1))
+            fs.endWriteStruct()
+        finally:
+            fs.release()
+
+    def load_dataset(self):
+        """
+        Load all samples from the packed store, migrating the legacy
+        JPEG layout first if it is still present.
+        Returns (faces, ids) lists.
+        """
+        if os.path.isdir(self.dataset_path):
+            self.samples.migrate(self.dataset_path)
+        return self.samples.load_all()
+
+    def train_model(self):
+        """
+        Full rebuild: load the whole dataset, retrain the recognizer from
+        scratch and save it. Day-to-day registration uses enroll_user();
+        this is kept as an explicit maintenance operation.
+        """
+        if not self.samples.user_ids() and not os.path.isdir(self.dataset_path):
             print("No dataset found.")
             return
 
         try:
-            for user_id in os.listdir(self.dataset_path):
-                user_dir = os.path.join(self.dataset_path, user_id)
-                if not os.path.isdir(user_dir):
-                    continue
-                    
-                try:
-                    uid = int(user_id)
-                except ValueError:
-                    continue
-
-                for file_name in os.listdir(user_dir):
-                    if file_name.endswith("jpg"):
-                        path = os.path.join(user_dir, file_name)
-                        try:
-                            # Verify file size
-                            if os.path.getsize(path) == 0:
-                                continue
-                                
-                            face = cv2.imread(path, cv2.IMREAD_GRAYSCALE)
-                            if face is not None and face.size > 0:
-                                # Resize validation if needed, but usually LBPH handles it if consistent
-                                faces.append(face)
-                                ids.append(uid)
-                        except Exception:
-                            continue
+            faces, ids = self.load_dataset()
             
-            if faces:
+            if not faces:
+                print("No data to train.")
+            elif self.backend == BACKEND_GALLERY:
+                recognizer = GalleryMatcher(threshold=self.recognizer.threshold)
+                ids_np = np.array(ids, dtype=np.int32)
+                features = np.stack([extract_features(face) for face in faces])
+                for uid in np.unique(ids_np):
+                    user_features = features[ids_np == uid]
+                    recognizer.add(uid, user_features)
+                    if self.db:
+                        self.db.set_user_embedding(int(uid), user_features)
+                self.save_gallery(recognizer)
+                print("Training complete and saved.")
+            else:
                  # Explicitly cast IDs to int32 to avoid OpenCV C++ errors
                  ids_np = np.array(ids, dtype=np.int32)
-                 self.recognizer.train(faces, ids_np)
-                 self.recognizer.write(self.trainer_path)
+                 # Train a separate instance; the live one keeps serving until the swap
+                 recognizer = self.create_recognizer()
+                 recognizer.train(faces, ids_np)
+                 self.publish_model(recognizer, recognizer.write)
                  print("Training complete and saved.")
-            else:
-                print("No data to train.")
         except Exception as e:
             print(f"Training Error: {e}")
 
-    def recognize_face(self, frame):
+    def predict(self, gray_face):
         """
-        Returns: user_id, confidence, location
+        Returns: user_id, confidence for a gray face crop
         """
-        gray_face, rect = self.get_face_crop(frame)
-        if gray_face is None:
-            return None, 0, None
-            
-        # Predict
+        with self.readers:
+            # Read and count under one lock, so a swap can never hand the writer an instance in use
+            recognizer = self.recognizer
+            self.active_predicts[recognizer] = self.active_predicts.get(recognizer, 0) + 1
         try:
             # confidence in LBPH: 0 is perfect match, higher is worse.
             # Usually < 50 is good, > 80 is unknown.
-            id_, conf = self.recognizer.predict(gray_face)
-            
-            # Map confidence to standard 0-1 (inverse)
-            # Or just return raw
-            return id_, conf, rect
+            with metrics.stage("predict"):
+                id_, conf = recognizer.predict(gray_face)
+            return id_, conf
         except Exception as e:
             # Model not trained yet
-            return None, 100, rect
+            metrics.count("predict_errors")
+            return None, 100
+        finally:
+            # Lets the model writer update this instance once it was swapped out
+            with self.readers:
+                self.active_predicts[recognizer] -= 1
+                if not self.active_predicts[recognizer]:
+                    del self.active_predicts[recognizer]
+                    self.readers.notify_all()
+
+    def predict_many(self, gray_faces):
+        """
+        Batched predict: [(user_id, confidence), ...] for a list of crops.
+        The gallery backend matches all probes in one matrix product; LBPH
+        has no batch API, so crops are spread over the predict pool (OpenCV
+        releases the GIL) when predict_workers > 1.
+        """
+        if not gray_faces:
+            return []
+        if self.backend == BACKEND_GALLERY:
+            with metrics.stage("predict"):
+                probes = np.stack([extract_features(face) for face in gray_faces])
+                matches = self.recognizer.match_many(probes, k=1)
+            return [best[0] if best else (None, 100) for best in matches]
+        if self.predict_pool is not None and len(gray_faces) > 1:
+            return list(self.predict_pool.map(self.predict, gray_faces))
+        return [self.predict(face) for face in gray_faces]
+
+    def recognize_faces(self, frame, analysis=None, max_faces=None):
+        """
+        Every face in the frame, largest (closest) first, recognized in one
+        batched call. Returns [(user_id, confidence, location), ...]
+        """
+        faces = self.get_face_crops(frame, analysis, max_faces)
+        predictions = self.predict_many([gray for gray, _ in faces])
+        return [(id_, conf, rect) for (_, rect), (id_, conf) in zip(faces, predictions)]
+
+    def recognize_face(self, frame, analysis=None):
+        """
+        Returns: user_id, confidence, location
+        """
+        gray_face, rect = self.get_face_crop(frame, analysis)
+        if gray_face is None:
+            return None, 0, None
+            
+        id_, conf = self.predict(gray_face)
+        return id_, conf, rect
@@ -0,0 +1,88 @@
+import cv2
+
+
+class FrameAnalysis:
+    """
+    Per-frame results shared between FaceSystem and LivenessDetector.
+    The BGR->RGB conversion happens at most once per frame, and whichever
+    MediaPipe graph has already run leaves its output here for the other.
+
+    scratch: optional ScratchBuffers; the RGB and downscaled images are then
+    written into the calling thread's reused arrays instead of new ones, so
+    an analysis must not be used after the next frame on the same thread.
+    """
+    def __init__(self, frame, scratch=None):
+        self.frame = frame
+        self.scratch = scratch
+        self._rgb = None
+        self._scaled = {} # width -> downscaled RGB for detection
+
+        # Filled in by FaceSystem / LivenessDetector
+        self.detections = None      # FaceDetection results, None if not run
+        self.mesh_points = None     # FaceMesh landmarks of the first face, (N, 2) normalized x, y
+        self.mesh_ran = False
+        self.yaw = None             # Nose position between the eyes (0..1), from detection keypoints
+
+    @property
+    def rgb(self):
+        if self._rgb is None:
+            dst = self.scratch.get("rgb", self.frame.shape) if self.scratch else None
+            self._rgb = cv2.cvtColor(self.frame, cv2.COLOR_BGR2RGB, dst=dst)
+        return self._rgb
+
+    def scaled_rgb(self, width):
+        """
+        RGB frame downscaled to at most `width` pixels wide, for detectors that
+        return relative coordinates (boxes map straight back to full size).
+        The BGR frame is shrunk first, so the color conversion is on the
+        small image.
+        """
+        ih, iw = self.frame.shape[:2]
+        if not width or iw <= width:
+            return self.rgb
+        scaled = self._scaled.get(width)
+        if scaled is None:
+            size = (width, max(1, round(ih * width / iw)))
+            small_dst = dst = None
+            if self.scratch:
+                shape = (size[1], size[0], 3)
+                small_dst = self.scratch.get(f"small_bgr{width}", shape)
+                dst = self.scratch.get(f"small_rgb{width}", shape)
+            small = cv2.resize(self.frame, size, dst=small_dst, interpolation=cv2.INTER_LINEAR)
+            scaled = self._scaled[width] = cv2.cvtColor(small, cv2.COLOR_BGR2RGB, dst=dst)
+        return scaled
+
+    def mesh_face_box(self):
+        """
+        Face box (x, y, w, h) from the FaceMesh landmarks, or None if the
+        mesh has not run or found no face. Used in place of a FaceDetection
+        pass when the mesh is being computed anyway.
+        """
+        if self.mesh_points is None:
+            return None
+
+        ih, iw = self.frame.shape[:2]
+        (min_x, min_y), (max_x, max_y) = self.mesh_points.min(axis=0), self.mesh_points.max(axis=0)
+        x, y = int(min_x * iw), int(min_y * ih)
+        w, h = int(max_x * iw) - x, int(max_y * ih) - y
+
+        # Ensure within bounds
+        x = max(0, x)
+        y = max(0, y)
+        w = min(iw - x, w)
+        h = min(ih - y, h)
+        if w <= 0 or h <= 0:
+            return None
+        return x, y, w, h
+
+    def mesh_eye_points(self):
+        """Pixel centers of the image-left and image-right eye from the mesh, or None."""
+        if self.mesh_points is None:
+            return None
+
+        ih, iw = self.frame.shape[:2]
+        pts = self.mesh_points
+        # Eye corners: 33/133 (subject's right eye, image left), 362/263 (image right)
+        left = (pts[33] + pts[133]) / 2 * (iw, ih)
+        right = (pts[362] + pts[263]) / 2 * (iw, ih)
+        return (float(left[0]), float(left[1])), (float(right[0]), float(right[1]))
@@ -0,0 +1,243 @@
+import numpy as np
+import cv2
+
+# Faces are resized to this size before feature extraction so every vector has
+# the same length regardless of the detector box. Matches FaceSystem's default
+# canonical crop, so aligned crops are used as-is.
+FEATURE_SIZE = (100, 100)
+GRID_X = 8
+GRID_Y = 8
+
+
+def _uniform_table(neighbors=8):
+    """Map each LBP code to a uniform-pattern bin (<= 2 circular transitions), rest share the last bin."""
+    table = np.zeros(1 << neighbors, dtype=np.int32)
+    next_bin = 0
+    for code in range(1 << neighbors):
+        bits = [(code >> i) & 1 for i in range(neighbors)]
+        transitions = sum(bits[i] != bits[(i + 1) % neighbors] for i in range(neighbors))
+        if transitions <= 2:
+            table[code] = next_bin
+            next_bin += 1
+        else:
+            table[code] = -1
+    table[table == -1] = next_bin
+    return table
+
+UNIFORM_TABLE = _uniform_table()
+NUM_BINS = int(UNIFORM_TABLE.max()) + 1   # 59 for 8 neighbors
+FEATURE_DIM = GRID_X * GRID_Y * NUM_BINS
+
+
+def lbp_image(gray, radius=1, neighbors=8):
+    """
+    Extended LBP codes with the same sampling, bit order and interpolation as
+    OpenCV's LBPHFaceRecognizer, computed one neighbor at a time over the
+    whole image instead of per pixel.
+    """
+    src = gray.astype(np.float32)
+    h, w = src.shape
+    center = src[radius:h-radius, radius:w-radius]
+    codes = np.zeros(center.shape, dtype=np.int32)
+    eps = np.finfo(np.float32).eps
+
+    def shifted(dy, dx):
+        return src[radius+dy:h-radius+dy, radius+dx:w-radius+dx]
+
+    for n in range(neighbors):
+        x = radius * np.cos(2.0 * np.pi * n / neighbors)
+        y = -radius * np.sin(2.0 * np.pi * n / neighbors)
+        fx, fy = int(np.floor(x)), int(np.floor(y))
+        cx, cy = int(np.ceil(x)), int(np.ceil(y))
+        tx, ty = x - fx, y - fy
+        w1 = (1 - tx) * (1 - ty)
+        w2 = tx * (1 - ty)
+        w3 = (1 - tx) * ty
+        w4 = tx * ty
+        t = w1 * shifted(fy, fx) + w2 * shifted(fy, cx) + w3 * shifted(cy, fx) + w4 * shifted(cy, cx)
+        codes |= ((t > center) | (np.abs(t - center) < eps)).astype(np.int32) << n
+
+    return codes
+
+
+def spatial_histograms(codes, grid_x=GRID_X, grid_y=GRID_Y):
+    """Normalized uniform-LBP histogram per grid cell. Returns (grid_y * grid_x, NUM_BINS)."""
+    ch, cw = codes.shape[0] // grid_y, codes.shape[1] // grid_x
+    cells = codes[:grid_y*ch, :grid_x*cw].reshape(grid_y, ch, grid_x, cw).transpose(0, 2, 1, 3)
+    cells = UNIFORM_TABLE[cells.reshape(grid_y * grid_x, ch * cw)]
+    offsets = np.arange(grid_y * grid_x)[:, None] * NUM_BINS
+    hist = np.bincount((cells + offsets).ravel(), minlength=grid_y * grid_x * NUM_BINS)
+    return hist.reshape(grid_y * grid_x, NUM_BINS).astype(np.float32) / float(ch * cw)
+
+
+def fold_uniform(histograms):
+    """Fold OpenCV LBPH histograms (cells x 256) into uniform bins (cells x NUM_BINS)."""
+    histograms = np.asarray(histograms, dtype=np.float32).reshape(-1, 256)
+    folded = np.zeros((histograms.shape[0], NUM_BINS), dtype=np.float32)
+    np.add.at(folded, (slice(None), UNIFORM_TABLE), histograms)
+    return folded
+
+
+def to_feature(cell_histograms):
+    """
+    Square-rooted cell histograms, flattened. With this (Hellinger) mapping the
+    squared Euclidean distance approximates a chi-square histogram comparison
+    and can be computed for the whole gallery with one matrix product.
+    """
+    return np.sqrt(cell_histograms).astype(np.float32).ravel()
+
+
+# Storage types for gallery rows. Features are square-rooted histograms in
+# [0, 1], so uint8 rows hold round(value * 255) with a scale of 1/255.
+STORAGE_DTYPES = (np.float32, np.float16, np.uint8)
+UINT8_SCALE = 1.0 / 255.0
+MATCH_CHUNK = 4096 # Rows dequantized at a time when matching a reduced-precision gallery
+
+
+def quantize(features, dtype, scale=None):
+    """Convert float feature rows to a storage dtype. Returns (rows, scale)."""
+    dtype = np.dtype(dtype)
+    features = np.asarray(features, dtype=np.float32)
+    if dtype == np.uint8:
+        scale = scale or UINT8_SCALE
+        return np.clip(np.rint(features / scale), 0, 255).astype(np.uint8), scale
+    return features.astype(dtype), 1.0
+
+
+def dequantize(features, scale=1.0):
+    features = np.asarray(features, dtype=np.float32)
+    return features * scale if scale != 1.0 else features
+
+
+def extract_features(gray_face):
+    """Feature vector (FEATURE_DIM,) float32 for one gray face crop."""
+    if gray_face.shape[:2] != FEATURE_SIZE[::-1]:
+        gray_face = cv2.resize(gray_face, FEATURE_SIZE, interpolation=cv2.INTER_AREA)
+    return to_feature(spatial_histograms(lbp_image(gray_face)))
+
+
+class GalleryMatcher:
+    """
+    Recognizer backend holding every enrolled feature vector in one contiguous
+    (N, D) matrix, rows grouped by user id. A probe is matched against
+    the whole gallery with a single matrix product; the best row per user is
+    taken with np.minimum.reduceat and the top-k users are returned.
+
+    Rows may be stored as float16 or uint8 (see compaction.py); they are
+    dequantized in MATCH_CHUNK blocks while matching, so memory stays at the
+    reduced size. New rows are converted to the gallery's storage type.
+
+    Arrays are replaced, never modified in place, so a match running on another
+    thread always sees a consistent gallery.
+    """
+    def __init__(self, features=None, labels=None, threshold=40, scale=1.0):
+        self.threshold = threshold
+        self.scale = scale # Value of one uint8 step (1.0 for float rows)
+        self._set(np.zeros((0, FEATURE_DIM), dtype=np.float32) if features is None else features,
+                  np.zeros(0, dtype=np.int32) if labels is None else labels)
+
+    def _set(self, features, labels):
+        features = np.asarray(features)
+        if features.dtype not in STORAGE_DTYPES:
+            features = features.astype(np.float32)
+        labels = np.asarray(labels, dtype=np.int32)
+        order = np.argsort(labels, kind="stable")
+        if not np.array_equal(order, np.arange(len(labels))):
+            features, labels = features[order], labels[order]
+
+        # Start row of each user's block, for per-user reductions
+        if len(labels):
+            starts = np.flatnonzero(np.r_[True, labels[1:] != labels[:-1]])
+        else:
+            starts = np.zeros(0, dtype=np.int64)
+
+        if features.dtype == np.float32:
+            sq_norms = np.einsum("ij,ij->i", features, features)
+        else:
+            sq_norms = np.concatenate([np.einsum("ij,ij->i", block, block) for block in self._blocks(features)] or
+                                      [np.zeros(0, dtype=np.float32)])
+
+        # Swapped in one assignment so readers never see a half-updated gallery
+        self._state = (features, labels, starts, labels[starts], sq_norms)
+
+    def _blocks(self, features):
+        """Dequantized float32 row blocks of a reduced-precision matrix."""
+        for i in range(0, len(features), MATCH_CHUNK):
+            yield dequantize(features[i:i + MATCH_CHUNK], self.scale)
+
+    @property
+    def features(self):
+        return self._state[0]
+
+    @property
+    def labels(self):
+        return self._state[1]
+
+    @property
+    def user_ids(self):
+        return self._state[3]
+
+    def __len__(self):
+        return len(self._state[3])
+
+    @property
+    def nbytes(self):
+        return self.features.nbytes + self.labels.nbytes
+
+    def add(self, user_id, features):
+        """Append feature rows (k, D) for a user."""
+        features = np.asarray(features, dtype=np.float32).reshape(-1, FEATURE_DIM)
+        self.extend(features, np.full(len(features), int(user_id), dtype=np.int32))
+
+    def extend(self, features, labels):
+        """Append feature rows (k, D) with their labels (k,) for any number of users at once."""
+        features = np.asarray(features, dtype=np.float32).reshape(-1, FEATURE_DIM)
+        features, _ = quantize(features, self.features.dtype, self.scale)
+        labels = np.asarray(labels, dtype=np.int32)
+        self._set(np.concatenate([self.features, features]), np.concatenate([self.labels, labels]))
+
+    def remove(self, user_id):
+        keep = self.labels != int(user_id)
+        self._set(self.features[keep], self.labels[keep])
+
+    def distances(self, probes):
+        """
+        Per-user distance matrix (P, U) for probe vectors (P, D), on the
+        same 0 (identical) .. 100 scale as the LBPH confidence.
+        Returns (distances, user_ids) taken from one consistent gallery state.
+        """
+        features, _, starts, user_ids, sq_norms = self._state
+        probes = np.asarray(probes, dtype=np.float32).reshape(-1, FEATURE_DIM)
+        # |f - p|^2 = |f|^2 - 2 f.p + |p|^2 for every (probe, row) pair at once
+        if features.dtype == np.float32:
+            dots = probes @ features.T
+        else:
+            dots = np.concatenate([probes @ block.T for block in self._blocks(features)], axis=1)
+        d2 = sq_norms[None, :] - 2.0 * dots + np.einsum("ij,ij->i", probes, probes)[:, None]
+        per_user = np.minimum.reduceat(d2, starts, axis=1)
+        # Per-cell Hellinger distance is in [0, 2]
+        return np.clip(per_user, 0, None) * (100.0 / (2 * GRID_X * GRID_Y)), user_ids
+
+    def match_many(self, probes, k=1):
+        """Top-k (user_id, distance) lists for each probe vector."""
+        probes = np.asarray(probes, dtype=np.float32).reshape(-1, FEATURE_DIM)
+        if len(self) == 0:
+            return [[] for _ in range(len(probes))]
+        dist, user_ids = self.distances(probes)
+        k = min(k, dist.shape[1])
+        top = np.argpartition(dist, k - 1, axis=1)[:, :k]
+        results = []
+        for row, idx in zip(dist, top):
+            idx = idx[np.argsort(row[idx])]
+            results.append([(int(user_ids[i]), float(row[i])) for i in idx])
+        return results
+
+    def match(self, probe, k=1):
+        return self.match_many(probe[None, :], k)[0]
+
+    def predict(self, gray_face):
+        """Same contract as LBPHFaceRecognizer.predict: (user_id, distance)."""
+        best = self.match(extract_features(gray_face), k=1)
+        if not best:
+            raise ValueError("Gallery is empty")
+        return best[0]
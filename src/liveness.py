@@ -1,112 +1,175 @@
 import mediapipe as mp
-import cv2
 import numpy as np
 
+from .frame_analysis import FrameAnalysis
+from .metrics import metrics
+
+# Landmark pairs measured every frame, one vectorized distance per row:
+# Left Eye (Horizontal: 33-133, Vertical: 159-145)
+# Right Eye (Horizontal: 362-263, Vertical: 386-374)
+# Outer lips: 61 (left), 291 (right), 0 (top), 17 (bottom)
+# Nose tip 1 to the left / right cheek-ear area 234 / 454 (horizontal only)
+PAIR_A = np.array([33, 159, 362, 386, 61, 0, 1, 1])
+PAIR_B = np.array([133, 145, 263, 374, 291, 17, 234, 454])
+
+
+def landmark_array(landmarks):
+    """MediaPipe landmark list -> contiguous (N, 2) float32 array of normalized x, y."""
+    return np.array([(lm.x, lm.y) for lm in landmarks], dtype=np.float32)
+
+
+class TemporalLiveness:
+    """
+    Liveness decisions over a short history instead of a single frame.
+
+    Per-frame EAR / MAR / head ratio values go into fixed-size ring buffers.
+      - Blink: EAR dips below close_threshold for 1..max_closed_frames frames
+        and then recovers above open_threshold. A single noisy low frame
+        followed by an open eye still counts, a long closure does not.
+      - Smile / head turn: the condition must hold for hold_frames
+        consecutive frames.
+    """
+    def __init__(self, size=30, close_threshold=0.18, open_threshold=0.22, max_closed_frames=8,
+                 smile_threshold=0.35, turn_ratio=2.0, hold_frames=3):
+        self.size = size
+        self.close_threshold = close_threshold
+        self.open_threshold = open_threshold
+        self.max_closed_frames = max_closed_frames
+        self.smile_threshold = smile_threshold
+        self.turn_ratio = turn_ratio
+        self.hold_frames = hold_frames
+
+        self.ear = np.zeros(size, dtype=np.float32)
+        self.mar = np.zeros(size, dtype=np.float32)
+        self.ratio = np.ones(size, dtype=np.float32)
+        self.reset()
+
+    def reset(self):
+        self.count = 0    # Frames pushed since the last reset (ring buffer write index = count % size)
+        self.closed = 0   # Consecutive frames the eyes have been closed
+        self.was_open = False
+
+    def push(self, ear, mar, ratio):
+        i = self.count % self.size
+        self.ear[i], self.mar[i], self.ratio[i] = ear, mar, ratio
+        self.count += 1
+
+    def recent(self, buffer, k):
+        """Last k values (oldest first), fewer right after a reset."""
+        k = min(k, self.count)
+        idx = (self.count - k + np.arange(k)) % self.size
+        return buffer[idx]
+
+    def blink(self):
+        """Update the blink state with the newest EAR; True on the frame a blink completes."""
+        ear = self.ear[(self.count - 1) % self.size]
+        if ear < self.close_threshold:
+            if self.was_open:
+                self.closed += 1
+            return False
+
+        blinked = False
+        if ear > self.open_threshold:
+            blinked = self.was_open and 0 < self.closed <= self.max_closed_frames
+            self.was_open = True
+            self.closed = 0
+        return blinked
+
+    def held(self, values, test):
+        if self.count < self.hold_frames:
+            return False
+        return bool(np.all(test(self.recent(values, self.hold_frames))))
+
+    def update(self, ear, mar, ratio):
+        """Push one frame's features. Returns (is_blinking, is_smiling, orientation)."""
+        self.push(ear, mar, ratio)
+        is_blinking = self.blink()
+        is_smiling = self.held(self.mar, lambda v: v > self.smile_threshold)
+
+        orientation = "CENTER"
+        if self.held(self.ratio, lambda v: v > self.turn_ratio):
+            orientation = "TURN_LEFT" # Actually user turning left (camera view right)
+        elif self.held(self.ratio, lambda v: v < 1.0 / self.turn_ratio):
+            orientation = "TURN_RIGHT"
+        return is_blinking, is_smiling, orientation
+
+
 class LivenessDetector:
-    def __init__(self, ear_threshold=0.25):
+    def __init__(self, ear_threshold=0.25, static_image_mode=False):
         self.ear_threshold = ear_threshold
         self.mp_face_mesh = mp.solutions.face_mesh
+        # static_image_mode: every frame is unrelated (no landmark tracking between calls)
         self.face_mesh = self.mp_face_mesh.FaceMesh(
+            static_image_mode=static_image_mode,
             max_num_faces=1,
             refine_landmarks=True,
             min_detection_confidence=0.5,
             min_tracking_confidence=0.5
         )
-        
-        # Indices for EAR (approximate compatible with 468 mesh)
-        # Left Eye (Horizontal: 33-133, Vertical: 159-145)
-        # Right Eye (Horizontal: 362-263, Vertical: 386-374)
-        self.LEFT_EYE = [33, 133, 159, 145]
-        self.RIGHT_EYE = [362, 263, 386, 374]
-
-    def get_ear(self, landmarks, indices):
-        # indices: [p1, p2, p3, p4] -> p1,p2 horizontal, p3,p4 vertical
-        # Actually simplified EAR: Vertical / Horizontal
-        
-        p1 = np.array([landmarks[indices[0]].x, landmarks[indices[0]].y])
-        p2 = np.array([landmarks[indices[1]].x, landmarks[indices[1]].y])
-        p3 = np.array([landmarks[indices[2]].x, landmarks[indices[2]].y])
-        p4 = np.array([landmarks[indices[3]].x, landmarks[indices[3]].y])
-
-        dist_h = np.linalg.norm(p1 - p2)
-        dist_v = np.linalg.norm(p3 - p4)
-
-        if dist_h == 0: return 0.0
-        return dist_v / dist_h
-
-    def get_mar(self, landmarks):
-        # Mouth Aspect Ratio for smile/open mouth
-        # Outer lips: 61 (left), 291 (right), 0 (top), 17 (bottom)
-        p_left = np.array([landmarks[61].x, landmarks[61].y])
-        p_right = np.array([landmarks[291].x, landmarks[291].y])
-        p_top = np.array([landmarks[0].x, landmarks[0].y])
-        p_btm = np.array([landmarks[17].x, landmarks[17].y])
-        
-        dist_h = np.linalg.norm(p_left - p_right)
-        dist_v = np.linalg.norm(p_top - p_btm)
-        
-        if dist_h == 0: return 0
-        return dist_v / dist_h
-
-    def get_orientation(self, landmarks):
-        # Estimate head yaw using nose and cheek/ear landmarks
-        # Nose tip: 1
-        # Left cheek/ear area: 234
-        # Right cheek/ear area: 454
-        
-        nose = landmarks[1].x
-        left_side = landmarks[234].x
-        right_side = landmarks[454].x
-        
-        # Calculate relative distances (horizontal)
-        dist_to_left = abs(nose - left_side)
-        dist_to_right = abs(nose - right_side)
-        
-        ratio = dist_to_left / (dist_to_right + 1e-6)
-        
-        if ratio > 2.0:
-            return "TURN_LEFT" # Actually user turning left (camera view right)
-        elif ratio < 0.5:
-            return "TURN_RIGHT"
-        else:
-            return "CENTER"
-
-    def process_frame(self, frame):
+        self.temporal = TemporalLiveness()
+        self._reset_pending = False
+
+    def reset(self):
+        """Forget the temporal history (new subject). Safe to call from another thread."""
+        self._reset_pending = True
+
+    def compute_features(self, points):
+        """
+        All per-frame features in one vectorized step.
+        points: (N, 2) landmark array. Returns (ear, mar, ratio) where ratio is
+        the nose-to-left over nose-to-right horizontal distance (head yaw).
+        """
+        diff = points[PAIR_A] - points[PAIR_B]
+        dist = np.sqrt(np.einsum("ij,ij->i", diff, diff))
+        left_h, left_v, right_h, right_v, mouth_h, mouth_v = dist[:6]
+
+        left_ear = left_v / left_h if left_h > 0 else 0.0
+        right_ear = right_v / right_h if right_h > 0 else 0.0
+        mar = mouth_v / mouth_h if mouth_h > 0 else 0.0
+        ratio = abs(diff[6, 0]) / (abs(diff[7, 0]) + 1e-6)
+        return (left_ear + right_ear) / 2.0, mar, ratio
+
+    def process_frame(self, frame, analysis=None):
         """
         Process frame to check liveness attributes.
-        Returns: {is_blinking, is_smiling, orientation, ear, mar, landmarks}
+        analysis: optional FrameAnalysis shared with FaceSystem (reuses the RGB
+        conversion and exposes the mesh landmarks for the face box).
+        Decisions use the recent frame history (see TemporalLiveness).
+        Returns: {is_blinking, is_smiling, orientation, ear, mar, ratio, landmarks}
         """
-        rgb_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-        results = self.face_mesh.process(rgb_frame)
-        
+        if analysis is None:
+            analysis = FrameAnalysis(frame)
+        with metrics.stage("mesh"):
+            results = self.face_mesh.process(analysis.rgb)
+        analysis.mesh_ran = True
+
+        if self._reset_pending:
+            self._reset_pending = False
+            self.temporal.reset()
+
         info = {
             "is_blinking": False,
             "is_smiling": False,
             "orientation": "CENTER",
             "ear": 0.0,
             "mar": 0.0,
+            "ratio": 1.0,
             "landmarks": None
         }
-        
+
         if not results.multi_face_landmarks:
+            self.temporal.reset()
             return info
 
-        landmarks = results.multi_face_landmarks[0].landmark
-        info["landmarks"] = landmarks
-        
-        # EAR (Blink)
-        left_ear = self.get_ear(landmarks, self.LEFT_EYE)
-        right_ear = self.get_ear(landmarks, self.RIGHT_EYE)
-        avg_ear = (left_ear + right_ear) / 2.0
-        info["ear"] = avg_ear
-        info["is_blinking"] = avg_ear < 0.18
-        
-        # MAR (Smile)
-        mar = self.get_mar(landmarks)
-        info["mar"] = mar
-        info["is_smiling"] = mar > 0.35 # Threshold for smile
-             
-        # Orientation
-        info["orientation"] = self.get_orientation(landmarks)
-        
+        # One conversion per frame, shared with FaceSystem through the analysis
+        points = landmark_array(results.multi_face_landmarks[0].landmark)
+        info["landmarks"] = points
+        analysis.mesh_points = points
+
+        ear, mar, ratio = self.compute_features(points)
+        info["ear"] = float(ear)
+        info["mar"] = float(mar)
+        info["ratio"] = float(ratio)
+        info["is_blinking"], info["is_smiling"], info["orientation"] = self.temporal.update(ear, mar, ratio)
+
         return info
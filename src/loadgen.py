@@ -0,0 +1,84 @@
+import time
+import json
+import threading
+import http.client
+from urllib.parse import urlparse
+
+import numpy as np
+import cv2
+
+
+def encode_image(path=None, size=(640, 480)):
+    """JPEG bytes of an image file (or a gray test pattern) at a camera-like size."""
+    image = cv2.imread(path) if path else None
+    if image is None:
+        image = np.full((size[1], size[0], 3), 128, dtype=np.uint8)
+    else:
+        image = cv2.resize(image, size, interpolation=cv2.INTER_AREA)
+    ok, buf = cv2.imencode(".jpg", image, [cv2.IMWRITE_JPEG_QUALITY, 85])
+    return buf.tobytes()
+
+
+def run_load(url, body, concurrency=8, requests=500, kind="frame", liveness=False):
+    """
+    Fire `requests` POSTs at the recognition service from `concurrency`
+    keep-alive client threads and report throughput and latency percentiles
+    (client-side) plus the batch sizes the server formed.
+    """
+    target = urlparse(url)
+    path = f"{target.path or '/recognize'}?kind={kind}&liveness={int(liveness)}"
+    latencies = []
+    batch_sizes = []
+    errors = []
+    lock = threading.Lock()
+    counter = iter(range(requests))
+
+    def client():
+        conn = http.client.HTTPConnection(target.hostname, target.port or 80, timeout=30)
+        while True:
+            with lock:
+                if next(counter, None) is None:
+                    break
+            start = time.perf_counter()
+            try:
+                conn.request("POST", path, body=body, headers={"Content-Type": "image/jpeg"})
+                response = conn.getresponse()
+                payload = response.read()
+                elapsed = (time.perf_counter() - start) * 1000
+                if response.status != 200:
+                    raise RuntimeError(f"HTTP {response.status}: {payload[:100]!r}")
+                result = json.loads(payload)
+                with lock:
+                    latencies.append(elapsed)
+                    batch_sizes.append(result.get("batch_size", 1))
+            except Exception as e:
+                with lock:
+                    errors.append(str(e))
+                conn.close()
+                conn = http.client.HTTPConnection(target.hostname, target.port or 80, timeout=30)
+        conn.close()
+
+    start = time.perf_counter()
+    threads = [threading.Thread(target=client, daemon=True) for _ in range(concurrency)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - start
+
+    lat = np.array(latencies) if latencies else np.zeros(1)
+    report = {
+        "requests": len(latencies),
+        "errors": len(errors),
+        "concurrency": concurrency,
+        "seconds": round(elapsed, 2),
+        "throughput_rps": round(len(latencies) / elapsed, 1) if elapsed > 0 else 0.0,
+        "p50_ms": round(float(np.percentile(lat, 50)), 2),
+        "p95_ms": round(float(np.percentile(lat, 95)), 2),
+        "p99_ms": round(float(np.percentile(lat, 99)), 2),
+        "max_ms": round(float(lat.max()), 2),
+        "mean_batch": round(float(np.mean(batch_sizes)), 2) if batch_sizes else 0.0,
+    }
+    if errors:
+        report["first_error"] = errors[0]
+    return report
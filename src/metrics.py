@@ -0,0 +1,238 @@
+import os
+import json
+import time
+import bisect
+import threading
+import collections
+
+# Latency histogram bucket upper bounds (ms); the last bucket is open-ended
+BUCKETS_MS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000)
+WINDOW = 300 # Samples kept per stage for rolling percentiles / FPS
+
+
+class _NullTimer:
+    """Shared no-op timer returned while metrics are off."""
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULL_TIMER = _NullTimer()
+
+
+class _Timer:
+    def __init__(self, metrics, name):
+        self.metrics = metrics
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.metrics.record(self.name, (time.perf_counter() - self.start) * 1000)
+        return False
+
+
+class _Stage:
+    def __init__(self):
+        self.count = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+        self.buckets = [0] * (len(BUCKETS_MS) + 1)
+        self.recent = collections.deque(maxlen=WINDOW)
+
+    def add(self, ms):
+        self.count += 1
+        self.total_ms += ms
+        self.max_ms = max(self.max_ms, ms)
+        self.buckets[bisect.bisect_left(BUCKETS_MS, ms)] += 1
+        self.recent.append(ms)
+
+    def summary(self):
+        recent = sorted(self.recent)
+
+        def pct(p):
+            return round(recent[min(len(recent) - 1, int(p / 100.0 * len(recent)))], 3) if recent else 0.0
+
+        labels = [f"<={b}" for b in BUCKETS_MS] + [f">{BUCKETS_MS[-1]}"]
+        return {
+            "count": self.count,
+            "mean_ms": round(self.total_ms / self.count, 3) if self.count else 0.0,
+            "p50_ms": pct(50),
+            "p95_ms": pct(95),
+            "p99_ms": pct(99),
+            "max_ms": round(self.max_ms, 3),
+            "histogram": dict(zip(labels, self.buckets)),
+        }
+
+
+class Metrics:
+    """
+    Lightweight in-process instrumentation: per-stage timers with rolling
+    percentiles and fixed-bucket latency histograms, rolling FPS meters,
+    counters (errors, events) and gauges.
+
+    Every call checks self.enabled first, so when metrics are off a stage
+    timer is a shared no-op object and counters return immediately. Toggle
+    at runtime with enable() / disable().
+    """
+    def __init__(self, enabled=False):
+        self.enabled = enabled
+        self.lock = threading.Lock()
+        self.started = time.time()
+        self._stages = {}
+        self._rates = {}
+        self._counters = collections.Counter()
+        self._gauges = {}
+        self._server = None
+        self._writer = None
+        self._writer_stop = threading.Event()
+
+    def enable(self):
+        self.enabled = True
+
+    def disable(self):
+        self.enabled = False
+
+    def toggle(self):
+        self.enabled = not self.enabled
+        return self.enabled
+
+    def reset(self):
+        with self.lock:
+            self.started = time.time()
+            self._stages.clear()
+            self._rates.clear()
+            self._counters.clear()
+            self._gauges.clear()
+
+    def stage(self, name):
+        """Context manager timing one stage: `with metrics.stage("detect"): ...`"""
+        if not self.enabled:
+            return _NULL_TIMER
+        return _Timer(self, name)
+
+    def record(self, name, ms):
+        if not self.enabled:
+            return
+        with self.lock:
+            stage = self._stages.get(name)
+            if stage is None:
+                stage = self._stages[name] = _Stage()
+            stage.add(ms)
+
+    def tick(self, name):
+        """Mark one event of a rate meter (e.g. a displayed frame)."""
+        if not self.enabled:
+            return
+        now = time.perf_counter()
+        with self.lock:
+            ticks = self._rates.get(name)
+            if ticks is None:
+                ticks = self._rates[name] = collections.deque(maxlen=WINDOW)
+            ticks.append(now)
+
+    def count(self, name, n=1):
+        if not self.enabled:
+            return
+        with self.lock:
+            self._counters[name] += n
+
+    def gauge(self, name, value):
+        if not self.enabled:
+            return
+        self._gauges[name] = value
+
+    def snapshot(self):
+        """Current metrics as a JSON-serializable dict."""
+        now = time.perf_counter()
+        with self.lock:
+            stages = {name: stage.summary() for name, stage in self._stages.items()}
+            rates = {}
+            for name, ticks in self._rates.items():
+                # Rolling rate over the kept window; 0 once the events stop
+                span = now - ticks[0] if len(ticks) > 1 else 0
+                idle = now - ticks[-1] if ticks else 0
+                rates[name] = round((len(ticks) - 1) / span, 1) if span > 0 and idle < 2.0 else 0.0
+            return {
+                "enabled": self.enabled,
+                "uptime_s": round(time.time() - self.started, 1),
+                "stages": stages,
+                "fps": rates,
+                "counters": dict(self._counters),
+                "gauges": dict(self._gauges),
+            }
+
+    def export_json(self, path):
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(self.snapshot(), f, indent=2)
+        os.replace(tmp_path, path)
+
+    def write_every(self, path, interval_s=5.0):
+        """Export the snapshot to path every interval_s seconds from a daemon thread."""
+        def loop():
+            while not self._writer_stop.wait(interval_s):
+                if self.enabled:
+                    try:
+                        self.export_json(path)
+                    except OSError as e:
+                        print(f"Metrics export failed: {e}")
+
+        self._writer_path = path
+        self._writer_stop.clear()
+        self._writer = threading.Thread(target=loop, name="metrics-file", daemon=True)
+        self._writer.start()
+        return self._writer
+
+    def stop_writer(self):
+        """Stop the periodic export and write one last snapshot."""
+        if self._writer is None:
+            return
+        self._writer_stop.set()
+        self._writer.join(1.0)
+        self._writer = None
+        if self.enabled:
+            try:
+                self.export_json(self._writer_path)
+            except OSError as e:
+                print(f"Metrics export failed: {e}")
+
+    def serve(self, port=9100, host="127.0.0.1"):
+        """Serve the snapshot as JSON on http://host:port/metrics from a daemon thread."""
+        from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+        metrics = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.rstrip("/") not in ("", "/metrics"):
+                    self.send_error(404)
+                    return
+                body = json.dumps(metrics.snapshot()).encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass # No per-request stdout noise
+
+        self._server = ThreadingHTTPServer((host, port), Handler)
+        threading.Thread(target=self._server.serve_forever, name="metrics-http", daemon=True).start()
+        print(f"Metrics at http://{host}:{port}/metrics")
+        return self._server
+
+    def stop_server(self):
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+
+# Process-wide instance used by the pipeline, FaceSystem, liveness, storage and UI
+metrics = Metrics()
@@ -0,0 +1,123 @@
+import os
+import struct
+
+import numpy as np
+import cv2
+
+from .gallery import fold_uniform, to_feature, GRID_X, GRID_Y, FEATURE_DIM
+
+# Binary gallery model:
+#   [64-byte header][features rows x dim, aligned][labels int32 rows, aligned]
+# The arrays are stored raw so the file can be memory-mapped read-only and
+# shared between processes through the page cache.
+MAGIC = b"FACEMDL\0"
+VERSION = 1
+ALIGN = 64
+HEADER = struct.Struct("<8sHHHHQIIQQf")  # magic, version, dtype, kind, reserved, rows, dim, reserved, feat_off, label_off, scale
+HEADER_SIZE = ALIGN
+
+DTYPES = {1: np.float32, 2: np.float16, 3: np.uint8}
+DTYPE_CODES = {np.dtype(v): k for k, v in DTYPES.items()}
+
+KIND_UNIFORM_LBP = 1  # sqrt-normalized uniform LBP cell histograms (see gallery.py)
+
+
+def _aligned(offset):
+    return (offset + ALIGN - 1) // ALIGN * ALIGN
+
+
+def save_model(path, features, labels, scale=1.0, kind=KIND_UNIFORM_LBP):
+    """
+    Write features (rows, dim) and labels (rows,) to path.
+    The file is written next to the target and renamed, so readers never
+    see a partial model.
+    """
+    features = np.ascontiguousarray(features)
+    labels = np.ascontiguousarray(labels, dtype=np.int32)
+    if features.dtype not in DTYPE_CODES:
+        raise ValueError(f"Unsupported feature dtype: {features.dtype}")
+    if features.ndim != 2 or len(features) != len(labels):
+        raise ValueError("features must be (rows, dim) with one label per row")
+
+    rows, dim = features.shape
+    feat_off = _aligned(HEADER_SIZE)
+    label_off = _aligned(feat_off + features.nbytes)
+    header = HEADER.pack(MAGIC, VERSION, DTYPE_CODES[features.dtype], kind, 0,
+                         rows, dim, 0, feat_off, label_off, float(scale))
+
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(header.ljust(HEADER_SIZE, b"\0"))
+        f.seek(feat_off)
+        f.write(features.tobytes())
+        f.seek(label_off)
+        f.write(labels.tobytes())
+    os.replace(tmp_path, path)
+
+
+def read_header(path):
+    with open(path, "rb") as f:
+        raw = f.read(HEADER.size)
+    if len(raw) < HEADER.size:
+        raise ValueError(f"{path}: truncated model file")
+    magic, version, dtype, kind, _, rows, dim, _, feat_off, label_off, scale = HEADER.unpack(raw)
+    if magic != MAGIC:
+        raise ValueError(f"{path}: not a face model file")
+    if version != VERSION:
+        raise ValueError(f"{path}: unsupported model version {version}")
+    return {"dtype": DTYPES[dtype], "kind": kind, "rows": rows, "dim": dim,
+            "features_offset": feat_off, "labels_offset": label_off, "scale": scale}
+
+
+def load_model(path, mmap=True):
+    """
+    Returns (features, labels, header). With mmap=True the arrays are read-only
+    views of the file; nothing is copied until pages are touched.
+    """
+    header = read_header(path)
+    rows, dim = header["rows"], header["dim"]
+    if mmap:
+        if rows == 0:
+            features = np.zeros((0, dim), dtype=header["dtype"])
+            labels = np.zeros(0, dtype=np.int32)
+        else:
+            features = np.memmap(path, dtype=header["dtype"], mode="r", offset=header["features_offset"], shape=(rows, dim))
+            labels = np.memmap(path, dtype=np.int32, mode="r", offset=header["labels_offset"], shape=(rows,))
+    else:
+        with open(path, "rb") as f:
+            f.seek(header["features_offset"])
+            features = np.fromfile(f, dtype=header["dtype"], count=rows * dim).reshape(rows, dim)
+            f.seek(header["labels_offset"])
+            labels = np.fromfile(f, dtype=np.int32, count=rows)
+    return features, labels, header
+
+
+def convert_trainer_yml(yml_path, out_path):
+    """
+    Convert an OpenCV LBPH trainer.yml into a binary gallery model.
+    The 256-bin LBPH cell histograms are folded into uniform-pattern bins,
+    which is exactly what GalleryMatcher computes for a probe.
+    Returns the number of converted samples.
+    """
+    fs = cv2.FileStorage(yml_path, cv2.FILE_STORAGE_READ)
+    try:
+        node = fs.getNode("opencv_lbphfaces")
+        if node.empty():
+            raise ValueError(f"{yml_path}: no LBPH model found")
+
+        params = (int(node.getNode("radius").real()), int(node.getNode("neighbors").real()),
+                  int(node.getNode("grid_x").real()), int(node.getNode("grid_y").real()))
+        if params != (1, 8, GRID_X, GRID_Y):
+            raise ValueError(f"{yml_path}: unsupported LBPH parameters (radius, neighbors, grid_x, grid_y) = {params}")
+
+        hist_node = node.getNode("histograms")
+        features = np.zeros((hist_node.size(), FEATURE_DIM), dtype=np.float32)
+        for i in range(hist_node.size()):
+            features[i] = to_feature(fold_uniform(hist_node.at(i).mat()))
+        labels = node.getNode("labels").mat()
+        labels = np.zeros(0, dtype=np.int32) if labels is None else labels.astype(np.int32).ravel()
+    finally:
+        fs.release()
+
+    save_model(out_path, features, labels)
+    return len(labels)
@@ -0,0 +1,162 @@
+import os
+import re
+import shutil
+import threading
+
+
+class ModelVersions:
+    """
+    Versioned history of one model file (trainer.yml or model.bin).
+
+    publish(write) has write(path) produce the new model as the next numbered
+    file in the history directory, then hard-links it over the live path with
+    an atomic rename (no copy; the live file and its history entry share the
+    same data on disk). Readers (and other processes) only ever see a
+    complete model. The last `keep` versions stay available for rollback,
+    fewer if they would take more than `max_bytes` together.
+    """
+    def __init__(self, path, history_dir=None, keep=5, max_bytes=None):
+        self.path = path
+        self.name, self.ext = os.path.splitext(os.path.basename(path))
+        self.history_dir = history_dir or os.path.join(os.path.dirname(path) or ".", "model_history")
+        self.keep = keep
+        self.max_bytes = max_bytes
+        self.lock = threading.RLock() # Serializes publish / activate within this process
+        self._pattern = re.compile(re.escape(self.name) + r"\.v(\d+)" + re.escape(self.ext) + "$")
+
+    def version_path(self, version):
+        return os.path.join(self.history_dir, f"{self.name}.v{version:04d}{self.ext}")
+
+    @property
+    def _current_file(self):
+        return os.path.join(self.history_dir, f"{self.name}.current")
+
+    def versions(self):
+        """Version numbers in the history, oldest first."""
+        if not os.path.isdir(self.history_dir):
+            return []
+        found = (self._pattern.match(name) for name in os.listdir(self.history_dir))
+        return sorted(int(m.group(1)) for m in found if m)
+
+    def current(self):
+        """Version number of the live model, or None if it was not published through the history."""
+        try:
+            with open(self._current_file) as f:
+                return int(f.read().strip())
+        except (OSError, ValueError):
+            return None
+
+    def signature(self):
+        """Identity of the live file; changes whenever a new version is put in place."""
+        try:
+            st = os.stat(self.path)
+        except OSError:
+            return None
+        return st.st_ino, st.st_mtime_ns, st.st_size
+
+    def publish(self, write):
+        """Write a new version through write(path), make it live, prune old ones. Returns the version."""
+        with self.lock:
+            os.makedirs(self.history_dir, exist_ok=True)
+            version = (self.versions() or [0])[-1] + 1
+            while True:
+                # Claim the number exclusively in case another process publishes at the same time
+                try:
+                    open(self.version_path(version), "xb").close()
+                    break
+                except FileExistsError:
+                    version += 1
+
+            try:
+                write(self.version_path(version))
+            except Exception:
+                os.remove(self.version_path(version))
+                raise
+            self.activate(version)
+            self.prune()
+            return version
+
+    def activate(self, version):
+        """Put a history version in place of the live file (hard link + atomic rename)."""
+        with self.lock:
+            source = self.version_path(version)
+            if not os.path.exists(source):
+                raise ValueError(f"Model version {version} not found in {self.history_dir}")
+            tmp_path = self.path + ".tmp"
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            try:
+                os.link(source, tmp_path)
+            except OSError:
+                shutil.copyfile(source, tmp_path) # No hard links here (e.g. history on another volume)
+            os.replace(tmp_path, self.path)
+
+            tmp_path = self._current_file + ".tmp"
+            with open(tmp_path, "w") as f:
+                f.write(str(version))
+            os.replace(tmp_path, self._current_file)
+
+    def rollback(self, version=None):
+        """Make `version` (default: the one before the live version) live again. Returns it."""
+        if version is None:
+            current = self.current()
+            older = [v for v in self.versions() if current is None or v < current]
+            if not older:
+                raise ValueError("No older model version to roll back to")
+            version = older[-1]
+        self.activate(version)
+        return version
+
+    def remove_live(self):
+        """Drop the live file (empty model); the history is kept."""
+        for path in (self.path, self._current_file):
+            if os.path.exists(path):
+                os.remove(path)
+
+    def prune(self):
+        """Drop versions beyond `keep` and, oldest first, beyond `max_bytes`; the live one is always kept."""
+        current = self.current()
+        versions = self.versions()
+        drop = versions[:-self.keep or None]
+        if self.max_bytes:
+            kept = versions[len(drop):]
+            total = sum(os.path.getsize(self.version_path(v)) for v in kept)
+            for version in kept[:-1]: # Never drop the newest
+                if total <= self.max_bytes:
+                    break
+                if version != current:
+                    total -= os.path.getsize(self.version_path(version))
+                    drop.append(version)
+        for version in drop:
+            if version != current:
+                os.remove(self.version_path(version))
+
+
+class ModelWatcher:
+    """
+    Polls the live model file and hot-swaps FaceSystem's recognizer when
+    another process (a registration kiosk, --rollback) published a new one.
+    on_reload() runs on the watcher thread after each swap.
+    """
+    def __init__(self, face_system, interval=2.0, on_reload=None):
+        self.face_system = face_system
+        self.interval = interval
+        self.on_reload = on_reload
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._loop, name="model-watcher", daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join(1.0)
+
+    def _loop(self):
+        while not self._stop.wait(self.interval):
+            try:
+                if self.face_system.reload_model() and self.on_reload:
+                    self.on_reload()
+            except Exception as e:
+                print(f"Model reload failed: {e}")
@@ -0,0 +1,252 @@
+import json
+import time
+import datetime
+import threading
+
+import cv2
+
+from .buffers import FramePool, ScratchBuffers
+from .frame_analysis import FrameAnalysis
+from .liveness import LivenessDetector
+from .metrics import metrics
+from .pipeline import LatestQueue
+from .session import LivenessSession, analyze_recognition
+from .tracking import FaceTracker
+
+
+def open_source(source):
+    """Device index ("0"), video file path or stream URL (rtsp://, http://)."""
+    if isinstance(source, int) or str(source).isdigit():
+        return cv2.VideoCapture(int(source))
+    return cv2.VideoCapture(source)
+
+
+def is_file_source(source):
+    return not (isinstance(source, int) or str(source).isdigit() or "://" in str(source))
+
+
+class Stream:
+    """
+    One camera / file / URL with its own per-stream state: the capture
+    thread, a size-1 LatestQueue of fresh frames, the face track, the
+    liveness detector (the face mesh tracks between frames) and the
+    challenge session with its punch cooldowns.
+    """
+    def __init__(self, name, source, face_system, realtime=True, reconnect_after=50):
+        self.name = name
+        self.source = source
+        self.is_file = is_file_source(source)
+        self.realtime = realtime # Pace files at their native FPS, like a camera would deliver them
+        self.reconnect_after = reconnect_after
+
+        self.cap = open_source(source)
+        self.fps = self.cap.get(cv2.CAP_PROP_FPS) or 30.0
+        self.frames = LatestQueue(maxsize=1)
+        self.frame_pool = FramePool()
+        self.tracker = FaceTracker(face_system)
+        self.liveness = LivenessDetector()
+        self.session = LivenessSession()
+
+        self.busy = False  # Claimed by an inference worker
+        self.ended = False # File finished (live sources never end)
+        self.last_prompt = None
+        self.last_user = None
+
+        # Stats
+        self.frames_captured = 0
+        self.frames_processed = 0
+
+    def capture_loop(self, stop_event):
+        seq = 0
+        failures = 0
+        interval = 1.0 / self.fps if self.fps > 0 else 0
+        next_time = time.monotonic()
+        while not stop_event.is_set():
+            ret, frame = self.frame_pool.read(self.cap)
+            if not ret:
+                if self.is_file:
+                    break
+                failures += 1
+                if failures >= self.reconnect_after:
+                    # Network streams drop; reopen instead of giving up
+                    self.cap.release()
+                    self.cap = open_source(self.source)
+                    failures = 0
+                time.sleep(0.02)
+                continue
+
+            failures = 0
+            seq += 1
+            self.frames_captured += 1
+            if self.is_file and not self.realtime:
+                # As fast as inference allows, but every frame gets analyzed
+                while len(self.frames) and not stop_event.is_set():
+                    time.sleep(0.001)
+            self.frames.put((seq, frame))
+
+            if self.is_file and self.realtime and interval:
+                next_time += interval
+                delay = next_time - time.monotonic()
+                if delay > 0:
+                    time.sleep(delay)
+        self.ended = True
+        self.frames.close()
+        self.cap.release()
+
+    @property
+    def frames_dropped(self):
+        return self.frames.dropped
+
+
+class MultiStreamRunner:
+    """
+    Headless recognition + liveness over several sources in one process.
+
+    All streams share one FaceSystem (one recognizer model in memory); each
+    stream keeps its own track, face mesh and challenge session. Inference
+    workers take streams in round-robin order and always process the newest
+    frame of the stream, so a busy entrance can not starve the others and
+    stale frames are dropped instead of queued.
+
+    Events (recognized, challenge prompt, verified, punch, reset) are passed
+    to on_event(dict). With punch="IN"/"OUT" a verified user is punched
+    automatically (respecting the cooldown).
+    """
+    def __init__(self, sources, face_system, db=None, punch=None, workers=1, realtime=True, on_event=None):
+        self.face_system = face_system
+        self.db = db
+        self.punch = punch
+        self.workers = workers
+        self.on_event = on_event or (lambda event: print(json.dumps(event)))
+        self.user_map = db.get_users_dict() if db else {}
+
+        self.streams = [Stream(f"cam{i}", source, face_system, realtime) for i, source in enumerate(sources)]
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+        self._cursor = 0
+        self._threads = []
+        self._watcher = None
+        self.scratch = ScratchBuffers() # Per inference thread
+
+    def reset_tracks(self):
+        """Cached identities predate a reloaded model."""
+        for stream in self.streams:
+            stream.tracker.reset()
+
+    def start(self):
+        self._stop.clear()
+        self._watcher = self.face_system.watch_model(on_reload=self.reset_tracks)
+        for stream in self.streams:
+            self._threads.append(threading.Thread(target=stream.capture_loop, args=(self._stop,),
+                                                  name=f"capture-{stream.name}", daemon=True))
+        for i in range(self.workers):
+            self._threads.append(threading.Thread(target=self._inference_loop, name=f"inference-{i}", daemon=True))
+        for t in self._threads:
+            t.start()
+
+    def stop(self, timeout=1.0):
+        self._stop.set()
+        if self._watcher:
+            self._watcher.stop()
+        for stream in self.streams:
+            stream.frames.close()
+        for t in self._threads:
+            t.join(timeout)
+        self._threads = []
+
+    def run(self):
+        """Run until every file source has ended (or Ctrl+C). Returns per-stream stats."""
+        self.start()
+        try:
+            while not self._stop.is_set():
+                with self._lock:
+                    if all(s.ended and not len(s.frames) and not s.busy for s in self.streams):
+                        break
+                time.sleep(0.1)
+        except KeyboardInterrupt:
+            pass
+        self.stop()
+        return self.stats()
+
+    def _claim(self):
+        """Next idle stream (round-robin from the cursor) with a fresh frame, or (None, None)."""
+        with self._lock:
+            count = len(self.streams)
+            for offset in range(count):
+                stream = self.streams[(self._cursor + offset) % count]
+                if stream.busy:
+                    continue
+                item = stream.frames.get_nowait()
+                if item is None:
+                    continue
+                stream.busy = True
+                self._cursor = (self._cursor + offset + 1) % count
+                return stream, item[1]
+        return None, None
+
+    def _inference_loop(self):
+        while not self._stop.is_set():
+            stream, frame = self._claim()
+            if stream is None:
+                time.sleep(0.002)
+                continue
+            try:
+                with metrics.stage("inference"):
+                    self.process(stream, frame)
+                stream.frames_processed += 1
+                metrics.tick(f"inference_{stream.name}")
+            except Exception as e:
+                metrics.count("inference_errors")
+                print(f"Inference Error ({stream.name}): {e}")
+            finally:
+                stream.busy = False
+
+    def process(self, stream, frame):
+        analysis = FrameAnalysis(frame, self.scratch)
+        result = analyze_recognition(frame, analysis, stream.tracker, stream.liveness,
+                                     self.face_system.match_threshold, stream.session.in_progress)
+        user_id = result["user_id"]
+        event = stream.session.update(user_id, result["rect"], result["live_info"])
+
+        if event["matched"] and user_id != stream.last_user:
+            self.emit(stream, "recognized", user_id, conf=round(float(result["conf"]), 1))
+        stream.last_user = user_id if event["matched"] else None
+
+        if event["prompt"] != stream.last_prompt and event["prompt"]:
+            self.emit(stream, "challenge", user_id, prompt=event["prompt"])
+        stream.last_prompt = event["prompt"]
+
+        if event["reset"]:
+            stream.liveness.reset()
+            self.emit(stream, "reset", None)
+
+        if event["just_verified"]:
+            self.emit(stream, "verified", user_id, cooldown=int(event["cooldown"]))
+            if self.punch and self.db and event["cooldown"] <= 0:
+                self.db.log_attendance(user_id, self.punch)
+                stream.session.record_punch(user_id)
+                stream.liveness.reset()
+                self.emit(stream, "punch", user_id, type=self.punch)
+
+    def emit(self, stream, kind, user_id, **fields):
+        event = {
+            "time": datetime.datetime.now().isoformat(timespec="milliseconds"),
+            "stream": stream.name,
+            "event": kind,
+        }
+        if user_id is not None:
+            event["user_id"] = int(user_id)
+            event["name"] = self.user_map.get(user_id, "Unknown")
+        event.update(fields)
+        self.on_event(event)
+
+    def stats(self):
+        return {
+            stream.name: {
+                "source": str(stream.source),
+                "captured": stream.frames_captured,
+                "processed": stream.frames_processed,
+                "dropped": stream.frames_dropped,
+            }
+            for stream in self.streams
+        }
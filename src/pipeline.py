@@ -0,0 +1,185 @@
+import threading
+import collections
+import time
+
+from .buffers import FramePool
+from .metrics import metrics
+
+
+class LatestQueue:
+    """
+    Bounded queue that keeps only the freshest items.
+    put() never blocks: when full, the oldest item is dropped and counted.
+    """
+    def __init__(self, maxsize=1):
+        self.maxsize = maxsize
+        self.dropped = 0
+        self._items = collections.deque()
+        self._cond = threading.Condition()
+        self._closed = False
+
+    def put(self, item):
+        with self._cond:
+            if len(self._items) >= self.maxsize:
+                self._items.popleft()
+                self.dropped += 1
+            self._items.append(item)
+            self._cond.notify()
+
+    def get(self, timeout=None):
+        """Block until an item is available. Returns None on timeout or close."""
+        with self._cond:
+            if not self._items and not self._closed:
+                self._cond.wait(timeout)
+            if self._items:
+                return self._items.popleft()
+            return None
+
+    def get_nowait(self):
+        with self._cond:
+            if self._items:
+                return self._items.popleft()
+            return None
+
+    def __len__(self):
+        with self._cond:
+            return len(self._items)
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+
+
+class FramePipeline:
+    """
+    Capture -> inference -> UI pipeline.
+
+    - Capture thread: reads the camera as fast as it delivers, so the driver
+      buffer never backs up. Every frame becomes the latest display frame and
+      is offered to inference through a size-1 LatestQueue (stale frames are
+      dropped, never queued).
+    - Inference worker(s): run analyze_fn(frame) on the freshest frame and
+      publish (seq, frame, result) to the result queue.
+    - UI consumer: polls latest_frame() / latest_result() without blocking.
+
+    With a FrameScheduler, workers wait for their next slot before taking
+    a frame, and in idle mode only presence_fn(frame) (a cheap face check)
+    runs until it reports a face.
+
+    analyze_fn must be thread-safe if num_workers > 1.
+    """
+    def __init__(self, cap, analyze_fn, num_workers=1, scheduler=None, presence_fn=None):
+        self.cap = cap
+        self.frame_pool = FramePool() # Frames are read into reused buffers
+        self.analyze_fn = analyze_fn
+        self.num_workers = num_workers
+        self.scheduler = scheduler
+        self.presence_fn = presence_fn
+
+        self.frame_queue = LatestQueue(maxsize=1)
+        self.result_queue = LatestQueue(maxsize=1)
+
+        self._stop = threading.Event()
+        self._threads = []
+        self._frame_lock = threading.Lock()
+        self._latest_frame = None
+        self._latest_seq = -1
+        self._last_result_seq = -1
+
+        # Stats
+        self.frames_captured = 0
+        self.frames_processed = 0
+        self.errors = 0
+
+    def start(self):
+        self._stop.clear()
+        self._threads = [threading.Thread(target=self._capture_loop, name="capture", daemon=True)]
+        for i in range(self.num_workers):
+            self._threads.append(threading.Thread(target=self._inference_loop, name=f"inference-{i}", daemon=True))
+        for t in self._threads:
+            t.start()
+
+    def stop(self, timeout=1.0):
+        self._stop.set()
+        if self.scheduler is not None:
+            self.scheduler.interrupt()
+        self.frame_queue.close()
+        self.result_queue.close()
+        for t in self._threads:
+            t.join(timeout)
+        self._threads = []
+
+    def _capture_loop(self):
+        seq = 0
+        while not self._stop.is_set():
+            with metrics.stage("capture"):
+                ret, frame = self.frame_pool.read(self.cap)
+            if not ret:
+                metrics.count("capture_failures")
+                time.sleep(0.01)
+                continue
+            seq += 1
+            self.frames_captured += 1
+            metrics.tick("capture")
+            with self._frame_lock:
+                self._latest_frame = frame
+                self._latest_seq = seq
+            self.frame_queue.put((seq, frame))
+
+    def _inference_loop(self):
+        scheduler = self.scheduler
+        while not self._stop.is_set():
+            if scheduler is not None and not scheduler.wait(self._stop):
+                break
+            item = self.frame_queue.get(timeout=0.1)
+            if item is None:
+                continue
+            seq, frame = item
+            start = time.perf_counter()
+            try:
+                if scheduler is not None and scheduler.idle and self.presence_fn is not None:
+                    with metrics.stage("presence"):
+                        present = self.presence_fn(frame)
+                    if not present:
+                        scheduler.record(time.perf_counter() - start)
+                        continue
+                    scheduler.saw_face() # Back to full analysis on this same frame
+
+                with metrics.stage("inference"):
+                    result = self.analyze_fn(frame)
+            except Exception as e:
+                self.errors += 1
+                metrics.count("inference_errors")
+                print(f"Inference Error: {e}")
+                if scheduler is not None:
+                    scheduler.record(time.perf_counter() - start)
+                continue
+            if scheduler is not None:
+                scheduler.record(time.perf_counter() - start)
+            self.frames_processed += 1
+            metrics.tick("inference")
+            metrics.gauge("frames_dropped", self.frame_queue.dropped)
+            metrics.gauge("frame_allocations", self.frame_pool.allocations)
+            self.result_queue.put((seq, frame, result))
+
+    def latest_frame(self):
+        """Returns (seq, frame) of the most recent captured frame, or (-1, None)."""
+        with self._frame_lock:
+            return self._latest_seq, self._latest_frame
+
+    def latest_result(self):
+        """
+        Returns the newest unseen (seq, frame, result) or None.
+        Results older than one already delivered (possible with several
+        workers) are discarded.
+        """
+        item = self.result_queue.get_nowait()
+        if item is None or item[0] <= self._last_result_seq:
+            return None
+        self._last_result_seq = item[0]
+        return item
+
+    @property
+    def frames_dropped(self):
+        return self.frame_queue.dropped
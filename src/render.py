@@ -0,0 +1,73 @@
+import cv2
+import numpy as np
+from PIL import Image, ImageTk
+
+
+class FrameRenderer:
+    """
+    Display path for the video label.
+
+    The camera frame is resized once to the display size (into a reused
+    buffer, so the shared frame is never copied or drawn on), overlays are
+    drawn on the small image with coordinates scaled from full resolution,
+    and the color conversion writes into a second reused RGBA buffer (PIL
+    only shares memory with 4-byte pixel buffers). A PIL image wraps that
+    buffer and the same PhotoImage is updated with paste() instead of
+    allocating a new one per frame.
+    """
+    def __init__(self, label, max_size=(800, 600), fps=30):
+        self.label = label
+        self.max_size = max_size
+        self.interval_ms = max(1, int(1000 / fps))
+
+        self._size = None    # (width, height) of the current buffers
+        self._bgr = None
+        self._rgba = None
+        self._pil = None
+        self._photo = None
+
+    def display_size(self, frame, area=None):
+        """Fit the frame into area (width, height) or max_size, keeping its aspect ratio."""
+        ih, iw = frame.shape[:2]
+        max_w, max_h = area if area and area[0] > 1 and area[1] > 1 else self.max_size
+        scale = min(max_w / iw, max_h / ih, 1.0)
+        return max(1, int(iw * scale)), max(1, int(ih * scale))
+
+    def _allocate(self, size):
+        width, height = size
+        self._size = size
+        self._bgr = np.empty((height, width, 3), dtype=np.uint8)
+        self._rgba = np.empty((height, width, 4), dtype=np.uint8)
+        # Zero-copy view: the PIL image reads straight from self._rgba
+        self._pil = Image.frombuffer("RGBA", size, self._rgba, "raw", "RGBA", 0, 1)
+        self._photo = ImageTk.PhotoImage(image=self._pil)
+        self.label.configure(image=self._photo)
+        self.label.imgtk = self._photo
+
+    def render(self, frame, overlays=(), area=None):
+        size = self.display_size(frame, area)
+        if size != self._size:
+            self._allocate(size)
+
+        if size == (frame.shape[1], frame.shape[0]):
+            np.copyto(self._bgr, frame)
+        else:
+            cv2.resize(frame, size, dst=self._bgr, interpolation=cv2.INTER_LINEAR)
+
+        self.draw_overlays(self._bgr, overlays, size[0] / frame.shape[1])
+        cv2.cvtColor(self._bgr, cv2.COLOR_BGR2RGBA, dst=self._rgba)
+        self._photo.paste(self._pil)
+
+    @staticmethod
+    def draw_overlays(image, overlays, scale=1.0):
+        """overlays: ("rect", (x, y, w, h), color, thickness) / ("text", text, (x, y), font_scale, color) in frame pixels."""
+        for overlay in overlays:
+            if overlay[0] == "rect":
+                _, (x, y, w, h), color, thickness = overlay
+                p1 = (int(x * scale), int(y * scale))
+                p2 = (int((x + w) * scale), int((y + h) * scale))
+                cv2.rectangle(image, p1, p2, color, thickness)
+            else:
+                _, text, (x, y), font_scale, color = overlay
+                org = (int(x * scale), int(y * scale))
+                cv2.putText(image, text, org, cv2.FONT_HERSHEY_SIMPLEX, max(0.4, font_scale * scale), color, 2)
@@ -0,0 +1,241 @@
+import sqlite3
+import datetime
+import threading
+import csv
+import contextlib
+
+TIMESTAMP_FORMAT = "%Y-%m-%d %H:%M:%S"
+CHUNK_SIZE = 1000 # Rows fetched per round trip; bounds memory for refresh and exports
+
+
+def to_local(timestamp):
+    """Stored attendance timestamps are UTC (CURRENT_TIMESTAMP format); returns local datetime."""
+    utc = datetime.datetime.strptime(timestamp, TIMESTAMP_FORMAT).replace(tzinfo=datetime.timezone.utc)
+    return utc.astimezone()
+
+
+class AttendanceReporter:
+    """
+    Per-user daily attendance summaries maintained incrementally.
+
+    Each summary row (user, local day) holds the first IN, last OUT, worked
+    seconds from paired IN/OUT punches, whether the first IN was late and the
+    number of unmatched punches (OUT without IN, IN followed by another IN).
+    An IN still waiting for its OUT is kept in open_in.
+
+    Night shifts: an OUT with no open IN on its own day closes the previous
+    day's open IN if it is at most `max_shift_hours` old. The whole shift
+    (worked seconds and last OUT) is credited to the day it started on.
+
+    Only attendance rows newer than the stored watermark (last applied id) are
+    read, so a refresh costs O(new punches) no matter how large the table is.
+    Registered as a DatabaseManager punch listener, summaries follow every
+    committed batch.
+    """
+    def __init__(self, db, shift_start="09:00", grace_minutes=0, max_shift_hours=16):
+        self.db = db
+        self.shift_start = datetime.datetime.strptime(shift_start, "%H:%M").time()
+        self.grace = datetime.timedelta(minutes=grace_minutes)
+        # At most 24h, so an open IN can only be on the OUT's day or the day before
+        self.max_shift = datetime.timedelta(hours=min(max_shift_hours, 24))
+
+        # Own connection: long exports never hold the DatabaseManager lock
+        self.conn = sqlite3.connect(db.db_path, check_same_thread=False)
+        self.conn.execute('PRAGMA busy_timeout=5000')
+        self.lock = threading.Lock()
+        self.init_tables()
+
+        db.punch_listeners.append(lambda rows: self.refresh())
+
+    def init_tables(self):
+        with self.lock, self.conn:
+            self.conn.execute('''
+                CREATE TABLE IF NOT EXISTS daily_summary (
+                    user_id INTEGER NOT NULL,
+                    day TEXT NOT NULL,
+                    first_in TEXT,
+                    last_out TEXT,
+                    open_in TEXT,
+                    worked_seconds INTEGER NOT NULL DEFAULT 0,
+                    late INTEGER NOT NULL DEFAULT 0,
+                    unmatched INTEGER NOT NULL DEFAULT 0,
+                    PRIMARY KEY (user_id, day)
+                )
+            ''')
+            self.conn.execute('CREATE INDEX IF NOT EXISTS idx_daily_summary_day ON daily_summary (day)')
+            self.conn.execute('CREATE TABLE IF NOT EXISTS report_state (key TEXT PRIMARY KEY, value INTEGER)')
+
+    def is_late(self, first_in_local):
+        shift = datetime.datetime.combine(first_in_local.date(), self.shift_start, first_in_local.tzinfo)
+        return first_in_local > shift + self.grace
+
+    def refresh(self):
+        """Apply attendance rows logged since the last refresh. Returns the number applied."""
+        applied = 0
+        with self.lock, self.conn:
+            row = self.conn.execute("SELECT value FROM report_state WHERE key = 'last_id'").fetchone()
+            last_id = row[0] if row else 0
+
+            cursor = self.conn.execute(
+                'SELECT id, user_id, timestamp, type FROM attendance WHERE id > ? ORDER BY id', (last_id,))
+            while True:
+                rows = cursor.fetchmany(CHUNK_SIZE)
+                if not rows:
+                    break
+                self._apply(rows)
+                last_id = rows[-1][0]
+                applied += len(rows)
+
+            self.conn.execute("INSERT OR REPLACE INTO report_state (key, value) VALUES ('last_id', ?)", (last_id,))
+        return applied
+
+    def rebuild(self):
+        """Drop all summaries and recompute them from the full attendance table."""
+        with self.lock, self.conn:
+            self.conn.execute('DELETE FROM daily_summary')
+            self.conn.execute("DELETE FROM report_state WHERE key = 'last_id'")
+        return self.refresh()
+
+    def _apply(self, rows):
+        """Fold a chunk of punches (in id order) into their summary rows."""
+        summaries = {}
+        for _, user_id, timestamp, punch_type in rows:
+            local = to_local(timestamp)
+            key = (user_id, local.date().isoformat())
+            summary = summaries.get(key) or self._load_summary(key)
+            if punch_type != 'IN' and summary["open_in"] is None:
+                # Night shift: close the IN left open on the previous day
+                summary = self._open_shift(summaries, user_id, local) or summary
+            summaries[(user_id, summary["day"])] = summary
+
+            if punch_type == 'IN':
+                if summary["open_in"] is not None:
+                    summary["unmatched"] += 1 # Previous IN never got its OUT
+                summary["open_in"] = timestamp
+                if summary["first_in"] is None:
+                    summary["first_in"] = timestamp
+                    summary["late"] = int(self.is_late(local))
+            else:
+                if summary["open_in"] is not None:
+                    worked = local - to_local(summary["open_in"])
+                    summary["worked_seconds"] += int(worked.total_seconds())
+                    summary["open_in"] = None
+                else:
+                    summary["unmatched"] += 1
+                summary["last_out"] = timestamp
+
+        self.conn.executemany('''
+            INSERT OR REPLACE INTO daily_summary
+                (user_id, day, first_in, last_out, open_in, worked_seconds, late, unmatched)
+            VALUES (:user_id, :day, :first_in, :last_out, :open_in, :worked_seconds, :late, :unmatched)
+        ''', list(summaries.values()))
+
+    def _open_shift(self, summaries, user_id, out_local):
+        """The previous day's summary if its open IN is at most max_shift before out_local, else None."""
+        key = (user_id, (out_local.date() - datetime.timedelta(days=1)).isoformat())
+        summary = summaries.get(key) or self._load_summary(key)
+        if summary["open_in"] is None or out_local - to_local(summary["open_in"]) > self.max_shift:
+            return None
+        return summary
+
+    def _load_summary(self, key):
+        row = self.conn.execute('''
+            SELECT first_in, last_out, open_in, worked_seconds, late, unmatched
+            FROM daily_summary WHERE user_id = ? AND day = ?
+        ''', key).fetchone()
+        summary = {"user_id": key[0], "day": key[1], "first_in": None, "last_out": None,
+                   "open_in": None, "worked_seconds": 0, "late": 0, "unmatched": 0}
+        if row:
+            for name, value in zip(("first_in", "last_out", "open_in", "worked_seconds", "late", "unmatched"), row):
+                summary[name] = value
+        return summary
+
+    def daily_report(self, start_day, end_day, user_id=None):
+        """
+        Yield summary dicts for days in [start_day, end_day] (YYYY-MM-DD),
+        fetched in chunks. An IN still open on a past day counts as unmatched.
+        """
+        self.refresh()
+        query = '''
+            SELECT s.user_id, u.name, s.day, s.first_in, s.last_out, s.open_in,
+                   s.worked_seconds, s.late, s.unmatched
+            FROM daily_summary s LEFT JOIN users u ON u.id = s.user_id
+            WHERE s.day BETWEEN ? AND ?
+        '''
+        params = [start_day, end_day]
+        if user_id is not None:
+            query += ' AND s.user_id = ?'
+            params.append(user_id)
+        query += ' ORDER BY s.day, s.user_id'
+
+        today = datetime.date.today().isoformat()
+        # Dedicated read connection: under WAL the export reads a consistent
+        # snapshot while punches keep being written
+        conn = sqlite3.connect(self.db.db_path)
+        try:
+            cursor = conn.execute(query, params)
+            yield from self._report_rows(cursor, today)
+        finally:
+            conn.close()
+
+    def _report_rows(self, cursor, today):
+        while True:
+            rows = cursor.fetchmany(CHUNK_SIZE)
+            if not rows:
+                break
+            for uid, name, day, first_in, last_out, open_in, worked, late, unmatched in rows:
+                if open_in is not None and day < today:
+                    unmatched += 1
+                yield {
+                    "user_id": uid,
+                    "name": name or "Unknown",
+                    "day": day,
+                    "first_in": to_local(first_in).strftime("%H:%M:%S") if first_in else "",
+                    "last_out": to_local(last_out).strftime("%H:%M:%S") if last_out else "",
+                    "worked_hours": round(worked / 3600.0, 2),
+                    "late": bool(late),
+                    "unmatched": unmatched,
+                }
+
+    def export_daily_csv(self, path, start_day, end_day):
+        """Stream the daily report to a CSV file. Returns the number of rows written."""
+        fields = ["user_id", "name", "day", "first_in", "last_out", "worked_hours", "late", "unmatched"]
+        count = 0
+        with open(path, "w", newline="") as f:
+            writer = csv.DictWriter(f, fieldnames=fields)
+            writer.writeheader()
+            for row in self.daily_report(start_day, end_day):
+                writer.writerow(row)
+                count += 1
+        return count
+
+    def export_punches_csv(self, path, start_day, end_day):
+        """Stream raw punches (local time) for a date range to CSV. Returns the number of rows written."""
+        # Widen the UTC window by a day on each side, then filter on local date
+        start = (datetime.date.fromisoformat(start_day) - datetime.timedelta(days=1)).isoformat()
+        end = (datetime.date.fromisoformat(end_day) + datetime.timedelta(days=2)).isoformat()
+        count = 0
+        # closing(): the connection's own context manager only ends the transaction
+        with contextlib.closing(sqlite3.connect(self.db.db_path)) as conn, open(path, "w", newline="") as f:
+            cursor = conn.execute('''
+                SELECT a.user_id, u.name, a.timestamp, a.type
+                FROM attendance a LEFT JOIN users u ON u.id = a.user_id
+                WHERE a.timestamp >= ? AND a.timestamp < ?
+                ORDER BY a.timestamp
+            ''', (start, end))
+            writer = csv.writer(f)
+            writer.writerow(["user_id", "name", "local_time", "type"])
+            while True:
+                rows = cursor.fetchmany(CHUNK_SIZE)
+                if not rows:
+                    break
+                for uid, name, timestamp, punch_type in rows:
+                    local = to_local(timestamp)
+                    if start_day <= local.date().isoformat() <= end_day:
+                        writer.writerow([uid, name or "Unknown", local.strftime(TIMESTAMP_FORMAT), punch_type])
+                        count += 1
+        return count
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
@@ -0,0 +1,108 @@
+import os
+import shutil
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import cv2
+
+
+class SampleStore:
+    """
+    Packed per-user face sample store: samples/<user_id>.npz holds every crop
+    of a user as raw uint8 (lossless, no JPEG re-encoding) in one flat buffer
+    plus a (N, 2) shape table. A full load is one file open per user instead
+    of a listdir/stat/decode per image, and users load in parallel.
+    """
+    def __init__(self, path="samples", workers=None):
+        self.path = path
+        self.workers = workers or min(8, (os.cpu_count() or 1))
+
+    def user_file(self, user_id):
+        return os.path.join(self.path, f"{int(user_id)}.npz")
+
+    def user_ids(self):
+        if not os.path.isdir(self.path):
+            return []
+        ids = []
+        for file_name in os.listdir(self.path):
+            stem, ext = os.path.splitext(file_name)
+            if ext == ".npz" and stem.isdigit():
+                ids.append(int(stem))
+        return sorted(ids)
+
+    def save(self, user_id, samples):
+        """Write (replace) all samples of a user. samples: list of 2-D uint8 crops."""
+        samples = [np.ascontiguousarray(s, dtype=np.uint8) for s in samples if s is not None and s.size > 0]
+        shapes = np.array([s.shape[:2] for s in samples], dtype=np.int32).reshape(-1, 2)
+        data = np.concatenate([s.ravel() for s in samples]) if samples else np.zeros(0, dtype=np.uint8)
+
+        os.makedirs(self.path, exist_ok=True)
+        path = self.user_file(user_id)
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "wb") as f:
+            np.savez(f, data=data, shapes=shapes)
+        os.replace(tmp_path, path)
+
+    def load(self, user_id):
+        """Returns the user's samples as a list of 2-D uint8 arrays (views into one buffer)."""
+        path = self.user_file(user_id)
+        if not os.path.exists(path):
+            return []
+        with np.load(path) as packed:
+            data, shapes = packed["data"], packed["shapes"]
+        sizes = shapes[:, 0] * shapes[:, 1]
+        offsets = np.concatenate([[0], np.cumsum(sizes)])
+        return [data[offsets[i]:offsets[i+1]].reshape(h, w) for i, (h, w) in enumerate(shapes)]
+
+    def remove(self, user_id):
+        path = self.user_file(user_id)
+        if os.path.exists(path):
+            os.remove(path)
+
+    def load_all(self):
+        """
+        Load every user's samples in parallel.
+        Returns (faces, ids) lists, ready for training.
+        """
+        faces = []
+        ids = []
+        user_ids = self.user_ids()
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            for uid, samples in zip(user_ids, pool.map(self.load, user_ids)):
+                faces.extend(samples)
+                ids.extend([uid] * len(samples))
+        return faces, ids
+
+    def migrate(self, legacy_path, remove_legacy=False):
+        """
+        Pack the old dataset/<id>/<i>.jpg layout into this store.
+        Users that already have a packed file are skipped, so this is safe to
+        run repeatedly. JPEGs are decoded in parallel (cv2.imread releases the
+        GIL) and left in place unless remove_legacy is set.
+        Returns the number of users migrated.
+        """
+        if not os.path.isdir(legacy_path):
+            return 0
+
+        migrated = 0
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            for user_id in os.listdir(legacy_path):
+                user_dir = os.path.join(legacy_path, user_id)
+                if not os.path.isdir(user_dir) or not user_id.isdigit():
+                    continue
+                if os.path.exists(self.user_file(user_id)):
+                    continue
+
+                paths = [os.path.join(user_dir, f) for f in sorted(os.listdir(user_dir)) if f.endswith("jpg")]
+                paths = [p for p in paths if os.path.getsize(p) > 0]
+                samples = [face for face in pool.map(lambda p: cv2.imread(p, cv2.IMREAD_GRAYSCALE), paths)
+                           if face is not None and face.size > 0]
+
+                self.save(int(user_id), samples)
+                migrated += 1
+                if remove_legacy:
+                    shutil.rmtree(user_dir)
+
+        if migrated:
+            print(f"Migrated {migrated} users from {legacy_path} to {self.path}.")
+        return migrated
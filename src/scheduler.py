@@ -0,0 +1,106 @@
+import os
+import time
+import threading
+
+from .metrics import metrics
+
+MODE_ACTIVE = "active"
+MODE_IDLE = "idle"
+
+
+class FrameScheduler:
+    """
+    Decides when the inference worker runs and how much work it does.
+
+    - Active mode: full analysis, paced so the worker uses at most
+      target_load of a core (interval derived from the measured inference
+      time). The target shrinks when there is little CPU headroom: this
+      process's CPU time against wall time (every platform), and the load
+      average where the OS has one (not on Windows).
+    - Idle mode: after idle_after seconds without a face, only a cheap
+      presence check (downscaled detection) runs every idle_interval seconds.
+      The first face seen switches back to active mode immediately.
+    """
+    def __init__(self, idle_after=10.0, idle_interval=0.5, target_load=0.7, min_interval=0.0, max_interval=0.25):
+        self.idle_after = idle_after
+        self.idle_interval = idle_interval
+        self.target_load = target_load
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+
+        self.last_face_time = time.monotonic()
+        self.next_run = 0.0
+        self.busy_avg = 0.0 # EMA of inference seconds per frame
+        self.cpus = os.cpu_count() or 1
+        self._last_wall = time.monotonic()
+        self._last_cpu = time.process_time()
+        self._process_headroom = 1.0
+        self._wake = threading.Event()
+
+    @property
+    def mode(self):
+        if time.monotonic() - self.last_face_time > self.idle_after:
+            return MODE_IDLE
+        return MODE_ACTIVE
+
+    @property
+    def idle(self):
+        return self.mode == MODE_IDLE
+
+    def headroom(self):
+        """Fraction of CPU left over, the lower of this process's and (where known) the system's."""
+        now, cpu = time.monotonic(), time.process_time()
+        wall = now - self._last_wall
+        if wall >= 0.5: # Shorter windows are too noisy
+            used = (cpu - self._last_cpu) / (wall * self.cpus)
+            self._process_headroom = max(0.0, 1.0 - used)
+            self._last_wall, self._last_cpu = now, cpu
+        headroom = self._process_headroom
+        try:
+            headroom = min(headroom, max(0.0, 1.0 - os.getloadavg()[0] / self.cpus))
+        except (AttributeError, OSError):
+            pass # No load average (Windows)
+        return headroom
+
+    def interval(self):
+        """Seconds between inference runs in the current mode."""
+        if self.idle:
+            return self.idle_interval
+        # Low headroom -> aim for a smaller share of a core
+        target = self.target_load * min(1.0, 0.5 + self.headroom())
+        target = max(0.1, target)
+        pause = self.busy_avg * (1.0 / target - 1.0)
+        return min(self.max_interval, max(self.min_interval, pause))
+
+    def wait(self, stop_event):
+        """Block the worker until its next slot (or a wake-up / stop)."""
+        delay = self.next_run - time.monotonic()
+        if delay > 0:
+            self._wake.wait(delay)
+        self._wake.clear()
+        return not stop_event.is_set()
+
+    def record(self, seconds):
+        """Called after each inference run with its duration."""
+        self.busy_avg = seconds if self.busy_avg == 0 else 0.8 * self.busy_avg + 0.2 * seconds
+        interval = self.interval()
+        self.next_run = time.monotonic() + interval
+        metrics.gauge("scheduler_interval_ms", round(interval * 1000, 1))
+        metrics.gauge("scheduler_mode", self.mode)
+
+    def saw_face(self):
+        """A face was seen: stay (or go back) to active mode at once."""
+        was_idle = self.idle
+        self.last_face_time = time.monotonic()
+        if was_idle:
+            self.next_run = 0.0
+            metrics.count("scheduler_wakeups")
+
+    def wake(self):
+        """Force active mode now (e.g. registration started)."""
+        self.saw_face()
+        self.interrupt()
+
+    def interrupt(self):
+        """Release a worker sleeping in wait()."""
+        self._wake.set()
@@ -0,0 +1,236 @@
+import json
+import time
+import queue
+import threading
+from concurrent.futures import Future
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+import numpy as np
+import cv2
+
+from .buffers import ScratchBuffers
+from .frame_analysis import FrameAnalysis
+from .liveness import LivenessDetector
+from .metrics import metrics
+
+
+class MicroBatcher:
+    """
+    Groups concurrent requests into batches.
+
+    The worker thread blocks for the first item, then keeps collecting until
+    max_batch items are queued or max_wait_ms has passed since the first one,
+    and hands the whole list to process_batch(items) -> results. Under light
+    load a request waits at most max_wait_ms; under heavy load batches fill
+    up and the per-item cost drops.
+    """
+    def __init__(self, process_batch, max_batch=16, max_wait_ms=5.0):
+        self.process_batch = process_batch
+        self.max_batch = max_batch
+        self.max_wait = max_wait_ms / 1000.0
+        self._queue = queue.Queue()
+        self._thread = threading.Thread(target=self._loop, name="micro-batcher", daemon=True)
+        self._running = True
+
+        # Stats
+        self.batches = 0
+        self.items = 0
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._running = False
+        self._queue.put(None)
+        self._thread.join(1.0)
+
+    def submit(self, item):
+        """Queue one item; returns a Future with its result."""
+        future = Future()
+        self._queue.put((item, future, time.perf_counter()))
+        return future
+
+    def _loop(self):
+        while self._running:
+            first = self._queue.get()
+            if first is None:
+                break
+            batch = [first]
+            deadline = time.perf_counter() + self.max_wait
+            while len(batch) < self.max_batch:
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0:
+                    break
+                try:
+                    entry = self._queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                if entry is None:
+                    self._running = False
+                    break
+                batch.append(entry)
+
+            started = time.perf_counter()
+            items = [item for item, _, _ in batch]
+            try:
+                results = self.process_batch(items)
+            except Exception as e:
+                metrics.count("service_errors")
+                for _, future, _ in batch:
+                    future.set_exception(e)
+                continue
+
+            self.batches += 1
+            self.items += len(batch)
+            metrics.count("service_batches")
+            metrics.count("service_requests", len(batch))
+            metrics.gauge("service_last_batch", len(batch))
+            for (_, future, queued), result in zip(batch, results):
+                result["batch_size"] = len(batch)
+                result["queue_ms"] = round((started - queued) * 1000, 2)
+                future.set_result(result)
+
+
+class RecognitionService:
+    """
+    Central recognition for thin kiosk clients.
+
+    POST /recognize with a JPEG/PNG body. Query parameters:
+      kind=frame (default) full camera frame: detection, alignment, predict
+      kind=crop  an already cropped face: predict only
+      liveness=1 also run the face mesh (frames only) and return EAR / MAR /
+                 head ratio for the client's own temporal checks
+    Decoding, detection, alignment and the face mesh run on the HTTP
+    threads, so concurrent kiosks spread that work over the cores; only the
+    face crops go to the micro-batcher, which recognizes them in one
+    FaceSystem.predict_many call.
+    """
+    def __init__(self, face_system, max_batch=16, max_wait_ms=5.0):
+        self.face_system = face_system
+        # Idle face mesh graphs; each request borrows one (a graph is not thread-safe)
+        self.meshes = queue.LifoQueue()
+        self.batcher = MicroBatcher(self.predict_batch, max_batch, max_wait_ms)
+        self.scratch = ScratchBuffers() # Per-thread scratch arrays for the HTTP threads
+        self._server = None
+
+    def borrow_mesh(self):
+        try:
+            return self.meshes.get_nowait()
+        except queue.Empty:
+            # Requests come from unrelated clients: no landmark tracking between frames
+            return LivenessDetector(static_image_mode=True)
+
+    def analyze(self, image, kind, want_liveness):
+        """Request thread: the face crop to recognize (or None) and the partial result."""
+        result = {"face": False, "rect": None, "user_id": None, "confidence": None, "matched": False}
+        if kind == "crop":
+            result["face"] = True
+            return self.prepare_crop(image), result
+
+        analysis = FrameAnalysis(image, self.scratch)
+        if want_liveness:
+            liveness = self.borrow_mesh()
+            try:
+                liveness.reset() # Unrelated frames
+                info = liveness.process_frame(image, analysis)
+            finally:
+                self.meshes.put(liveness)
+            if info["landmarks"] is not None:
+                result["liveness"] = {k: round(info[k], 4) for k in ("ear", "mar", "ratio")}
+        gray, rect = self.face_system.get_face_crop(image, analysis)
+        if rect is not None:
+            result["face"] = True
+            result["rect"] = [int(v) for v in rect]
+        return gray, result
+
+    def predict_batch(self, crops):
+        """Batcher thread: one batched predict for every face crop in the batch."""
+        predictions = self.face_system.predict_many(crops)
+        threshold = self.face_system.match_threshold
+        return [{"user_id": int(user_id) if user_id is not None else None,
+                 "confidence": round(float(conf), 2),
+                 "matched": user_id is not None and conf < threshold}
+                for user_id, conf in predictions]
+
+    def prepare_crop(self, image):
+        gray = image if image.ndim == 2 else cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+        aligner = self.face_system.aligner
+        if aligner is not None and gray.shape[1::-1] != aligner.size:
+            gray = cv2.resize(gray, aligner.size, interpolation=cv2.INTER_AREA)
+        return gray
+
+    def recognize(self, body, kind="frame", liveness=False, timeout=10.0):
+        start = time.perf_counter()
+        image = cv2.imdecode(np.frombuffer(body, dtype=np.uint8), cv2.IMREAD_COLOR)
+        if image is None:
+            raise ValueError("Could not decode image")
+        gray, result = self.analyze(image, kind, liveness)
+        if gray is not None:
+            result.update(self.batcher.submit(gray).result(timeout))
+        else:
+            result.update({"batch_size": 0, "queue_ms": 0.0})
+        result["server_ms"] = round((time.perf_counter() - start) * 1000, 2)
+        return result
+
+    def serve(self, port=8080, host="127.0.0.1"):
+        """Start the batcher and serve HTTP until interrupted (blocking)."""
+        service = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1" # Keep-alive: clients reuse their connection
+            disable_nagle_algorithm = True # Headers and body go out as separate writes
+
+            def send_json(self, code, payload):
+                body = json.dumps(payload).encode()
+                self.send_response(code)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_GET(self):
+                if urlparse(self.path).path == "/health":
+                    self.send_json(200, {"status": "ok", "batches": service.batcher.batches,
+                                         "requests": service.batcher.items})
+                else:
+                    self.send_json(404, {"error": "not found"})
+
+            def do_POST(self):
+                url = urlparse(self.path)
+                length = int(self.headers.get("Content-Length", 0))
+                body = self.rfile.read(length)
+                if url.path != "/recognize":
+                    self.send_json(404, {"error": "not found"})
+                    return
+                params = parse_qs(url.query)
+                kind = params.get("kind", ["frame"])[0]
+                liveness = params.get("liveness", ["0"])[0] in ("1", "true")
+                try:
+                    self.send_json(200, service.recognize(body, kind, liveness))
+                except ValueError as e:
+                    self.send_json(400, {"error": str(e)})
+                except Exception as e:
+                    metrics.count("service_errors")
+                    self.send_json(500, {"error": str(e)})
+
+            def log_message(self, *args):
+                pass # No per-request stdout noise
+
+        class Server(ThreadingHTTPServer):
+            daemon_threads = True
+            request_queue_size = 128 # Many kiosks connecting at once must not overflow the listen backlog
+
+        self.batcher.start()
+        watcher = self.face_system.watch_model() # New registrations elsewhere are served without a restart
+        self._server = Server((host, port), Handler)
+        print(f"Recognition service on http://{host}:{port}/recognize "
+              f"(batch <= {self.batcher.max_batch}, wait <= {self.batcher.max_wait * 1000:.0f} ms)")
+        try:
+            self._server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self._server.server_close()
+            watcher.stop()
+            self.batcher.stop()
@@ -0,0 +1,150 @@
+import time
+import random
+
+from .tracking import iou
+
+CHALLENGES = ["BLINK", "SMILE", "TURN_LEFT", "TURN_RIGHT"]
+
+
+def analyze_recognition(frame, analysis, tracker, liveness_detector, threshold, need_mesh):
+    """
+    Per-frame recognition + liveness work for one stream.
+    need_mesh: a challenge is in progress (or verified), so the face mesh runs
+    first and its landmarks refresh the tracked face they cover.
+    The largest (closest) face is the primary one and gets the liveness
+    challenge; the others are identified in the same batched predict so they
+    are known by the time they step forward.
+    Returns {"mode": "recognize", user_id, conf, rect, live_info, others};
+    live_info is only set for a matched primary face, others is a list of
+    (user_id, conf, rect) for the remaining faces.
+    """
+    live_info = None
+    if need_mesh:
+        live_info = liveness_detector.process_frame(frame, analysis)
+
+    faces = tracker.recognize_faces(frame, analysis)
+    user_id, conf, rect = faces[0] if faces else (None, 0, None)
+    if not (rect and conf < threshold and user_id is not None):
+        live_info = None
+    elif live_info is None:
+        live_info = liveness_detector.process_frame(frame, analysis)
+
+    if live_info is not None and len(faces) > 1:
+        # The mesh follows a single face; ignore it when that is not the primary one
+        mesh_rect = analysis.mesh_face_box()
+        if mesh_rect is None or iou(mesh_rect, rect) < 0.3:
+            live_info = None
+    return {"mode": "recognize", "user_id": user_id, "conf": conf, "rect": rect,
+            "live_info": live_info, "others": faces[1:]}
+
+
+class LivenessSession:
+    """
+    Challenge-response state of one camera: the 2-step challenge sequence,
+    the verified user, the grace counter that keeps a verified state through
+    brief face loss, and per-user punch cooldowns.
+
+    update() consumes one recognition result and returns what happened, so the
+    Tk UI and the headless multi-stream runner share the same logic.
+    """
+    def __init__(self, cooldown=30, exit_frames=30, steps=2, challenges=CHALLENGES, rng=None):
+        self.cooldown = cooldown
+        self.exit_frames = exit_frames # Keep the verified state this many frames after face loss
+        self.steps = steps
+        self.challenges = challenges
+        self.rng = rng or random.Random()
+
+        self.last_punch_time = {} # user_id -> timestamp to prevent spamming
+        self.reset()
+
+    def reset(self):
+        self.confirmed = False
+        self.active_challenge = None
+        self.challenge_start_time = 0
+        self.current_user_id = None
+        self.exit_counter = 0
+
+    @property
+    def in_progress(self):
+        """A challenge is running or a user is verified (the face mesh is needed)."""
+        return bool(self.active_challenge) or self.confirmed
+
+    def cooldown_remaining(self, user_id):
+        """Seconds before user_id may punch again (0 if allowed now)."""
+        last = self.last_punch_time.get(user_id, 0)
+        return max(0.0, self.cooldown - (time.time() - last))
+
+    def record_punch(self, user_id):
+        self.last_punch_time[user_id] = time.time()
+        self.reset()
+
+    def _lose_face(self, event):
+        if self.confirmed:
+            self.exit_counter -= 1
+            if self.exit_counter <= 0:
+                self.reset()
+                event["reset"] = True
+
+    def update(self, user_id, rect, live_info):
+        """
+        Returns an event dict:
+          matched       the face is a recognized user (live_info present)
+          prompt        current challenge text, or None
+          verified      the session is in the verified state
+          just_verified the last challenge was passed on this frame
+          cooldown      seconds left before this user may punch again
+          reset         the verified state expired on this frame
+        """
+        event = {"matched": False, "prompt": None, "verified": False, "just_verified": False,
+                 "cooldown": 0, "reset": False}
+
+        if not rect or live_info is None:
+            # No face, or unrecognized / low confidence
+            self._lose_face(event)
+            event["verified"] = self.confirmed
+            return event
+
+        event["matched"] = True
+        if not self.confirmed:
+            # If no active challenge queue, create one
+            if not self.active_challenge:
+                self.active_challenge = self.rng.sample(self.challenges, self.steps)
+                self.challenge_start_time = time.time()
+
+            current_target = self.active_challenge[0]
+            step_num = self.steps + 1 - len(self.active_challenge)
+            event["prompt"] = f"Step {step_num}/{self.steps}: Please {current_target}!"
+
+            if self.passed(current_target, live_info):
+                # Remove completed challenge, reset timer for the next one
+                self.active_challenge.pop(0)
+                self.challenge_start_time = time.time()
+
+                # If queue empty -> ALL PASSED
+                if not self.active_challenge:
+                    self.confirmed = True
+                    self.active_challenge = None
+                    self.current_user_id = user_id
+                    self.exit_counter = self.exit_frames
+                    event["just_verified"] = True
+                    event["cooldown"] = self.cooldown_remaining(user_id)
+                    event["prompt"] = None
+        else:
+            if self.current_user_id == user_id:
+                self.exit_counter = self.exit_frames # Keep buffer full
+            else:
+                self.exit_counter -= 1
+            if self.exit_counter <= 0:
+                self.reset()
+                event["reset"] = True
+
+        event["verified"] = self.confirmed
+        return event
+
+    @staticmethod
+    def passed(target, live_info):
+        if target == "BLINK":
+            return live_info["is_blinking"]
+        if target == "SMILE":
+            return live_info["is_smiling"]
+        return live_info["orientation"] == target
@@ -0,0 +1,94 @@
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from .frame_analysis import FrameAnalysis
+from .metrics import metrics
+
+
+def warm_up(face_system, liveness_detector, size=(640, 480)):
+    """
+    One throwaway pass through detection, predict and the face mesh so the
+    first real face does not pay for lazy graph / model initialization.
+    """
+    frame = np.full((size[1], size[0], 3), 128, dtype=np.uint8)
+    analysis = FrameAnalysis(frame)
+    face_system.recognize_faces(frame, analysis)
+    # A blank frame has no face, so run predict on a blank crop directly
+    crop_size = face_system.aligner.size if face_system.aligner else (100, 100)
+    face_system.predict(np.zeros((crop_size[1], crop_size[0]), dtype=np.uint8))
+    liveness_detector.process_frame(frame, analysis)
+    liveness_detector.reset()
+
+
+class StartupLoader:
+    """
+    Builds slow components (model, MediaPipe graphs, camera) concurrently on
+    background threads while the UI is already on screen.
+
+    add(name, fn, after=()) registers a component; fn receives the results
+    of the components named in `after` (e.g. a warm-up step that needs the
+    model and the face mesh). Every component runs on its own thread, so a
+    slow camera open does not hold up the model load. Per-component run time
+    and the overall time-to-ready are kept in report().
+    """
+    def __init__(self):
+        self._tasks = []
+        self._futures = {}
+        self._pool = None
+        self._started = None
+        self.timings = {} # name -> seconds spent in the component itself
+        self.ready_after = None # Seconds from start() until every component finished
+        self._lock = threading.Lock()
+
+    def add(self, name, fn, after=()):
+        self._tasks.append((name, fn, tuple(after)))
+        return self
+
+    def start(self):
+        self._started = time.perf_counter()
+        self._pool = ThreadPoolExecutor(max_workers=len(self._tasks) or 1, thread_name_prefix="startup")
+        for name, fn, after in self._tasks:
+            self._futures[name] = self._pool.submit(self._run, name, fn, after)
+        self._pool.shutdown(wait=False)
+        return self
+
+    def _run(self, name, fn, after):
+        start = None
+        try:
+            # Dependencies were submitted earlier and each has its own thread, so waiting can not deadlock
+            deps = [self._futures[dep].result() for dep in after]
+            start = time.perf_counter()
+            return fn(*deps)
+        finally:
+            elapsed = time.perf_counter() - start if start else 0.0
+            with self._lock:
+                self.timings[name] = elapsed
+                if len(self.timings) == len(self._tasks):
+                    self.ready_after = time.perf_counter() - self._started
+            metrics.record(f"startup_{name}", elapsed * 1000)
+
+    @property
+    def done(self):
+        return bool(self._futures) and all(f.done() for f in self._futures.values())
+
+    def result(self, name, timeout=None):
+        """Component result (blocks until it is built); re-raises its exception."""
+        return self._futures[name].result(timeout)
+
+    def failed(self):
+        """{name: exception} of the components that raised."""
+        return {name: f.exception() for name, f in self._futures.items() if f.done() and f.exception()}
+
+    def report(self):
+        report = {name: round(seconds, 3) for name, seconds in self.timings.items()}
+        if self.ready_after is not None:
+            report["ready"] = round(self.ready_after, 3)
+        return report
+
+    def report_text(self):
+        parts = [f"{name} {seconds:.2f}s" for name, seconds in self.report().items() if name != "ready"]
+        ready = f"Ready in {self.ready_after:.2f}s" if self.ready_after is not None else "Loading"
+        return f"{ready} ({', '.join(parts)})"
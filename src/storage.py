@@ -1,81 +1,273 @@
+import io
 import sqlite3
-import pickle
 import datetime
 import os
+import threading
+import queue
+import time
+
+import numpy as np
+
+from .metrics import metrics
+
+# Statements are kept as constants so sqlite3's per-connection statement
+# cache reuses the prepared statement on every call.
+SQL_INSERT_USER = 'INSERT INTO users (name) VALUES (?)'
+SQL_USER_NAME = 'SELECT name FROM users WHERE id = ?'
+SQL_USERS = 'SELECT id, name FROM users'
+SQL_SET_EMBEDDING = 'UPDATE users SET embedding = ? WHERE id = ?'
+SQL_EMBEDDINGS = 'SELECT id, embedding FROM users WHERE embedding IS NOT NULL'
+SQL_INSERT_PUNCH = 'INSERT INTO attendance (user_id, timestamp, type) VALUES (?, ?, ?)'
+SQL_LAST_PUNCH = 'SELECT type, timestamp FROM attendance WHERE user_id = ? ORDER BY timestamp DESC LIMIT 1'
+
 
 class DatabaseManager:
-    def __init__(self, db_path="attendance.db"):
+    """
+    SQLite storage with one long-lived connection (WAL journaling) shared by
+    all threads, plus a background writer that batches attendance inserts.
+
+    log_attendance() only queues the punch and returns; the writer commits
+    queued punches in one transaction every `flush_interval` seconds or
+    `batch_size` rows. flush() blocks until everything queued so far is
+    committed, close() flushes and shuts the writer down.
+    """
+    def __init__(self, db_path="attendance.db", batch_size=64, flush_interval=0.5):
         self.db_path = db_path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+
+        self.lock = threading.RLock()
+        self.conn = self.connect()
         self.init_db()
 
+        # Attendance writer
+        self._queue = queue.Queue()
+        self._last_punch = {} # user_id -> (type, timestamp), includes queued punches
+        self._writer = threading.Thread(target=self._writer_loop, name="db-writer", daemon=True)
+        self._writer.start()
+
+        # Called on the writer thread with each committed batch of (user_id, timestamp, type)
+        self.punch_listeners = []
+
+    def connect(self):
+        conn = sqlite3.connect(self.db_path, check_same_thread=False, cached_statements=64)
+        conn.execute('PRAGMA journal_mode=WAL')
+        # FULL keeps every committed batch durable; batching amortizes the fsync
+        conn.execute('PRAGMA synchronous=FULL')
+        conn.execute('PRAGMA busy_timeout=5000')
+        return conn
+
     def init_db(self):
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        # Create Users Table
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS users (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                name TEXT NOT NULL,
-                embedding BLOB,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
-        ''')
-
-        # Create Attendance Table
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS attendance (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                user_id INTEGER,
-                timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                type TEXT CHECK(type IN ('IN', 'OUT')),
-                FOREIGN KEY(user_id) REFERENCES users(id)
-            )
-        ''')
-        conn.commit()
-        conn.close()
+        with self.lock:
+            cursor = self.conn.cursor()
+
+            # Create Users Table
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS users (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    name TEXT NOT NULL,
+                    embedding BLOB,
+                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                )
+            ''')
+
+            # Create Attendance Table
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS attendance (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    user_id INTEGER,
+                    timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    type TEXT CHECK(type IN ('IN', 'OUT')),
+                    FOREIGN KEY(user_id) REFERENCES users(id)
+                )
+            ''')
+
+            # Last-punch lookups and per-user reports
+            cursor.execute('CREATE INDEX IF NOT EXISTS idx_attendance_user_ts ON attendance (user_id, timestamp)')
+            self.conn.commit()
 
     def add_user(self, name):
         """Register a new user (Name only). ID is auto-generated."""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        cursor.execute('INSERT INTO users (name) VALUES (?)', (name,))
-        conn.commit()
-        user_id = cursor.lastrowid
-        conn.close()
-        return user_id
+        with self.lock:
+            cursor = self.conn.execute(SQL_INSERT_USER, (name,))
+            self.conn.commit()
+            return cursor.lastrowid
+
+    def add_users(self, names):
+        """Register several users in one transaction. Returns their ids in order."""
+        with self.lock, self.conn:
+            return [self.conn.execute(SQL_INSERT_USER, (name,)).lastrowid for name in names]
+
+    def delete_user(self, user_id, flush_timeout=5.0):
+        """Remove a user and their attendance history."""
+        if not self.flush(flush_timeout):
+            # Punches still queued for this user may be written after the delete
+            print(f"Attendance writer did not flush within {flush_timeout:.0f}s; deleting user {user_id} anyway.")
+        with self.lock:
+            self.conn.execute('DELETE FROM attendance WHERE user_id = ?', (user_id,))
+            self.conn.execute('DELETE FROM users WHERE id = ?', (user_id,))
+            self.conn.commit()
+            self._last_punch.pop(user_id, None)
 
     def get_user_name(self, user_id):
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        cursor.execute('SELECT name FROM users WHERE id = ?', (user_id,))
-        res = cursor.fetchone()
-        conn.close()
+        with self.lock:
+            res = self.conn.execute(SQL_USER_NAME, (user_id,)).fetchone()
         return res[0] if res else "Unknown"
 
     def get_users_dict(self):
         """Returns {id: name} mapping."""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        cursor.execute('SELECT id, name FROM users')
-        rows = cursor.fetchall()
-        conn.close()
+        with self.lock:
+            rows = self.conn.execute(SQL_USERS).fetchall()
         return {row[0]: row[1] for row in rows}
 
+    @staticmethod
+    def _to_blob(features):
+        # .npy bytes: dtype and shape travel with the data, nothing is unpickled on load
+        buf = io.BytesIO()
+        np.save(buf, np.asarray(features), allow_pickle=False)
+        return buf.getvalue()
+
+    def set_user_embedding(self, user_id, features):
+        """Store a user's face feature vectors (numpy array) or None to clear them."""
+        blob = self._to_blob(features) if features is not None else None
+        with self.lock:
+            self.conn.execute(SQL_SET_EMBEDDING, (blob, user_id))
+            self.conn.commit()
+
+    def set_user_embeddings(self, embeddings):
+        """Store {user_id: features} for several users in one transaction."""
+        rows = [(self._to_blob(features), user_id) for user_id, features in embeddings.items()]
+        with self.lock, self.conn:
+            self.conn.executemany(SQL_SET_EMBEDDING, rows)
+
+    def get_user_embeddings(self):
+        """Returns {id: features} for every user with stored feature vectors."""
+        with self.lock:
+            rows = self.conn.execute(SQL_EMBEDDINGS).fetchall()
+        embeddings = {}
+        skipped = 0
+        for user_id, blob in rows:
+            try:
+                embeddings[user_id] = np.load(io.BytesIO(blob), allow_pickle=False)
+            except ValueError:
+                skipped += 1 # Old pickled row: never unpickled, rewritten by --rebuild-model
+        if skipped:
+            print(f"Ignored {skipped} stored embeddings in the old format; run --rebuild-model to convert them.")
+        return embeddings
+
     def log_attendance(self, user_id, punch_type):
-        """Log attendance (IN/OUT)."""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        cursor.execute('INSERT INTO attendance (user_id, type) VALUES (?, ?)', (user_id, punch_type))
-        conn.commit()
-        conn.close()
+        """
+        Log attendance (IN/OUT). Queued for the background writer, so this
+        never blocks on disk. The timestamp is taken now (UTC, same format as
+        CURRENT_TIMESTAMP), not when the batch is committed.
+        """
+        if punch_type not in ("IN", "OUT"):
+            # Checked here: a row the table rejects would only fail later, on the writer thread
+            raise ValueError(f"Invalid punch type: {punch_type!r} (expected 'IN' or 'OUT')")
+        timestamp = datetime.datetime.now(datetime.timezone.utc).strftime("%Y-%m-%d %H:%M:%S")
+        self._last_punch[user_id] = (punch_type, timestamp)
+        self._queue.put(("punch", (user_id, timestamp, punch_type)))
 
     def get_last_attendance(self, user_id):
         """Get the last punch type for a user to toggle state."""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        cursor.execute('SELECT type, timestamp FROM attendance WHERE user_id = ? ORDER BY timestamp DESC LIMIT 1', (user_id,))
-        result = cursor.fetchone()
-        conn.close()
+        if user_id in self._last_punch:
+            return self._last_punch[user_id]
+        with self.lock:
+            result = self.conn.execute(SQL_LAST_PUNCH, (user_id,)).fetchone()
+        if result:
+            self._last_punch[user_id] = result
         return result # (type, timestamp) or None
+
+    def flush(self, timeout=None):
+        """Block until every punch queued so far is committed to disk."""
+        if not self._writer.is_alive():
+            return True
+        done = threading.Event()
+        self._queue.put(("flush", done))
+        return done.wait(timeout)
+
+    def close(self):
+        """Flush pending punches, stop the writer and close the connection."""
+        if self._writer.is_alive():
+            self._queue.put(("stop", None))
+            self._writer.join()
+        with self.lock:
+            self.conn.close()
+
+    def _notify(self, rows):
+        for listener in self.punch_listeners:
+            try:
+                listener(rows)
+            except Exception as e:
+                metrics.count("listener_errors")
+                print(f"Punch listener failed: {e}")
+
+    def _writer_loop(self):
+        # The writer has its own connection; with WAL the UI thread can keep
+        # reading while a batch commits.
+        conn = self.connect()
+        pending = []   # punch rows not yet committed
+        waiters = []   # flush events released after the next commit
+        running = True
+
+        while running:
+            try:
+                kind, payload = self._queue.get(timeout=self.flush_interval if pending else None)
+            except queue.Empty:
+                kind, payload = None, None
+
+            # Gather whatever else arrives within the batch window
+            deadline = time.time() + self.flush_interval
+            while kind is not None:
+                if kind == "punch":
+                    pending.append(payload)
+                elif kind == "flush":
+                    waiters.append(payload)
+                elif kind == "stop":
+                    running = False
+                if kind != "punch" or len(pending) >= self.batch_size:
+                    break
+                try:
+                    kind, payload = self._queue.get(timeout=max(0, deadline - time.time()))
+                except queue.Empty:
+                    break
+
+            if pending:
+                try:
+                    with metrics.stage("db_write"), conn:
+                        conn.executemany(SQL_INSERT_PUNCH, pending)
+                    metrics.count("db_rows_written", len(pending))
+                    committed, pending = pending, []
+                    self._notify(committed)
+                except sqlite3.IntegrityError as e:
+                    # One bad row fails the whole batch; write row by row and drop only the bad ones
+                    print(f"Attendance batch rejected ({len(pending)} rows): {e}; retrying row by row")
+                    committed, pending = self._write_rows(conn, pending), []
+                    self._notify(committed)
+                except sqlite3.Error as e:
+                    metrics.count("db_write_errors")
+                    print(f"Attendance write failed ({len(pending)} rows): {e}")
+                    if running:
+                        # Keep the rows and retry on the next round
+                        time.sleep(self.flush_interval)
+                        continue
+
+            for event in waiters:
+                event.set()
+            waiters = []
+
+        conn.close()
+
+    def _write_rows(self, conn, rows):
+        """Insert rows one transaction each; rows the database rejects are logged and dropped. Returns the written ones."""
+        written = []
+        for row in rows:
+            try:
+                with conn:
+                    conn.execute(SQL_INSERT_PUNCH, row)
+                written.append(row)
+            except sqlite3.IntegrityError as e:
+                metrics.count("db_rows_dropped")
+                print(f"Dropped attendance row {row}: {e}")
+        metrics.count("db_rows_written", len(written))
+        return written
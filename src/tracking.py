@@ -0,0 +1,207 @@
+import cv2
+
+from .frame_analysis import FrameAnalysis
+
+
+def iou(a, b):
+    """Intersection over union of two (x, y, w, h) boxes."""
+    ax, ay, aw, ah = a
+    bx, by, bw, bh = b
+    ix = max(0, min(ax + aw, bx + bw) - max(ax, bx))
+    iy = max(0, min(ay + ah, by + bh) - max(ay, by))
+    inter = ix * iy
+    union = aw * ah + bw * bh - inter
+    return inter / union if union > 0 else 0.0
+
+
+class Track:
+    def __init__(self, track_id, rect, frame_index):
+        self.track_id = track_id
+        self.rect = rect
+        self.template = None     # Downscaled gray patch used to follow the face
+        self.scale = 1.0         # Downscale factor of the template
+        self.last_detected = frame_index
+
+        # Cached identity
+        self.user_id = None
+        self.confidence = 100
+        self.last_verified = None
+
+    def forget_identity(self):
+        """Drop the cached identity; the next predict decides who this is."""
+        self.user_id = None
+        self.confidence = 100
+        self.last_verified = None
+
+
+class FaceTracker:
+    """
+    Lightweight tracking layer in front of FaceSystem.recognize_faces.
+
+    Full detection runs only every `detect_interval` frames or when a track
+    is lost; in between each face box is followed by template matching on a
+    small downscaled search window. The recognized identity and confidence are
+    cached per track and re-verified every `reverify_interval` frames; all
+    tracks due on the same frame share one batched predict, so the
+    steady-state cost per frame is a tracker update per face.
+
+    A detection only inherits a track's identity when the match is
+    unambiguous and the track was still being followed. A track whose face
+    was lost, or whose box overlaps other faces (people crossing), is
+    predicted again on that frame, so someone stepping into the spot of the
+    previous person is never shown or punched under their name.
+    """
+    def __init__(self, face_system, detect_interval=5, reverify_interval=15,
+                 min_match=0.6, iou_threshold=0.3, template_width=32, max_faces=5):
+        self.face_system = face_system
+        self.detect_interval = detect_interval
+        self.reverify_interval = reverify_interval
+        self.min_match = min_match
+        self.iou_threshold = iou_threshold
+        self.template_width = template_width
+        self.max_faces = max_faces
+
+        self.tracks = []
+        self.frame_index = 0
+        self._next_track_id = 1
+
+    def reset(self):
+        """Drop all tracks and their cached identities (e.g. after the model changed)."""
+        self.tracks = []
+
+    def recognize_face(self, frame, analysis=None):
+        """
+        Drop-in replacement for FaceSystem.recognize_face (the largest face).
+        Returns: user_id, confidence, location
+        """
+        faces = self.recognize_faces(frame, analysis)
+        if not faces:
+            return None, 0, None
+        return faces[0]
+
+    def recognize_faces(self, frame, analysis=None):
+        """
+        Every tracked face, largest (closest) first.
+        Returns: [(user_id, confidence, location), ...]
+        """
+        self.frame_index += 1
+        if analysis is None:
+            analysis = FrameAnalysis(frame)
+
+        crops = {} # track_id -> gray crop already made this frame
+        lost = set() # track_ids whose face could not be followed on this frame
+        due = not self.tracks or any(self.frame_index - t.last_detected >= self.detect_interval
+                                     for t in self.tracks)
+        if not due:
+            followed = [self._follow(frame, track) for track in self.tracks]
+            lost = {track.track_id for track, rect in zip(self.tracks, followed) if rect is None}
+            if lost:
+                due = True # A face was lost (or left); detect everything again
+            else:
+                for track, rect in zip(self.tracks, followed):
+                    track.rect = rect
+
+        if due:
+            faces = self.face_system.get_face_crops(frame, analysis, self.max_faces)
+            self.tracks = self._associate([rect for _, rect in faces], lost)
+            for track, (gray_face, rect) in zip(self.tracks, faces):
+                self._set_template(frame, track, rect)
+                crops[track.track_id] = gray_face
+        elif analysis.mesh_ran:
+            # A face mesh box is free, so treat it like a detection of the face it covers
+            rect = analysis.mesh_face_box()
+            track = max(self.tracks, key=lambda t: iou(t.rect, rect)) if rect else None
+            if track is not None and iou(track.rect, rect) >= self.iou_threshold:
+                track.rect = rect
+                track.last_detected = self.frame_index
+                self._set_template(frame, track, rect)
+                crops[track.track_id] = self.face_system.crop_face(frame, rect, analysis.mesh_eye_points())
+
+        # One batched predict for every track that needs (re-)verification
+        stale = [t for t in self.tracks
+                 if t.last_verified is None or self.frame_index - t.last_verified >= self.reverify_interval]
+        gray_faces = [crops.get(t.track_id) for t in stale]
+        gray_faces = [g if g is not None else self.face_system.crop_face(frame, t.rect)
+                      for t, g in zip(stale, gray_faces)]
+        ready = [(t, g) for t, g in zip(stale, gray_faces) if g is not None]
+        predictions = self.face_system.predict_many([g for _, g in ready])
+        for (track, _), (user_id, confidence) in zip(ready, predictions):
+            track.user_id, track.confidence = user_id, confidence
+            track.last_verified = self.frame_index
+
+        tracks = sorted(self.tracks, key=lambda t: t.rect[2] * t.rect[3], reverse=True)
+        return [(t.user_id, t.confidence, t.rect) for t in tracks]
+
+    def _associate(self, rects, lost=()):
+        """
+        Match fresh detections to the current tracks (greedy, highest IoU
+        first); unmatched detections start new tracks, unmatched tracks end.
+        A matched track keeps its cached identity only if it was followed up
+        to this frame (not in `lost`) and neither it nor its detection
+        overlaps another face; otherwise it is re-verified right away.
+        Returns the tracks in the order of rects.
+        """
+        pairs = sorted(((iou(track.rect, rect), ti, ri)
+                        for ti, track in enumerate(self.tracks) for ri, rect in enumerate(rects)),
+                       reverse=True)
+        assigned = [None] * len(rects)
+        used = set()
+        for score, ti, ri in pairs:
+            if score < self.iou_threshold:
+                break
+            if ti in used or assigned[ri] is not None:
+                continue
+            used.add(ti)
+            track = assigned[ri] = self.tracks[ti]
+            ambiguous = (sum(iou(track.rect, r) >= self.iou_threshold for r in rects) > 1 or
+                         sum(iou(t.rect, rects[ri]) >= self.iou_threshold for t in self.tracks) > 1)
+            if track.track_id in lost or ambiguous:
+                track.forget_identity()
+
+        tracks = []
+        for rect, track in zip(rects, assigned):
+            if track is None:
+                track = Track(self._next_track_id, rect, self.frame_index)
+                self._next_track_id += 1
+            track.rect = rect
+            track.last_detected = self.frame_index
+            tracks.append(track)
+        return tracks
+
+    def _set_template(self, frame, track, rect):
+        # Built from the frame box (not the normalized crop) so it matches the search window scale
+        x, y, w, h = rect
+        track.scale = min(1.0, self.template_width / float(w))
+        patch = cv2.resize(frame[y:y+h, x:x+w], None, fx=track.scale, fy=track.scale, interpolation=cv2.INTER_AREA)
+        track.template = cv2.cvtColor(patch, cv2.COLOR_BGR2GRAY)
+
+    def _follow(self, frame, track):
+        """Template-match the face in a window around its last box. Returns rect or None."""
+        if track.template is None:
+            return None
+
+        x, y, w, h = track.rect
+        ih, iw = frame.shape[:2]
+        sx0, sy0 = max(0, x - w // 2), max(0, y - h // 2)
+        sx1, sy1 = min(iw, x + w + w // 2), min(ih, y + h + h // 2)
+
+        region = frame[sy0:sy1, sx0:sx1]
+        region = cv2.resize(region, None, fx=track.scale, fy=track.scale, interpolation=cv2.INTER_AREA)
+        region = cv2.cvtColor(region, cv2.COLOR_BGR2GRAY)
+
+        th, tw = track.template.shape[:2]
+        if region.shape[0] < th or region.shape[1] < tw:
+            return None
+
+        scores = cv2.matchTemplate(region, track.template, cv2.TM_CCOEFF_NORMED)
+        _, best, _, (bx, by) = cv2.minMaxLoc(scores)
+        if best < self.min_match:
+            return None
+
+        nx = sx0 + int(bx / track.scale)
+        ny = sy0 + int(by / track.scale)
+        w = min(iw - nx, w)
+        h = min(ih - ny, h)
+        if w <= 0 or h <= 0:
+            return None
+        return nx, ny, w, h
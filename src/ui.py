@@ -2,25 +2,40 @@ import tkinter as tk
 from tkinter import simpledialog, messagebox
 import cv2
 import os
-from PIL import Image, ImageTk
 import datetime
 import threading
-import time
 
-from .face_core import FaceSystem
+from .face_core import FaceSystem, BACKEND_LBPH
 from .liveness import LivenessDetector
 from .storage import DatabaseManager
+from .reporting import AttendanceReporter
+from .pipeline import FramePipeline
+from .scheduler import FrameScheduler
+from .frame_analysis import FrameAnalysis
+from .tracking import FaceTracker
+from .enrollment import EnrollmentSampler
+from .session import LivenessSession, analyze_recognition
+from .render import FrameRenderer
+from .buffers import ScratchBuffers
+from .startup import StartupLoader, warm_up
+from .metrics import metrics
 
 class AppUI:
-    def __init__(self, root):
+    def __init__(self, root, backend=BACKEND_LBPH, predict_workers=0, model_history_mb=None):
         self.root = root
         self.root.title("Face Authentication Attendance System")
         self.root.geometry("1100x750")
 
         # Initialize Core Systems
         self.db = DatabaseManager()
-        self.face_system = FaceSystem()
-        self.liveness_detector = LivenessDetector()
+        self.reporter = AttendanceReporter(self.db) # Keeps daily summaries current as punches commit
+        threading.Thread(target=self.reporter.refresh, daemon=True).start() # Catch up on older punches
+        # Model, MediaPipe graphs and camera load in the background (see start_loading)
+        self.face_system = None
+        self.liveness_detector = None
+        self.tracker = None
+        self.cap = None
+        self.pipeline = None
 
         # Cache User Names
         self.user_map = self.db.get_users_dict()
@@ -28,45 +43,93 @@ class AppUI:
         # State Variables
         self.current_user_id = None
         self.current_user_name = None
-        self.last_punch_time = {} # user_id -> timestamp to prevent spamming
         self.liveness_counter = 0 
         self.is_verifying = False 
-        self.liveness_confirmed = False
         
-        # Active Liveness State
-        self.active_challenge = None
-        self.challenge_start_time = 0
-        self.CHALLENGES = ["BLINK", "SMILE", "TURN_LEFT", "TURN_RIGHT"]
+        # Active Liveness State (challenges, verified user, punch cooldowns)
+        self.session = LivenessSession(cooldown=30, exit_frames=30) # Verified state survives 1 second of face loss
         
         # Registration State
         self.is_registering = False
-        self.reg_samples = []
+        self.reg_sampler = None # EnrollmentSampler: keeps a sharp, pose-diverse subset of crops
         self.reg_user_id = None
         self.reg_user_name = None
-        self.reg_count = 0
-        self.MAX_SAMPLES = 50
-        
-        # Stability Buffers
-        self.liveness_exit_counter = 0
-        self.LIVENESS_THRESHOLD_FRAMES = 30 # Maintain verified state for 1 second after face loss
-        
+        self.MAX_SAMPLES = 20 # Sample budget per user
+        self.is_training = False
+
+        # Recognition
+        self.MATCH_THRESHOLD = None # Known once the model is loaded
+        self.overlays = [] # Drawn on every displayed frame from the latest inference result
+        self.scratch = ScratchBuffers() # Per-frame RGB / downscaled images, reused by the inference thread
+        self.last_display_seq = -1
+
+        # UI Layout (shown right away; controls are enabled once loading finishes)
+        self.setup_ui()
+        self.reg_btn.config(state=tk.DISABLED)
+        self.status_var.set("Starting... loading model and camera")
+
+        self.root.bind("<F12>", lambda event: self.toggle_metrics()) # Instrumentation on / off
+        self.start_loading(backend, predict_workers, model_history_mb)
+
+    def start_loading(self, backend, predict_workers, model_history_mb=None):
+        """Build the model, both MediaPipe graphs and the camera concurrently, then warm up."""
+        self.loader = StartupLoader()
+        self.loader.add("model", lambda: FaceSystem(backend=backend, db=self.db, predict_workers=predict_workers,
+                                                      model_history_mb=model_history_mb))
+        self.loader.add("face_mesh", LivenessDetector)
+        self.loader.add("camera", lambda: cv2.VideoCapture(0))
+        self.loader.add("warm_up", warm_up, after=("model", "face_mesh"))
+        self.loader.start()
+        self.root.after(50, self.check_loading)
+
+    def check_loading(self):
+        if not self.loader.done:
+            self.root.after(50, self.check_loading)
+            return
+
+        failed = self.loader.failed()
+        if "model" in failed or "face_mesh" in failed:
+            error = failed.get("model") or failed.get("face_mesh")
+            self.status_var.set(f"Startup failed: {error}")
+            messagebox.showerror("Startup Error", str(error))
+            return
+        if "warm_up" in failed:
+            print(f"Warm-up failed: {failed['warm_up']}") # Not fatal, the first frame is just slower
+
+        self.face_system = self.loader.result("model")
+        self.liveness_detector = self.loader.result("face_mesh")
+        self.cap = self.loader.result("camera") if "camera" not in failed else cv2.VideoCapture()
+        self.tracker = FaceTracker(self.face_system)
+        self.MATCH_THRESHOLD = self.face_system.match_threshold
+        # Models published by another kiosk (or a rollback) are swapped in live
+        self.model_watcher = self.face_system.watch_model(on_reload=self.tracker.reset)
+
         # Diagnostic Startup
         print(f"--- System Diagnostic ---")
         print(f"Users in Database: {len(self.user_map)}")
-        if os.path.exists(self.face_system.trainer_path):
-             stats = os.stat(self.face_system.trainer_path)
-             print(f"Trainer Model Found: {self.face_system.trainer_path} ({stats.st_size} bytes)")
+        model_path = self.face_system.versions.path # trainer.yml or model.bin, per backend
+        if os.path.exists(model_path):
+             stats = os.stat(model_path)
+             print(f"Model Found: {model_path} ({stats.st_size} bytes)")
         else:
-             print("WARNING: No Trainer Model found. Register a user first.")
+             print("WARNING: No Model found. Register a user first.")
+        if not self.cap.isOpened():
+             print("WARNING: Camera could not be opened.")
+        print(self.loader.report_text())
         print(f"-------------------------")
+        self.log_msg(self.loader.report_text())
+
+        # Capture / inference threads feed the Tk loop; the scheduler paces
+        # inference and drops to presence checks when nobody is around
+        self.scheduler = FrameScheduler()
+        self.pipeline = FramePipeline(self.cap, self.analyze_frame, scheduler=self.scheduler, presence_fn=self.has_face)
+        self.pipeline.start()
+
+        self.reg_btn.config(state=tk.NORMAL)
+        self.status_var.set("System Ready")
 
-        # Camera
-        self.cap = cv2.VideoCapture(0)
-        
-        # UI Layout
-        self.setup_ui()
-        
         # Start Video Loop
+        self.poll_results()
         self.update_video()
 
     def setup_ui(self):
@@ -80,6 +143,7 @@ class AppUI:
         
         self.video_label = tk.Label(self.left_panel)
         self.video_label.pack(expand=True)
+        self.renderer = FrameRenderer(self.video_label) # Own display rate (30 fps), reused buffers
 
         # Right Panel (Controls & Status)
         self.right_panel = tk.Frame(self.main_container, bg="#f0f0f0", width=300)
@@ -135,9 +199,10 @@ class AppUI:
                 uid = self.db.add_user(name)
                 self.reg_user_id = uid
                 self.reg_user_name = name
-                self.reg_samples = []
-                self.reg_count = 0
+                self.reg_sampler = EnrollmentSampler(budget=self.MAX_SAMPLES)
+                self.face_system.prepare_standby() # Loads the model copy while samples are captured
                 self.is_registering = True
+                self.scheduler.wake()
                 self.status_var.set(f"Look at camera. Capturing samples...")
                 self.reg_btn.config(state=tk.DISABLED)
                 self.punch_in_btn.config(state=tk.DISABLED)
@@ -146,7 +211,7 @@ class AppUI:
                 messagebox.showerror("Error", str(e))
 
     def finish_registration(self):
-        if hasattr(self, 'is_training') and self.is_training:
+        if self.is_training:
             return
             
         self.is_training = True
@@ -154,24 +219,44 @@ class AppUI:
         self.log_msg("Training started...")
         
         def train_task():
+            enrolled = False
+            samples = self.reg_sampler.samples
             try:
-                self.face_system.save_samples(self.reg_user_id, self.reg_samples)
-                self.face_system.train_model()
+                # Only the new user's samples are processed (no full retrain)
+                if samples:
+                    enrolled = self.face_system.enroll_user(self.reg_user_id, samples)
             except Exception as e:
                 print(f"Training Task Failed: {e}")
-            
+
+            if not enrolled:
+                # The model does not know this face; do not keep a user it can never match
+                self.db.delete_user(self.reg_user_id)
+                self.face_system.remove_user(self.reg_user_id)
+
             # Update cache
             self.user_map = self.db.get_users_dict()
             
             # Reset UI
-            self.root.after(0, lambda: self.registration_complete())
+            self.root.after(0, lambda: self.registration_complete(enrolled))
 
         threading.Thread(target=train_task).start()
 
-    def registration_complete(self):
+    def registration_complete(self, enrolled=True):
+        # Cached track identities predate the new model
+        self.tracker.reset()
         self.is_training = False
         self.is_registering = False
         self.reg_btn.config(state=tk.NORMAL)
+        coverage = self.reg_sampler.coverage()
+        self.log_msg(f"{self.reg_sampler.coverage_text()} from {coverage['frames_seen']} frames")
+        if not enrolled:
+            self.log_msg(f"Registration failed: {self.reg_user_name}")
+            self.status_var.set("Registration Failed.")
+            reason = "No usable face samples were captured" if not coverage["kept"] else "The model could not be updated"
+            messagebox.showerror("Registration Failed",
+                                 f"{reason} for {self.reg_user_name} ({coverage['rejected_blur']} blurry frames). "
+                                 "Check the lighting and focus, then register again.")
+            return
         self.log_msg(f"Registered: {self.reg_user_name}")
         self.status_var.set("Registration Complete.")
         messagebox.showinfo("Success", f"User {self.reg_user_name} registered!")
@@ -184,15 +269,15 @@ class AppUI:
             return
 
         # Double Check Cooldown
-        last = self.last_punch_time.get(self.current_user_id, 0)
-        if time.time() - last < 30:
-            remaining = int(30 - (time.time() - last))
-            messagebox.showwarning("Cooldown", f"Please wait {remaining} seconds before punching again.")
+        remaining = self.session.cooldown_remaining(self.current_user_id)
+        if remaining > 0:
+            messagebox.showwarning("Cooldown", f"Please wait {int(remaining)} seconds before punching again.")
             return
 
-        # Log attendance
+        # Log attendance; also clears the verified state
         self.db.log_attendance(self.current_user_id, punch_type)
-        self.last_punch_time[self.current_user_id] = time.time()
+        self.session.record_punch(self.current_user_id)
+        self.liveness_detector.reset()
         
         # UI Feedback
         color = "green" if punch_type == "IN" else "orange"
@@ -202,8 +287,6 @@ class AppUI:
         self.log_msg(msg)
         
         # Reset verification state to avoid spamming
-        self.liveness_confirmed = False 
-        self.active_challenge = None
         self.current_user_id = None
         self.current_user_name = None
         self.punch_in_btn.config(state=tk.DISABLED)
@@ -212,165 +295,156 @@ class AppUI:
     def quit_app(self):
         self.on_closing()
 
-    def update_video(self):
-        ret, frame = self.cap.read()
-        if ret:
-            display_frame = frame.copy()
-            
-            # --- REGISTRATION MODE ---
-            if self.is_registering:
-                gray_crop, rect = self.face_system.get_face_crop(frame)
-                
-                if gray_crop is not None:
-                    self.reg_samples.append(gray_crop)
-                    self.reg_count += 1
-                    
-                    # Draw visual feedback
-                    x, y, w, h = rect
-                    cv2.rectangle(display_frame, (x, y), (x+w, y+h), (255, 255, 0), 2)
-                    cv2.putText(display_frame, f"Capturing: {self.reg_count}/{self.MAX_SAMPLES}", (10, 30), cv2.FONT_HERSHEY_SIMPLEX, 0.7, (255, 255, 0), 2)
-                    
-                    if self.reg_count >= self.MAX_SAMPLES:
-                        self.finish_registration()
+    def analyze_frame(self, frame):
+        """
+        Heavy per-frame work (detection, recognition, face mesh).
+        Runs on the inference worker thread; the result is applied on the Tk thread.
+        """
+        analysis = FrameAnalysis(frame, self.scratch)
+        if self.is_registering:
+            gray_crop, rect = self.face_system.get_face_crop(frame, analysis)
+            if rect is not None:
+                self.scheduler.saw_face()
+            return {"mode": "register", "gray_crop": gray_crop, "rect": rect, "yaw": analysis.yaw}
+
+        result = analyze_recognition(frame, analysis, self.tracker, self.liveness_detector,
+                                     self.MATCH_THRESHOLD, self.session.in_progress)
+        if result["rect"] is not None:
+            self.scheduler.saw_face()
+        return result
+
+    def has_face(self, frame):
+        """Idle-mode presence check: downscaled detection only, no crop or predict."""
+        rect, _ = self.face_system.detect_face(FrameAnalysis(frame, self.scratch))
+        return rect is not None
+
+    def reset_liveness(self, status=None):
+        self.session.reset()
+        self.liveness_detector.reset()
+        self.punch_in_btn.config(state=tk.DISABLED)
+        self.punch_out_btn.config(state=tk.DISABLED)
+        if status:
+            self.status_var.set(status)
+
+    def apply_registration_result(self, result):
+        gray_crop, rect = result["gray_crop"], result["rect"]
+        self.overlays = []
+
+        if gray_crop is not None:
+            if not self.is_training:
+                self.reg_sampler.offer(gray_crop, result["yaw"])
+
+            # Draw visual feedback
+            self.overlays.append(("rect", rect, (255, 255, 0), 2))
+            self.overlays.append(("text", f"Capturing: {self.reg_sampler.coverage_text()}", (10, 30), 0.7, (255, 255, 0)))
+
+            missing = self.reg_sampler.missing_pose()
+            if missing and missing != "CENTER":
+                self.overlays.append(("text", f"Turn head slightly {missing.lower()}", (10, 60), 0.7, (255, 255, 0)))
+
+            if self.reg_sampler.is_complete():
+                self.finish_registration()
+        else:
+            self.overlays.append(("text", "Face not found!", (10, 30), 0.7, (0, 0, 255)))
+
+    def apply_recognition_result(self, result):
+        user_id, conf, rect = result["user_id"], result["conf"], result["rect"]
+        live_info = result["live_info"]
+        self.overlays = []
+
+        # ACTIVE LIVENESS CHECK (2-Step Sequence)
+        event = self.session.update(user_id, rect, live_info)
+        if event["reset"]:
+            self.reset_liveness(None if event["matched"] else "System Ready")
+
+        if not rect:
+            # NO FACE FOUND
+            return
+
+        x, y, w, h = rect
+        name = "Register First"
+        color = (0, 0, 255)
+
+        metrics.gauge("last_conf", round(float(conf), 2))
+
+        if event["matched"]:
+            metrics.count("faces_recognized")
+            name = self.user_map.get(user_id, "Register First")
+            color = (0, 255, 0)
+
+            if event["prompt"]:
+                self.overlays.append(("text", event["prompt"], (x, y+h+30), 0.7, (0, 165, 255)))
+
+            if event["just_verified"]:
+                self.current_user_id = user_id
+                self.current_user_name = name
+                if event["cooldown"] > 0:
+                    self.status_var.set(f"Cooldown Active ({int(event['cooldown'])}s)")
                 else:
-                    cv2.putText(display_frame, "Face not found!", (10, 30), cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 0, 255), 2)
-
-            # --- RECOGNITION MODE ---
-            else:
-                try:
-                    user_id, conf, rect = self.face_system.recognize_face(frame)
-                    
-                    if rect:
-                        x, y, w, h = rect
-                        name = "Register First"
-                        color = (0, 0, 255)
-                        
-                        # Confidence Logic
-                        # Debugging: Print confidence to console
-                        print(f"DEBUG: ID={user_id}, Conf={conf}") 
-                        
-                        if conf < 85 and user_id is not None:  # RELAXED THRESHOLD from 70 to 85
-                            name = self.user_map.get(user_id, "Register First")
-                            color = (0, 255, 0)
-                            
-                            # ACTIVE LIVENESS CHECK (2-Step Sequence)
-                            live_info = self.liveness_detector.process_frame(frame)
-                            EAR = live_info["ear"]
-                            MAR = live_info["mar"]
-                            ORIENT = live_info["orientation"]
-                            
-                            if not self.liveness_confirmed:
-                                import random
-                                # If no active challenge queue, create one
-                                if not self.active_challenge:
-                                    # Create a sequence of 2 unique challenges
-                                    self.active_challenge = random.sample(self.CHALLENGES, 2)
-                                    self.challenge_start_time = time.time()
-                                
-                                # Get current challenge target
-                                current_target = self.active_challenge[0]
-                                
-                                # Display Instructions
-                                # "Challenge 1/2: Please SMILE!"
-                                step_num = 3 - len(self.active_challenge)
-                                challenge_text = f"Step {step_num}/2: Please {current_target}!"
-                                text_color = (0, 165, 255) # Orange
-                                cv2.putText(display_frame, challenge_text, (x, y+h+30), cv2.FONT_HERSHEY_SIMPLEX, 0.7, text_color, 2)
-                                
-                                # Verify Current Challenge
-                                passed = False
-                                if current_target == "BLINK":
-                                    if live_info["is_blinking"]: passed = True
-                                elif current_target == "SMILE":
-                                    if live_info["is_smiling"]: passed = True
-                                elif current_target == "TURN_LEFT":
-                                    if ORIENT == "TURN_LEFT": passed = True
-                                elif current_target == "TURN_RIGHT":
-                                    if ORIENT == "TURN_RIGHT": passed = True
-                                
-                                if passed:
-                                    # Remove completed challenge
-                                    self.active_challenge.pop(0)
-                                    # Reset timer for next challenge
-                                    self.challenge_start_time = time.time()
-                                    
-                                    # If queue empty -> ALL PASSED
-                                    if not self.active_challenge:
-                                        self.liveness_confirmed = True
-                                        self.current_user_id = user_id
-                                        self.current_user_name = name
-                                        self.liveness_exit_counter = self.LIVENESS_THRESHOLD_FRAMES
-                                        
-                                        # CHECK COOLDOWN (30s)
-                                        last = self.last_punch_time.get(user_id, 0)
-                                        if time.time() - last < 30:
-                                            self.status_var.set(f"Cooldown Active ({int(30 - (time.time()-last))}s)")
-                                        else:
-                                            # ENABLE BUTTONS
-                                            self.punch_in_btn.config(state=tk.NORMAL)
-                                            self.punch_out_btn.config(state=tk.NORMAL)
-                                            self.status_var.set(f"Verified: {name}. Select Action.")
-                                            
-                                        # Reset challenge state
-                                        self.active_challenge = None
-
-                            else:
-                                # Already confirmed, waiting for button press
-                                cv2.putText(display_frame, "VERIFIED - SELECT ACTION", (x, y-30), cv2.FONT_HERSHEY_SIMPLEX, 0.8, (0, 255, 0), 2)
-                                
-                                if self.current_user_id == user_id:
-                                    self.liveness_exit_counter = self.LIVENESS_THRESHOLD_FRAMES # Keep buffer full
-                                else:
-                                    self.liveness_exit_counter -= 1
-                                    
-                                if self.liveness_exit_counter <= 0:
-                                    self.liveness_confirmed = False
-                                    self.active_challenge = None
-                                    self.punch_in_btn.config(state=tk.DISABLED)
-                                    self.punch_out_btn.config(state=tk.DISABLED)
-
-                        else:
-                            # Unrecognized or low confidence
-                            # Debug log to console (Internal)
-                            print(f"DEBUG: Unrecognized Face, Conf: {int(conf)}")
-                            
-                            if self.liveness_confirmed:
-                                self.liveness_exit_counter -= 1
-                                if self.liveness_exit_counter <= 0:
-                                    self.liveness_confirmed = False
-                                    self.active_challenge = None
-                                    self.punch_in_btn.config(state=tk.DISABLED)
-                                    self.punch_out_btn.config(state=tk.DISABLED)
-                                    self.status_var.set("System Ready")
-                            
-                        cv2.rectangle(display_frame, (x, y), (x+w, y+h), color, 2)
-                        cv2.putText(display_frame, f"{name} ({int(conf)})", (x, y-10), cv2.FONT_HERSHEY_SIMPLEX, 0.8, color, 2)
-                    
-                    else:
-                        # NO FACE FOUND
-                        if self.liveness_confirmed:
-                            self.liveness_exit_counter -= 1
-                            if self.liveness_exit_counter <= 0:
-                                self.liveness_confirmed = False
-                                self.active_challenge = None
-                                self.punch_in_btn.config(state=tk.DISABLED)
-                                self.punch_out_btn.config(state=tk.DISABLED)
-                                self.status_var.set("System Ready")
-                
-                except Exception as e:
-                    # print(f"Update Loop Error: {e}")
-                    pass
-
-            # Convert to Tkinter Image
-            img = cv2.cvtColor(display_frame, cv2.COLOR_BGR2RGB)
-            img = Image.fromarray(img)
-            imgtk = ImageTk.PhotoImage(image=img)
-            self.video_label.imgtk = imgtk
-            self.video_label.configure(image=imgtk)
-
-        self.root.after(10, self.update_video)
+                    # ENABLE BUTTONS
+                    self.punch_in_btn.config(state=tk.NORMAL)
+                    self.punch_out_btn.config(state=tk.NORMAL)
+                    self.status_var.set(f"Verified: {name}. Select Action.")
+            elif event["verified"]:
+                # Already confirmed, waiting for button press
+                self.overlays.append(("text", "VERIFIED - SELECT ACTION", (x, y-30), 0.8, (0, 255, 0)))
+        else:
+            # Unrecognized or low confidence
+            metrics.count("faces_unrecognized")
+
+        self.overlays.append(("rect", rect, color, 2))
+        self.overlays.append(("text", f"{name} ({int(conf)})", (x, y-10), 0.8, color))
+
+        # Faces further back: already identified, challenged when they step forward
+        for other_id, other_conf, other_rect in result.get("others", []):
+            ox, oy = other_rect[:2]
+            other_name = "Unknown"
+            if other_id is not None and other_conf < self.MATCH_THRESHOLD:
+                other_name = self.user_map.get(other_id, "Unknown")
+            self.overlays.append(("rect", other_rect, (160, 160, 160), 1))
+            self.overlays.append(("text", f"{other_name} (next)", (ox, oy-8), 0.5, (160, 160, 160)))
+
+    def poll_results(self):
+        """Applies the newest inference result (if any). Cheap; runs every 10 ms."""
+        item = self.pipeline.latest_result()
+        if item is not None:
+            _, _, result = item
+            try:
+                if result["mode"] == "register" and self.is_registering:
+                    self.apply_registration_result(result)
+                elif result["mode"] == "recognize" and not self.is_registering:
+                    self.apply_recognition_result(result)
+            except Exception as e:
+                metrics.count("ui_errors")
+                print(f"Update Loop Error: {e}")
+
+        self.root.after(10, self.poll_results)
+
+    def update_video(self):
+        """
+        Display loop at the renderer's own rate: shows the newest captured
+        frame with the overlays of the latest inference result. Never blocks
+        on the camera or on inference.
+        """
+        seq, frame = self.pipeline.latest_frame()
+        if frame is not None and seq != self.last_display_seq:
+            self.last_display_seq = seq
+            with metrics.stage("render"):
+                area = (self.left_panel.winfo_width(), self.left_panel.winfo_height())
+                self.renderer.render(frame, self.overlays, area)
+            metrics.tick("display")
+
+        self.root.after(self.renderer.interval_ms, self.update_video)
+
+    def toggle_metrics(self):
+        enabled = metrics.toggle()
+        self.log_msg(f"Metrics {'ON' if enabled else 'OFF'}")
 
     def on_closing(self):
-        if self.cap.isOpened():
+        if self.pipeline is not None:
+            self.pipeline.stop()
+        self.db.close() # Flushes queued punches
+        self.reporter.close()
+        if self.cap is not None and self.cap.isOpened():
             self.cap.release()
         self.root.destroy()